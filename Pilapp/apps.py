@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class PilappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Pilapp'
+
+    def ready(self):
+        # Registra las señales que mantienen los contadores desnormalizados
+        from . import contadores  # noqa: F401
+        # Invalida el cache de horarios de turnos al modificar un Turno
+        from . import historial  # noqa: F401
+        # Invalida el cache semanal del calendario
+        from . import calendario  # noqa: F401
+        # Invalida las estadísticas cacheadas del dashboard
+        from . import estadisticas  # noqa: F401
+        # Invalida el cache de fechas de feriado
+        from . import feriados  # noqa: F401
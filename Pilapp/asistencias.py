@@ -0,0 +1,207 @@
+"""
+Registro de asistencias en lote.
+
+Lo usan el bot (registrar_asistencias) y la pantalla de las profes
+(profes_marcar_asistencia):
+    - `anotados_clase`: regulares y ocasionales de una clase con su Persona,
+      en dos consultas.
+    - `aplicar_asistencias`: todos los cambios de estado de una vez, con un
+      bulk_update por modelo y un único recálculo de Clase.total_inscriptos.
+
+`alumnos_de_clases` arma la lista de alumnos (solo nombre, apellido, teléfono
+y tipo) de muchas clases con dos consultas, para los endpoints del bot que
+listan alumnos por turno, clase o día.
+
+bulk_update no dispara señales: `aplicar_asistencias` recalcula los contadores
+e invalida el calendario y las estadísticas de las clases tocadas.
+"""
+from django.db import transaction
+
+from .calendario import invalidar_semanas_de_clases
+from .contadores import recalcular_total_inscriptos
+from .estadisticas import invalidar_estadisticas
+from .models import (
+    ESTADOS_SIN_CUPO_OCASIONAL,
+    ESTADOS_SIN_CUPO_REGULAR,
+    AlumnoClase,
+    AlumnoClaseOcasional,
+    AlumnoPaquete,
+)
+
+REGULAR = 'regular'
+OCASIONAL = 'ocasional'
+
+
+def anotados_clase(clase):
+    """
+    Alumnos anotados en la clase.
+
+    Returns:
+        dict: {id_persona: (tipo, instancia, nombre_normalizado)}. Si una
+        persona figura como regular y como ocasional, queda la ocasional.
+    """
+    anotados = {}
+    regulares = AlumnoClase.objects.filter(id_clase=clase).select_related(
+        'id_alumno_paquete__id_alumno__id_persona'
+    )
+    for ac in regulares:
+        persona = ac.id_alumno_paquete.id_alumno.id_persona
+        anotados[persona.id_persona] = (REGULAR, ac, persona.nombre_normalizado)
+
+    ocasionales = AlumnoClaseOcasional.objects.filter(id_clase=clase).select_related('id_alumno__id_persona')
+    for ao in ocasionales:
+        persona = ao.id_alumno.id_persona
+        anotados[persona.id_persona] = (OCASIONAL, ao, persona.nombre_normalizado)
+    return anotados
+
+
+def alumnos_de_clases(ids_clase, incluir_cancelados=False):
+    """
+    Alumnos de varias clases en dos consultas (regulares y ocasionales), con
+    la Persona resuelta por JOIN y solo las columnas que se devuelven.
+
+    Args:
+        ids_clase (iterable): clases a listar.
+        incluir_cancelados (bool): si es False se omiten los que no ocupan
+            lugar (canceló, reprogramó, feriado).
+
+    Returns:
+        dict: {id_clase: [{"nombre", "apellido", "telefono", "tipo"}, ...]},
+        con los regulares primero. Todas las clases pedidas tienen su lista.
+    """
+    ids_clase = list(ids_clase)
+    alumnos = {id_clase: [] for id_clase in ids_clase}
+    if not ids_clase:
+        return alumnos
+
+    consultas = (
+        (AlumnoClase, 'id_alumno_paquete__id_alumno__id_persona', ESTADOS_SIN_CUPO_REGULAR, REGULAR),
+        (AlumnoClaseOcasional, 'id_alumno__id_persona', ESTADOS_SIN_CUPO_OCASIONAL, OCASIONAL),
+    )
+    for modelo, persona, sin_cupo, tipo in consultas:
+        filas = modelo.objects.filter(id_clase__in=ids_clase)
+        if not incluir_cancelados:
+            filas = filas.exclude(estado__in=sin_cupo)
+        filas = filas.order_by('pk').values_list(
+            'id_clase_id', f'{persona}__nombre', f'{persona}__apellido', f'{persona}__telefono'
+        )
+        for id_clase, nombre, apellido, telefono in filas:
+            alumnos[id_clase].append({
+                "nombre": nombre,
+                "apellido": apellido,
+                "telefono": telefono,
+                "tipo": tipo
+            })
+    return alumnos
+
+
+def _reasignar_expirados(filas):
+    """
+    Pasa al paquete activo del alumno las clases regulares que quedaron en un
+    paquete expirado. Si el paquete activo ya tiene esa clase, se actualiza esa
+    y la del paquete expirado se borra.
+
+    Returns:
+        tuple: (filas a actualizar, ids a borrar, cantidad reasignada)
+    """
+    expiradas = [f for f in filas if f.id_alumno_paquete.estado == 'expirado']
+    if not expiradas:
+        return filas, [], 0
+
+    activos = {}
+    for paquete in AlumnoPaquete.objects.filter(
+        id_alumno__in={f.id_alumno_paquete.id_alumno_id for f in expiradas},
+        estado='activo'
+    ).order_by('pk'):
+        activos.setdefault(paquete.id_alumno_id, paquete)
+
+    existentes = {
+        (ac.id_alumno_paquete_id, ac.id_clase_id): ac
+        for ac in AlumnoClase.objects.filter(
+            id_alumno_paquete__in=list(activos.values()),
+            id_clase__in={f.id_clase_id for f in expiradas}
+        )
+    }
+
+    actualizar = {f.pk: f for f in filas}
+    borrar = []
+    reasignadas = 0
+    for fila in expiradas:
+        activo = activos.get(fila.id_alumno_paquete.id_alumno_id)
+        if not activo:
+            # Sin paquete activo: el estado queda en el expirado
+            continue
+        existente = existentes.get((activo.pk, fila.id_clase_id))
+        if existente:
+            existente.estado = fila.estado
+            actualizar[existente.pk] = existente
+            del actualizar[fila.pk]
+            borrar.append(fila.pk)
+        else:
+            fila.id_alumno_paquete = activo
+        reasignadas += 1
+    return list(actualizar.values()), borrar, reasignadas
+
+
+def aplicar_asistencias(cambios, reasignar_expirados=False):
+    """
+    Aplica muchos cambios de estado en una transacción.
+
+    Args:
+        cambios (iterable): tuplas (tipo, id_relacion, estado) con tipo
+            'regular' (AlumnoClase) u 'ocasional' (AlumnoClaseOcasional).
+            Si una relación aparece más de una vez, vale la última.
+        reasignar_expirados (bool): mueve las clases regulares de paquetes
+            expirados al paquete activo del alumno (ver _reasignar_expirados).
+
+    Returns:
+        dict: {'actualizadas': int, 'reasignadas': int}
+    """
+    estados = {REGULAR: {}, OCASIONAL: {}}
+    for tipo, id_relacion, estado in cambios:
+        if tipo in estados:
+            estados[tipo][int(id_relacion)] = estado
+    if not estados[REGULAR] and not estados[OCASIONAL]:
+        return {'actualizadas': 0, 'reasignadas': 0}
+
+    with transaction.atomic():
+        regulares = list(
+            AlumnoClase.objects.select_related('id_alumno_paquete').filter(pk__in=estados[REGULAR])
+        ) if estados[REGULAR] else []
+        ocasionales = list(
+            AlumnoClaseOcasional.objects.filter(pk__in=estados[OCASIONAL])
+        ) if estados[OCASIONAL] else []
+
+        ids_clase = {f.id_clase_id for f in regulares} | {f.id_clase_id for f in ocasionales}
+
+        # Solo se escriben las filas que cambian (o que hay que pasar al paquete activo)
+        regulares = [
+            f for f in regulares
+            if _cambiar_estado(f, estados[REGULAR][f.pk])
+            or (reasignar_expirados and f.id_alumno_paquete.estado == 'expirado')
+        ]
+        ocasionales = [f for f in ocasionales if _cambiar_estado(f, estados[OCASIONAL][f.pk])]
+
+        borrar, reasignadas = [], 0
+        if reasignar_expirados:
+            regulares, borrar, reasignadas = _reasignar_expirados(regulares)
+
+        AlumnoClase.objects.bulk_update(regulares, ['estado', 'id_alumno_paquete'])
+        AlumnoClaseOcasional.objects.bulk_update(ocasionales, ['estado'])
+        if borrar:
+            AlumnoClase.objects.filter(pk__in=borrar).delete()
+
+        if regulares or ocasionales or borrar:
+            recalcular_total_inscriptos(ids_clase)
+            invalidar_semanas_de_clases(ids_clase)
+            invalidar_estadisticas()
+
+    return {'actualizadas': len(regulares) + len(ocasionales), 'reasignadas': reasignadas}
+
+
+def _cambiar_estado(fila, estado):
+    """Asigna el estado y devuelve True si cambió."""
+    if fila.estado == estado:
+        return False
+    fila.estado = estado
+    return True
@@ -0,0 +1,269 @@
+"""
+Cache por semana del calendario del panel (api_calendario).
+
+Cada semana se guarda con la clave del lunes y se invalida solo cuando cambia
+algo que la afecta:
+    - AlumnoClase / AlumnoClaseOcasional: la semana de su clase (y la de la
+      clase anterior si la inscripción se movió).
+    - Clase: la semana de su fecha (y la de la fecha anterior si cambió).
+    - Turno: todas las semanas (cambian horarios y disciplinas).
+
+La clave de cada semana lleva dos versiones: la global y la de esa semana.
+Invalidar es rotar la versión (al confirmarse la transacción), no borrar la
+entrada: una semana que se estaba armando con datos viejos mientras se
+confirmaba el cambio queda guardada bajo una clave que ya nadie lee. Las
+operaciones que no disparan señales (bulk_create, QuerySet.update) deben
+llamar a `invalidar_semanas` con las fechas afectadas.
+
+Con LocMemCache cada proceso (worker de gunicorn) tiene su propio cache y solo
+ve las invalidaciones propias: las entradas vencen a los TTL_SEMANA segundos
+para que los demás workers no sirvan una semana vieja indefinidamente.
+
+Cada entrada lleva un ETag y la fecha de armado para responder 304 a los
+clientes que ya tienen la semana.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cupos import con_cupo
+from .models import AlumnoClase, AlumnoClaseOcasional, Clase, Turno
+
+PREFIJO_CACHE = "calendario:semana:v2"  # v2: cada clase trae su cupo
+CLAVE_VERSION = "calendario:version"
+
+# Red de seguridad para los procesos que no vieron la invalidación
+TTL_SEMANA = 5 * 60
+
+_local = threading.local()
+
+
+def lunes_de_semana(fecha):
+    """Lunes de la semana que muestra el calendario (el domingo pasa a la siguiente)."""
+    if fecha.weekday() == 6:
+        return fecha + timedelta(days=1)
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def _version(clave=CLAVE_VERSION):
+    version = cache.get(clave)
+    if version is None:
+        # Sin versión (primer uso o desalojada): arrancamos una nueva para no
+        # reutilizar entradas viejas
+        cache.add(clave, time.time_ns(), None)
+        version = cache.get(clave)
+    return version
+
+
+def _clave_version_semana(lunes):
+    return f"{CLAVE_VERSION}:{lunes.isoformat()}"
+
+
+def _clave(lunes):
+    return f"{PREFIJO_CACHE}:{_version()}:{_version(_clave_version_semana(lunes))}:{lunes.isoformat()}"
+
+
+def _rotar_semanas(lunes):
+    version = time.time_ns()
+    cache.set_many({_clave_version_semana(l): version for l in lunes}, None)
+
+
+def _armar_semana(inicio_semana):
+    """Grilla de la semana (lunes a sábado) con los inscriptos por clase."""
+    fin_semana = inicio_semana + timedelta(days=5)  # Sábado
+
+    # Días (lunes a sábado = 6 días)
+    dias = [
+        (inicio_semana + timedelta(days=i)).isoformat()
+        for i in range(6)
+    ]
+
+    # Horarios
+    horarios = list(
+        Turno.objects.values_list("horario", flat=True)
+        .distinct()
+        .order_by("horario")
+    )
+
+    # Clases
+    clases_semana = (
+        con_cupo(Clase.objects.filter(
+            fecha__gte=inicio_semana,
+            fecha__lte=fin_semana,
+        ))
+        .select_related("id_turno")
+    )
+
+    conteo = defaultdict(lambda: {"reg": 0, "ocas": 0})
+
+    reg = (
+        AlumnoClase.objects
+        .filter(id_clase__fecha__gte=inicio_semana, id_clase__fecha__lte=fin_semana)
+        .exclude(estado__in={"canceló", "reprogramó"})
+        .values("id_clase")
+        .annotate(c=Count("id_clase"))
+    )
+    for r in reg:
+        conteo[r["id_clase"]]["reg"] = r["c"]
+
+    ocas = (
+        AlumnoClaseOcasional.objects
+        .filter(id_clase__fecha__gte=inicio_semana, id_clase__fecha__lte=fin_semana)
+        .exclude(estado="canceló")
+        .values("id_clase")
+        .annotate(c=Count("id_clase"))
+    )
+    for o in ocas:
+        conteo[o["id_clase"]]["ocas"] = o["c"]
+
+    # Construir estructura
+    clases_dict = defaultdict(dict)
+
+    for clase in clases_semana:
+        h = clase.id_turno.horario.isoformat()
+        f = clase.fecha.isoformat()
+        total = conteo[clase.id_clase]["reg"] + conteo[clase.id_clase]["ocas"]
+        cupo = clase.cupo
+
+        if total >= cupo:
+            color = "lleno"
+        elif total >= 2:
+            color = "parcial"
+        else:
+            color = "disponible"
+
+        clases_dict[h][f] = {
+            "id": clase.id_clase,
+            "total": total,
+            "cupo": cupo,
+            "color": color,
+            "disciplina": clase.id_turno.disciplina,
+        }
+
+    return {
+        "dias": dias,
+        "horarios": horarios,
+        "clases": dict(clases_dict),
+    }
+
+
+def semana_calendario(inicio_semana):
+    """
+    Datos de la semana que empieza en `inicio_semana` (lunes), desde el cache.
+
+    Returns:
+        dict:
+            - 'datos': dias, horarios y clases (lo que devuelve api_calendario).
+            - 'etag': hash del contenido.
+            - 'modificado': datetime en que se armó la entrada.
+    """
+    # La clave se fija antes de armar: si se invalida mientras tanto, lo
+    # armado queda bajo la versión vieja
+    clave = _clave(inicio_semana)
+    entrada = cache.get(clave)
+    if entrada is None:
+        datos = _armar_semana(inicio_semana)
+        contenido = json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True)
+        entrada = {
+            "datos": datos,
+            "etag": hashlib.md5(contenido.encode()).hexdigest(),
+            "modificado": timezone.now(),
+        }
+        cache.set(clave, entrada, TTL_SEMANA)
+    return entrada
+
+
+def invalidar_semanas(fechas):
+    """Invalida (al confirmar la transacción) las semanas que contienen esas fechas."""
+    lunes = {lunes_de_semana(fecha) for fecha in fechas if fecha}
+    if not lunes:
+        return
+    transaction.on_commit(lambda: _rotar_semanas(lunes))
+
+
+def invalidar_semanas_de_clases(ids_clase):
+    """
+    Como invalidar_semanas, pero a partir de ids de Clase: las fechas se
+    resuelven al confirmar, en una sola consulta para toda la transacción.
+    """
+    pendientes = getattr(_local, 'clases', None)
+    if pendientes is None:
+        pendientes = _local.clases = set()
+    pendientes.update(id_clase for id_clase in ids_clase if id_clase)
+    # Se registra en cada llamada (no cuesta consultas): la primera en
+    # ejecutarse procesa todo el conjunto y las demás no hacen nada
+    transaction.on_commit(_invalidar_clases_pendientes)
+
+
+def _invalidar_clases_pendientes():
+    ids_clase = getattr(_local, 'clases', None)
+    _local.clases = None
+    if not ids_clase:
+        return
+    # Las clases ya borradas invalidaron su semana en su propio post_delete
+    fechas = Clase.objects.filter(pk__in=ids_clase).values_list('fecha', flat=True)
+    _rotar_semanas({lunes_de_semana(fecha) for fecha in fechas})
+
+
+def invalidar_calendario():
+    """Invalida todas las semanas (al confirmar la transacción)."""
+    transaction.on_commit(lambda: cache.set(CLAVE_VERSION, time.time_ns(), None))
+
+
+@receiver(pre_save, sender=AlumnoClase)
+@receiver(pre_save, sender=AlumnoClaseOcasional)
+def calendario_inscripcion_guardada(sender, instance, raw=False, update_fields=None, **kwargs):
+    # pre_save: `_original` todavía tiene la clase leída de la base
+    if raw:
+        return
+    if update_fields is not None and not {'estado', 'id_clase', 'id_clase_id'} & set(update_fields):
+        return
+    ids_clase = {instance.id_clase_id}
+    original = getattr(instance, '_original', None)
+    if original:
+        ids_clase.add(original[0])
+    ids_clase.discard(None)
+
+    if ids_clase == {instance.id_clase_id} and sender.id_clase.is_cached(instance):
+        invalidar_semanas([instance.id_clase.fecha])
+    else:
+        invalidar_semanas_de_clases(ids_clase)
+
+
+@receiver(post_delete, sender=AlumnoClase)
+@receiver(post_delete, sender=AlumnoClaseOcasional)
+def calendario_inscripcion_borrada(sender, instance, **kwargs):
+    if sender.id_clase.is_cached(instance):
+        invalidar_semanas([instance.id_clase.fecha])
+    else:
+        invalidar_semanas_de_clases([instance.id_clase_id])
+
+
+@receiver(pre_save, sender=Clase)
+def calendario_clase_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_semanas([instance.fecha, getattr(instance, '_fecha_original', None)])
+
+
+@receiver(post_delete, sender=Clase)
+def calendario_clase_borrada(sender, instance, **kwargs):
+    invalidar_semanas([instance.fecha])
+
+
+@receiver([post_save, post_delete], sender=Turno)
+def calendario_turno_modificado(sender, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_calendario()
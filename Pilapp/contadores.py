@@ -0,0 +1,308 @@
+"""
+Mantenimiento de contadores desnormalizados.
+
+Clase.total_inscriptos guarda los alumnos (regulares y ocasionales) que ocupan
+lugar en la clase. Cada alta, baja o cambio de estado de AlumnoClase /
+AlumnoClaseOcasional aplica un +1/-1 con `F()` según el estado anterior y el
+nuevo, sin recontar la clase.
+
+Para operaciones masivas existe `contadores_diferidos()`: dentro del bloque las
+señales solo anotan las clases (y los turnos) afectados y al confirmarse la
+transacción se recuenta una vez cada uno.
+
+Turno.lugares_ocupados guarda la cantidad de paquetes activos que tienen el
+turno asignado (AlumnoPaqueteTurno). Se mantiene con actualizaciones atómicas
+(`UPDATE ... SET lugares_ocupados = lugares_ocupados ± 1`) desde las señales
+de este módulo, de modo que verificar disponibilidad es una lectura simple
+del turno en lugar de un COUNT por turno.
+
+Las operaciones que no disparan señales (QuerySet.update, bulk_create) deben
+llamar a `recalcular_ocupacion_turnos` con los turnos afectados.
+El comando `reconciliar_ocupacion` recompone ambos contadores desde cero y
+reporta las diferencias encontradas.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import (
+    ESTADOS_SIN_CUPO_OCASIONAL,
+    ESTADOS_SIN_CUPO_REGULAR,
+    AlumnoClase,
+    AlumnoClaseOcasional,
+    AlumnoPaquete,
+    AlumnoPaqueteTurno,
+    Clase,
+    Turno,
+)
+
+_local = threading.local()
+
+
+def _ocupacion_real():
+    """Expresión con la ocupación real del turno (OuterRef('pk'))."""
+    return Coalesce(
+        Subquery(
+            AlumnoPaqueteTurno.objects.filter(
+                id_turno=OuterRef('pk'),
+                id_alumno_paquete__estado='activo'
+            ).order_by().values('id_turno').annotate(c=Count('pk')).values('c')[:1]
+        ),
+        Value(0)
+    )
+
+
+def _ajustar_si_paquete_activo(instance, delta):
+    """
+    Suma `delta` al turno de la asignación solo si su paquete está activo.
+    Se resuelve en un único UPDATE (la condición viaja como subconsulta).
+    En modo diferido solo se anota el turno.
+    """
+    if not instance.id_turno_id:
+        return
+    if _recontar_turno_diferido(instance.id_turno_id):
+        return
+    Turno.objects.filter(
+        pk=instance.id_turno_id,
+        alumnopaqueteturno__pk=instance.pk,
+        alumnopaqueteturno__id_alumno_paquete__estado='activo'
+    ).update(lugares_ocupados=F('lugares_ocupados') + delta)
+
+
+def recalcular_ocupacion_turnos(ids_turno=None):
+    """
+    Recalcula Turno.lugares_ocupados desde AlumnoPaqueteTurno.
+
+    Args:
+        ids_turno (iterable | QuerySet, opcional): turnos a recalcular.
+            Si es None se recalculan todos.
+
+    Returns:
+        int: cantidad de turnos actualizados.
+    """
+    turnos = Turno.objects.all()
+    if ids_turno is not None:
+        turnos = turnos.filter(pk__in=ids_turno)
+    return turnos.update(lugares_ocupados=_ocupacion_real())
+
+
+def diferencias_ocupacion_turnos():
+    """
+    Compara el contador guardado con la ocupación real.
+
+    Returns:
+        dict: {id_turno: (guardado, real)} solo para los turnos con diferencia.
+    """
+    filas = Turno.objects.annotate(real=_ocupacion_real()).values_list(
+        'id_turno', 'lugares_ocupados', 'real'
+    )
+    return {
+        id_turno: (guardado, real)
+        for id_turno, guardado, real in filas
+        if guardado != real
+    }
+
+
+def _recontar_turno_diferido(id_turno):
+    """Anota el turno si hay un bloque contadores_diferidos() abierto."""
+    diferidos = getattr(_local, 'turnos', None)
+    if diferidos is None:
+        return False
+    diferidos.add(id_turno)
+    return True
+
+
+@receiver(post_save, sender=AlumnoPaqueteTurno)
+def ocupacion_turno_alta(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _ajustar_si_paquete_activo(instance, 1)
+    elif not _recontar_turno_diferido(instance.id_turno_id):
+        # Reasignación de turno sobre una fila existente: recalculamos.
+        recalcular_ocupacion_turnos([instance.id_turno_id])
+
+
+@receiver(pre_delete, sender=AlumnoPaqueteTurno)
+def ocupacion_turno_baja(sender, instance, **kwargs):
+    # pre_delete: la fila (y su paquete) todavía existen para evaluar el estado
+    _ajustar_si_paquete_activo(instance, -1)
+
+
+@receiver(post_save, sender=AlumnoPaquete)
+def ocupacion_turno_cambio_estado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        instance._estado_original = instance.estado
+        return
+    estado_original = getattr(instance, '_estado_original', None)
+    if estado_original == instance.estado:
+        return
+    instance._estado_original = instance.estado
+    if estado_original is not None and 'activo' not in (estado_original, instance.estado):
+        return
+    recalcular_ocupacion_turnos(
+        AlumnoPaqueteTurno.objects.filter(id_alumno_paquete=instance).values('id_turno')
+    )
+
+
+# ---------------------------------------------------------------------------
+# Clase.total_inscriptos
+# ---------------------------------------------------------------------------
+
+def _total_inscriptos_real():
+    """Expresión con los inscriptos reales de la clase (OuterRef('pk'))."""
+    regulares = AlumnoClase.objects.filter(
+        id_clase=OuterRef('pk')
+    ).exclude(
+        estado__in=ESTADOS_SIN_CUPO_REGULAR
+    ).order_by().values('id_clase').annotate(c=Count('pk')).values('c')[:1]
+    ocasionales = AlumnoClaseOcasional.objects.filter(
+        id_clase=OuterRef('pk')
+    ).exclude(
+        estado__in=ESTADOS_SIN_CUPO_OCASIONAL
+    ).order_by().values('id_clase').annotate(c=Count('pk')).values('c')[:1]
+    return Coalesce(Subquery(regulares), Value(0)) + Coalesce(Subquery(ocasionales), Value(0))
+
+
+def recalcular_total_inscriptos(ids_clase=None):
+    """
+    Recalcula Clase.total_inscriptos desde AlumnoClase y AlumnoClaseOcasional.
+
+    Args:
+        ids_clase (iterable | QuerySet, opcional): clases a recalcular.
+            Si es None se recalculan todas.
+
+    Returns:
+        int: cantidad de clases actualizadas.
+    """
+    clases = Clase.objects.all()
+    if ids_clase is not None:
+        clases = clases.filter(pk__in=ids_clase)
+    return clases.update(total_inscriptos=_total_inscriptos_real())
+
+
+def diferencias_total_inscriptos():
+    """
+    Compara Clase.total_inscriptos con los inscriptos reales.
+
+    Returns:
+        dict: {id_clase: (guardado, real)} solo para las clases con diferencia.
+    """
+    filas = Clase.objects.annotate(real=_total_inscriptos_real()).values_list(
+        'id_clase', 'total_inscriptos', 'real'
+    )
+    return {
+        id_clase: (guardado, real)
+        for id_clase, guardado, real in filas
+        if guardado != real
+    }
+
+
+def con_inscriptos_reales(clases):
+    """Anota `inscriptos` (recuento real, no el contador) en un QuerySet de Clase."""
+    return clases.annotate(inscriptos=_total_inscriptos_real())
+
+
+@contextmanager
+def contadores_diferidos():
+    """
+    Difiere el mantenimiento de Clase.total_inscriptos y Turno.lugares_ocupados
+    (altas y bajas de AlumnoPaqueteTurno) hasta el commit.
+
+    Dentro del bloque las señales solo registran las clases y turnos tocados; al
+    salir se programa (transaction.on_commit) un único recuento por clase y por
+    turno. Si no hay transacción abierta el recuento se ejecuta al salir del
+    bloque. Los bloques anidados se acumulan en el más externo.
+
+    Se puede usar como decorador: @contadores_diferidos()
+    """
+    if getattr(_local, 'clases', None) is not None:
+        yield
+        return
+
+    _local.clases = set()
+    _local.turnos = set()
+    try:
+        yield
+    finally:
+        ids_clase = _local.clases
+        ids_turno = _local.turnos
+        _local.clases = None
+        _local.turnos = None
+        if ids_clase:
+            transaction.on_commit(lambda: recalcular_total_inscriptos(ids_clase))
+        if ids_turno:
+            transaction.on_commit(lambda: recalcular_ocupacion_turnos(ids_turno))
+
+
+def _ocupa_lugar(modelo, estado):
+    sin_cupo = ESTADOS_SIN_CUPO_REGULAR if modelo is AlumnoClase else ESTADOS_SIN_CUPO_OCASIONAL
+    return estado not in sin_cupo
+
+
+def _aplicar_deltas(deltas):
+    """Aplica {id_clase: delta} o, en modo diferido, solo anota las clases."""
+    diferidas = getattr(_local, 'clases', None)
+    for id_clase, delta in deltas.items():
+        if not id_clase or not delta:
+            continue
+        if diferidas is not None:
+            diferidas.add(id_clase)
+        else:
+            Clase.objects.filter(pk=id_clase).update(total_inscriptos=F('total_inscriptos') + delta)
+
+
+def _recontar_clase(id_clase):
+    diferidas = getattr(_local, 'clases', None)
+    if diferidas is not None:
+        diferidas.add(id_clase)
+    elif id_clase:
+        recalcular_total_inscriptos([id_clase])
+
+
+@receiver(post_save, sender=AlumnoClase)
+@receiver(post_save, sender=AlumnoClaseOcasional)
+def total_inscriptos_guardado(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'estado', 'id_clase', 'id_clase_id'} & set(update_fields):
+        return
+
+    nuevo = (instance.id_clase_id, instance.estado)
+    original = None if created else getattr(instance, '_original', None)
+    instance._original = nuevo
+
+    if created:
+        if _ocupa_lugar(sender, nuevo[1]):
+            _aplicar_deltas({nuevo[0]: 1})
+        return
+
+    if original is None:
+        # Instancia armada a mano (no leída de la base): no conocemos el estado previo
+        _recontar_clase(nuevo[0])
+        return
+
+    if original == nuevo:
+        return
+
+    deltas = {}
+    if _ocupa_lugar(sender, original[1]):
+        deltas[original[0]] = deltas.get(original[0], 0) - 1
+    if _ocupa_lugar(sender, nuevo[1]):
+        deltas[nuevo[0]] = deltas.get(nuevo[0], 0) + 1
+    _aplicar_deltas(deltas)
+
+
+@receiver(post_delete, sender=AlumnoClase)
+@receiver(post_delete, sender=AlumnoClaseOcasional)
+def total_inscriptos_borrado(sender, instance, **kwargs):
+    id_clase, estado = getattr(instance, '_original', (instance.id_clase_id, instance.estado))
+    if _ocupa_lugar(sender, estado):
+        _aplicar_deltas({id_clase: -1})
@@ -0,0 +1,110 @@
+"""
+Reserva de lugares en clases con control de cupo bajo concurrencia.
+
+Validar el cupo y después insertar la inscripción (leer → escribir) deja una
+ventana: dos conversaciones del bot que reservan el último lugar a la vez
+pasan las dos la validación y la clase queda con 5/4. `reservar_lugares`
+cierra esa ventana:
+    1. Bloquea las filas de Clase, en orden de pk para no generar deadlocks.
+       En Postgres es un SELECT ... FOR UPDATE; en SQLite (sin bloqueo por
+       fila) una escritura nula sobre las clases toma el lock de escritura de
+       la base, así que las reservas quedan serializadas.
+    2. Recién con el lock tomado recuenta los inscriptos reales (consulta
+       aparte: en Postgres ve lo que confirmó quien tenía el lock antes).
+    3. Si alguna clase no tiene lugar, lanza SinCupo.
+
+El cupo de cada clase es Clase.capacidad o, si no tiene, Turno.capacidad;
+`cupo_clase()` lo resuelve dentro de la misma consulta que cuenta inscriptos.
+
+Se llama dentro de la transacción que crea las inscripciones, justo antes de
+crearlas; el lock se mantiene hasta el commit. Si la base no puede dar el
+lock (SQLite ocupado por otra escritura, deadlock detectado en Postgres) se
+lanza SinCupo con un mensaje para reintentar: nunca se sobrevende.
+"""
+from collections import Counter
+
+from django.db import OperationalError, connection, transaction
+from django.db.transaction import TransactionManagementError
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from .contadores import con_inscriptos_reales
+from .models import Clase
+
+MENSAJE_REINTENTAR = "Hay otra reserva en curso para esa clase. Intentá de nuevo en unos segundos."
+
+
+class SinCupo(ValueError):
+    """Alguna clase pedida no tiene lugar (o no se pudo bloquear para validarla)."""
+
+    def __init__(self, mensajes):
+        self.mensajes = list(mensajes)
+        super().__init__("; ".join(self.mensajes))
+
+
+def cupo_clase(prefijo=""):
+    """
+    Expresión con el cupo de la clase: su capacidad o la del turno.
+
+    Args:
+        prefijo (str): camino hasta Clase desde el modelo consultado
+            (p. ej. "id_clase__" desde AlumnoClase).
+    """
+    return Coalesce(F(f"{prefijo}capacidad"), F(f"{prefijo}id_turno__capacidad"))
+
+
+def con_cupo(clases):
+    """Anota `cupo` en un QuerySet de Clase."""
+    return clases.annotate(cupo=cupo_clase())
+
+
+def bloquear_clases(ids_clase):
+    """
+    Toma el lock de escritura de las clases hasta el fin de la transacción.
+
+    Raises:
+        TransactionManagementError: si no hay una transacción abierta.
+        SinCupo: si la base no pudo dar el lock.
+    """
+    ids = sorted(set(ids_clase))
+    if not ids:
+        return
+    if not connection.in_atomic_block:
+        raise TransactionManagementError("bloquear_clases() debe llamarse dentro de una transacción.")
+    try:
+        with transaction.atomic():
+            if connection.features.has_select_for_update:
+                list(Clase.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+            else:
+                Clase.objects.filter(pk__in=ids).update(total_inscriptos=F('total_inscriptos'))
+    except OperationalError:
+        raise SinCupo([MENSAJE_REINTENTAR])
+
+
+def reservar_lugares(clases):
+    """
+    Bloquea las clases y verifica que les quede lugar para las inscripciones
+    que se van a crear.
+
+    Args:
+        clases (iterable[Clase | int]): una entrada por inscripción nueva (la
+            misma clase puede repetirse).
+
+    Raises:
+        SinCupo: con un mensaje por clase llena.
+    """
+    pedidos = Counter(clase.pk if isinstance(clase, Clase) else clase for clase in clases)
+    if not pedidos:
+        return
+    bloquear_clases(pedidos)
+
+    filas = con_cupo(con_inscriptos_reales(Clase.objects.filter(pk__in=pedidos))).order_by(
+        'fecha', 'id_turno__horario'
+    ).values_list('pk', 'fecha', 'id_turno__horario', 'inscriptos', 'cupo')
+    mensajes = [
+        f"La clase del {fecha} a las {horario.strftime('%H:%M')} ya está llena."
+        for id_clase, fecha, horario, inscriptos, cupo in filas
+        if inscriptos + pedidos[id_clase] > cupo
+    ]
+    if mensajes:
+        raise SinCupo(mensajes)
@@ -0,0 +1,92 @@
+"""
+Estadísticas del dashboard del panel.
+
+`calcular_estadisticas` resuelve los ocho números del dashboard con agregados
+condicionales (tres consultas en lugar de un COUNT por número).
+`estadisticas_dashboard` las sirve desde el cache con un TTL corto; cualquier
+alta, baja o modificación de los modelos involucrados descarta la entrada al
+confirmarse la transacción.
+
+El comando `estadisticas` expone los mismos números para reportes por cron.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Alumno, AlumnoClase, AlumnoPaquete, Clase, ClienteProspecto
+
+CLAVE_CACHE = "estadisticas:dashboard"
+
+# Segundos que se reutilizan las estadísticas (acota lo que no dispara señales)
+TTL_ESTADISTICAS = 60
+
+
+def calcular_estadisticas(hoy=None):
+    """
+    Estadísticas del dashboard para la semana (lunes a domingo) de `hoy`.
+
+    Returns:
+        dict: alumnos_regulares, alumnos_ocasionales, pagos_pendientes,
+        clases_hoy, clases_semana, asistencias_semana, inasistencias_semana
+        y prospectos_nuevos.
+    """
+    hoy = hoy or timezone.localdate()
+    inicio_semana = hoy - timedelta(days=hoy.weekday())
+    fin_semana = inicio_semana + timedelta(days=6)
+
+    # Alumnos por estado y paquetes con pago pendiente (LEFT JOIN a sus paquetes)
+    stats = Alumno.objects.aggregate(
+        alumnos_regulares=Count('pk', distinct=True, filter=Q(estado='regular')),
+        alumnos_ocasionales=Count('pk', distinct=True, filter=Q(estado='ocasional')),
+        pagos_pendientes=Count('alumnopaquete', filter=Q(alumnopaquete__estado_pago='pendiente')),
+    )
+
+    # Clases de la semana (hoy incluido) con sus asistencias (LEFT JOIN a AlumnoClase)
+    stats.update(
+        Clase.objects.filter(
+            fecha__gte=inicio_semana,
+            fecha__lte=fin_semana,
+        ).aggregate(
+            clases_hoy=Count('pk', distinct=True, filter=Q(fecha=hoy)),
+            clases_semana=Count('pk', distinct=True),
+            asistencias_semana=Count('alumnoclase', filter=Q(alumnoclase__estado='asistió')),
+            inasistencias_semana=Count('alumnoclase', filter=Q(alumnoclase__estado='faltó')),
+        )
+    )
+
+    stats['prospectos_nuevos'] = ClienteProspecto.objects.filter(
+        fecha_contacto__gte=inicio_semana
+    ).count()
+
+    return stats
+
+
+def estadisticas_dashboard():
+    """Estadísticas de hoy desde el cache (ver calcular_estadisticas)."""
+    hoy = timezone.localdate()
+    entrada = cache.get(CLAVE_CACHE)
+    if entrada is None or entrada['fecha'] != hoy:
+        entrada = {'fecha': hoy, 'stats': calcular_estadisticas(hoy)}
+        cache.set(CLAVE_CACHE, entrada, TTL_ESTADISTICAS)
+    return entrada['stats']
+
+
+def invalidar_estadisticas():
+    """Descarta las estadísticas cacheadas al confirmar la transacción."""
+    transaction.on_commit(lambda: cache.delete(CLAVE_CACHE))
+
+
+@receiver([post_save, post_delete], sender=Alumno)
+@receiver([post_save, post_delete], sender=AlumnoPaquete)
+@receiver([post_save, post_delete], sender=Clase)
+@receiver([post_save, post_delete], sender=AlumnoClase)
+@receiver([post_save, post_delete], sender=ClienteProspecto)
+def estadisticas_modificadas(sender, raw=False, **kwargs):
+    if raw:
+        return
+    invalidar_estadisticas()
@@ -0,0 +1,118 @@
+"""
+Calendario de feriados.
+
+- `fechas_feriado`: conjunto de fechas de Feriado, cacheado hasta que se guarde
+  o borre algún Feriado. La clave lleva una versión que se rota al confirmar
+  el cambio, así que un conjunto leído mientras se confirmaba queda bajo una
+  clave vieja. Como con LocMemCache cada worker solo ve sus propias
+  invalidaciones, la entrada además vence a los TTL_FERIADOS segundos.
+- `proximas_fechas`: próximas N fechas de un día de la semana desde una fecha,
+  salteando feriados.
+- `series_turnos`: lo mismo para muchos turnos a la vez, con un único conjunto
+  de feriados.
+
+Todo trabaja con objetos `date`; no hay conversiones a texto.
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Feriado
+
+CLAVE_CACHE = "feriados:fechas"
+CLAVE_VERSION = "feriados:version"
+
+# Corto: con los feriados se generan y reservan clases
+TTL_FERIADOS = 60
+
+# Días en que hay turnos (weekday de Python)
+INDICE_DIAS = {
+    "Lunes": 0,
+    "Martes": 1,
+    "Miércoles": 2,
+    "Jueves": 3,
+    "Viernes": 4,
+    "Sábado": 5,
+}
+
+
+def fechas_feriado():
+    """Fechas de feriado (frozenset[date]). Cacheado."""
+    clave = f"{CLAVE_CACHE}:{_version()}"
+    fechas = cache.get(clave)
+    if fechas is None:
+        fechas = frozenset(Feriado.objects.values_list('fecha', flat=True))
+        cache.set(clave, fechas, TTL_FERIADOS)
+    return fechas
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def es_feriado(fecha):
+    return fecha in fechas_feriado()
+
+
+def proximas_fechas(dia_semana, desde, n, feriados=None):
+    """
+    Próximas `n` fechas cuyo weekday es `dia_semana`, a partir de `desde`
+    (inclusive), salteando feriados.
+
+    Args:
+        dia_semana (int): 0 = lunes ... 6 = domingo.
+        desde (date)
+        n (int)
+        feriados (set[date], opcional): por defecto, fechas_feriado().
+
+    Returns:
+        list[date]
+    """
+    if feriados is None:
+        feriados = fechas_feriado()
+
+    fecha = desde + timedelta(days=(dia_semana - desde.weekday()) % 7)
+    fechas = []
+    while len(fechas) < n:
+        if fecha not in feriados:
+            fechas.append(fecha)
+        fecha += timedelta(weeks=1)
+    return fechas
+
+
+def series_turnos(pedidos, feriados=None):
+    """
+    Fechas de muchos turnos a la vez.
+
+    Args:
+        pedidos (iterable): tuplas (turno, desde, n). Los turnos con un día sin
+            clases (p. ej. Domingo) no generan fechas.
+        feriados (set[date], opcional): por defecto, fechas_feriado().
+
+    Returns:
+        list[tuple[Turno, date]]: pares (turno, fecha) en el orden de los pedidos.
+    """
+    if feriados is None:
+        feriados = fechas_feriado()
+
+    pares = []
+    for turno, desde, n in pedidos:
+        if turno.dia not in INDICE_DIAS:
+            continue
+        pares.extend((turno, fecha) for fecha in proximas_fechas(INDICE_DIAS[turno.dia], desde, n, feriados))
+    return pares
+
+
+@receiver([post_save, post_delete], sender=Feriado)
+def invalidar_feriados(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: cache.set(CLAVE_VERSION, time.time_ns(), None))
@@ -0,0 +1,121 @@
+"""
+Línea de tiempo de un alumno para el panel (panel_alumno_detalle).
+
+- `paquetes_con_uso`: paquetes del alumno con clases usadas y saldo anotados.
+- `historial_clases`: clases regulares y ocasionales unidas con UNION ALL,
+  ordenadas y paginadas en la base.
+- `horarios_turnos`: horarios distintos de los turnos, cacheados hasta que
+  cambie algún Turno (o por TTL_HORARIOS segundos: con cache por proceso, los
+  otros workers no ven la invalidación).
+
+Un alumno con años de historia carga con la misma cantidad de consultas que
+uno nuevo: solo se trae la página del historial que se muestra.
+"""
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, F, Q, Value, CharField
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AlumnoClase, AlumnoClaseOcasional, AlumnoPaquete, Turno
+
+HISTORIAL_POR_PAGINA = 50
+
+CLAVE_CACHE_HORARIOS = "historial:horarios_turnos"
+TTL_HORARIOS = 5 * 60
+
+# Estados de AlumnoClase que consumen una clase del paquete
+ESTADOS_CLASE_USADA = ['asistió', 'faltó', 'recuperó']
+
+
+def paquetes_con_uso(alumno):
+    """
+    Paquetes del alumno (más recientes primero) en una sola consulta, con:
+        - usadas: clases consumidas (asistió, faltó, recuperó).
+        - total_pagado / restante: ver AlumnoPaquete.objects.with_balances().
+
+    Además se completan en memoria `clases_usadas` y `porcentaje_uso`, que es lo
+    que muestra el template.
+    """
+    paquetes = list(
+        AlumnoPaquete.objects
+        .with_balances()
+        .filter(id_alumno=alumno)
+        .select_related('id_paquete')
+        .annotate(usadas=Count('alumnoclase', filter=Q(alumnoclase__estado__in=ESTADOS_CLASE_USADA)))
+        .order_by('-id_alumno_paquete')
+    )
+    for paquete in paquetes:
+        paquete.clases_usadas = paquete.usadas
+        total = paquete.id_paquete.cantidad_clases
+        paquete.porcentaje_uso = (paquete.usadas / total * 100) if total > 0 else 0
+    return paquetes
+
+
+def historial_clases(alumno, pagina=1, por_pagina=HISTORIAL_POR_PAGINA):
+    """
+    Historial de clases (regulares + ocasionales) del alumno, de la más reciente
+    a la más antigua, resuelto con UNION ALL y paginado en la base.
+
+    Returns:
+        Page: cada elemento es un dict con id_relacion, id_clase, fecha,
+        horario ("HH:MM"), disciplina, tipo ('regular' | 'ocasional') y estado.
+    """
+    columnas = ('id_relacion', 'id_clase_ref', 'fecha', 'horario_turno', 'disciplina', 'tipo', 'estado')
+
+    regulares = AlumnoClase.objects.filter(
+        id_alumno_paquete__id_alumno=alumno
+    ).annotate(
+        id_relacion=F('id_alumno_clase'),
+        id_clase_ref=F('id_clase_id'),
+        fecha=F('id_clase__fecha'),
+        horario_turno=F('id_clase__id_turno__horario'),
+        disciplina=F('id_clase__id_turno__disciplina'),
+        tipo=Value('regular', output_field=CharField()),
+    ).values(*columnas)
+
+    ocasionales = AlumnoClaseOcasional.objects.filter(
+        id_alumno=alumno
+    ).annotate(
+        id_relacion=F('id_alumno_clase_ocasional'),
+        id_clase_ref=F('id_clase_id'),
+        fecha=F('id_clase__fecha'),
+        horario_turno=F('id_clase__id_turno__horario'),
+        disciplina=F('id_clase__id_turno__disciplina'),
+        tipo=Value('ocasional', output_field=CharField()),
+    ).values(*columnas)
+
+    historial = regulares.union(ocasionales, all=True).order_by('-fecha', '-horario_turno', 'tipo', '-id_relacion')
+
+    pagina = Paginator(historial, por_pagina).get_page(pagina)
+    pagina.object_list = [
+        {
+            'id_relacion': fila['id_relacion'],
+            'id_clase': fila['id_clase_ref'],
+            'fecha': fila['fecha'],
+            'horario': fila['horario_turno'].strftime('%H:%M'),
+            'disciplina': fila['disciplina'],
+            'tipo': fila['tipo'],
+            'estado': fila['estado'],
+        }
+        for fila in pagina.object_list
+    ]
+    return pagina
+
+
+def horarios_turnos():
+    """Horarios distintos ("HH:MM", ordenados) de todos los turnos. Cacheado."""
+    horarios = cache.get(CLAVE_CACHE_HORARIOS)
+    if horarios is None:
+        horarios = [
+            h.strftime('%H:%M')
+            for h in Turno.objects.order_by('horario').values_list('horario', flat=True).distinct()
+        ]
+        cache.set(CLAVE_CACHE_HORARIOS, horarios, TTL_HORARIOS)
+    return horarios
+
+
+@receiver([post_save, post_delete], sender=Turno)
+def invalidar_horarios_turnos(sender, **kwargs):
+    transaction.on_commit(lambda: cache.delete(CLAVE_CACHE_HORARIOS))
@@ -0,0 +1,147 @@
+"""
+Identificación de personas y alumnos a partir de los datos que manda el bot.
+
+Cada pedido del bot llega con teléfono y, a veces, nombre y apellido. Persona
+guarda dos columnas precalculadas en `save()`:
+    - telefono_normalizado: solo dígitos, sin prefijo de país (595) ni el 0
+      inicial, de modo que "+595 981 123-456", "0981123456" y "981123456" son
+      el mismo número. Tiene índice propio.
+    - nombre_normalizado: "nombre apellido" en minúsculas, sin acentos y con
+      los espacios colapsados.
+
+`identificar()` resuelve todo con una sola consulta por teléfono (Persona con
+LEFT JOIN a Alumno) y devuelve un `Identificacion` con uno de tres estados:
+SIN_COINCIDENCIA, UNICA o AMBIGUA.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from .models import Persona
+from .nombres import IndiceNombres, normalizar
+
+SIN_COINCIDENCIA = "sin_coincidencia"
+UNICA = "unica"
+AMBIGUA = "ambigua"
+
+PREFIJO_PAIS = "595"
+
+
+def normalizar_nombre(nombre, apellido=""):
+    """ "  José  Pérez " → "jose perez" (lo que se guarda en Persona.nombre_normalizado)."""
+    return " ".join(normalizar(f"{nombre or ''} {apellido or ''}").split())
+
+
+def normalizar_telefono(telefono):
+    """
+    Deja solo los dígitos del número nacional:
+        "+595 981 123-456" / "00595981123456" / "0981 123456" → "981123456"
+
+    El prefijo 595 solo se quita si lo que queda tiene largo de número
+    nacional (8 dígitos o más), para no recortar números cortos.
+    """
+    digitos = re.sub(r"\D", "", telefono or "")
+    if digitos.startswith("00" + PREFIJO_PAIS):
+        digitos = digitos[2:]
+    if digitos.startswith(PREFIJO_PAIS) and len(digitos) - len(PREFIJO_PAIS) >= 8:
+        digitos = digitos[len(PREFIJO_PAIS):]
+    if digitos.startswith("0"):
+        digitos = digitos[1:]
+    return digitos
+
+
+@dataclass(frozen=True)
+class Candidato:
+    id_persona: int
+    nombre: str
+    apellido: str
+    nombre_normalizado: str
+    id_alumno: Optional[int] = None
+    estado_alumno: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Identificacion:
+    """
+    Resultado de `identificar()`.
+
+    estado:
+        SIN_COINCIDENCIA → nadie con ese teléfono (o el nombre no coincide con
+                           el único candidato, si se exigió nombre).
+        UNICA            → `candidato` es la persona identificada.
+        AMBIGUA          → varias personas posibles; `candidatos` son las que
+                           empatan. `mismo_nombre` indica si empatan incluso
+                           por nombre y apellido exactos.
+    """
+    estado: str
+    candidatos: tuple = ()
+    mismo_nombre: bool = False
+
+    @property
+    def unica(self):
+        return self.estado == UNICA
+
+    @property
+    def candidato(self):
+        return self.candidatos[0] if self.unica else None
+
+    @property
+    def id_alumno(self):
+        return self.candidato.id_alumno if self.unica else None
+
+
+def _candidatos(telefono, solo_alumnos):
+    """Personas con ese teléfono (una fila por persona) en una consulta."""
+    personas = Persona.objects.filter(telefono_normalizado=telefono)
+    if solo_alumnos:
+        personas = personas.filter(alumno__isnull=False)
+    filas = personas.order_by('id_persona', 'alumno__id_alumno').values_list(
+        'id_persona', 'nombre', 'apellido', 'nombre_normalizado', 'alumno__id_alumno', 'alumno__estado'
+    )
+    vistos = {}
+    for fila in filas:
+        vistos.setdefault(fila[0], Candidato(*fila))
+    return list(vistos.values())
+
+
+def identificar(telefono, nombre="", apellido="", solo_alumnos=False, difuso=False, exigir_nombre=False):
+    """
+    Identifica a la persona (y su alumno, si lo tiene) por teléfono y nombre.
+
+    Args:
+        telefono (str): en cualquier formato; se normaliza.
+        nombre, apellido (str): para desempatar entre personas con el mismo
+            teléfono (comparación sin mayúsculas, acentos ni espacios extra).
+        solo_alumnos (bool): descarta las personas que no son alumnos.
+        difuso (bool): si no hay coincidencia exacta de nombre, prueba con
+            coincidencia parcial o aproximada (ver nombres.py).
+        exigir_nombre (bool): valida el nombre aunque haya un solo candidato.
+
+    Returns:
+        Identificacion
+    """
+    telefono = normalizar_telefono(telefono)
+    if not telefono:
+        return Identificacion(SIN_COINCIDENCIA)
+
+    candidatos = _candidatos(telefono, solo_alumnos)
+    if not candidatos:
+        return Identificacion(SIN_COINCIDENCIA)
+    if len(candidatos) == 1 and not exigir_nombre:
+        return Identificacion(UNICA, tuple(candidatos))
+
+    buscado = normalizar_nombre(nombre, apellido)
+    exactos = [c for c in candidatos if buscado and c.nombre_normalizado == buscado]
+    if len(exactos) == 1:
+        return Identificacion(UNICA, tuple(exactos))
+    if len(exactos) > 1:
+        return Identificacion(AMBIGUA, tuple(exactos), mismo_nombre=True)
+
+    if difuso:
+        match = IndiceNombres((c, c.nombre_normalizado) for c in candidatos).buscar(nombre, apellido)
+        if match:
+            return Identificacion(UNICA, (match,))
+
+    if len(candidatos) == 1:
+        return Identificacion(SIN_COINCIDENCIA)
+    return Identificacion(AMBIGUA, tuple(candidatos))
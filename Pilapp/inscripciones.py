@@ -0,0 +1,477 @@
+"""
+Motor de inscripciones en lote.
+
+Resuelve en pocas consultas lo que antes se hacía turno por turno y clase por
+clase:
+    - `resolver_turnos`: todos los turnos pedidos (por id o "Día HH:MM [Disciplina]")
+      en una sola consulta.
+    - `clases_con_inscriptos`: las clases destino en una sola consulta, con los
+      inscriptos reales anotados para validar el cupo.
+    - `crear_clases_faltantes`: las clases que todavía no existen, con bulk_create.
+    - `reservar_clases`: AlumnoPaqueteTurno y AlumnoClase con bulk_create y un
+      único recálculo de contadores al final.
+    - `cambiar_turnos`: reemplazo de los turnos de un paquete tocando solo las
+      reservas futuras que cambian.
+    - `ejecutar_renovacion`: renovación completa sobre estos pasos, con modo
+      simulación (`solo_simular`) que devuelve el plan y los conflictos.
+
+bulk_create no dispara señales: `reservar_clases` y `crear_clases_faltantes` se
+encargan de recalcular los contadores y de invalidar los caches afectados.
+
+Las validaciones de cupo previas (`clases_con_inscriptos`) son sin bloqueo y
+sirven para juntar todos los errores; el control definitivo lo hace
+`reservar_clases` con las clases bloqueadas (ver cupos.py).
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .calendario import invalidar_semanas
+from .contadores import con_inscriptos_reales, recalcular_ocupacion_turnos, recalcular_total_inscriptos
+from .cupos import SinCupo, con_cupo, reservar_lugares
+from .estadisticas import invalidar_estadisticas
+from .feriados import series_turnos
+from .models import AlumnoClase, AlumnoPaqueteTurno, Clase, Instructor, Turno
+
+def _parsear_turno(turno_str):
+    """
+    "12" -> ('id', 12)
+    "Jueves 19:30" / "Jueves 19:30 Mat" -> ('texto', ('Jueves', time(19, 30), 'MAT'))
+    Devuelve None si el texto no tiene el formato esperado.
+    """
+    if str(turno_str).isdigit():
+        return ('id', int(turno_str))
+    parts = str(turno_str).split()
+    if len(parts) < 2:
+        return None
+    try:
+        horario = datetime.strptime(parts[1], "%H:%M").time()
+    except ValueError:
+        return None
+    disciplina = parts[2] if len(parts) > 2 else 'Reformer'
+    disciplina = 'MAT' if disciplina.upper() == 'MAT' else disciplina.capitalize()
+    return ('texto', (parts[0], horario, disciplina))
+
+
+def resolver_turnos(turnos_str):
+    """
+    Busca en una sola consulta los turnos pedidos.
+
+    Args:
+        turnos_str (list): ids ("12") o textos del bot ("Jueves 19:30 Mat").
+
+    Returns:
+        tuple: (turnos, errores)
+            - turnos: lista de Turno en el orden pedido (sin los inexistentes).
+            - errores: mensajes para los turnos que no existen.
+    """
+    claves = [(turno_str, _parsear_turno(turno_str)) for turno_str in turnos_str]
+
+    filtro = Q(pk__in=[clave[1] for _, clave in claves if clave and clave[0] == 'id'])
+    for _, clave in claves:
+        if clave and clave[0] == 'texto':
+            dia, horario, disciplina = clave[1]
+            filtro |= Q(dia=dia, horario=horario, disciplina=disciplina)
+
+    por_id = {}
+    por_texto = {}
+    for turno in Turno.objects.filter(filtro):
+        por_id[turno.id_turno] = turno
+        por_texto[(turno.dia, turno.horario, turno.disciplina)] = turno
+
+    turnos = []
+    errores = []
+    for turno_str, clave in claves:
+        turno = None
+        if clave:
+            turno = por_id.get(clave[1]) if clave[0] == 'id' else por_texto.get(clave[1])
+        if turno is None:
+            errores.append(f"El turno {turno_str} no existe.")
+        else:
+            turnos.append(turno)
+    return turnos, errores
+
+
+def clases_existentes(pares, con_inscriptos=False):
+    """
+    Clases existentes para los pares (turno, fecha) en una sola consulta.
+    Con `con_inscriptos=True` se anotan `inscriptos` (recuento real) y `cupo`.
+
+    Returns:
+        dict: {(id_turno, fecha): Clase}
+    """
+    pares = {(turno.id_turno if isinstance(turno, Turno) else turno, fecha) for turno, fecha in pares}
+    if not pares:
+        return {}
+    clases = Clase.objects.filter(
+        id_turno_id__in={id_turno for id_turno, _ in pares},
+        fecha__in={fecha for _, fecha in pares},
+    )
+    if con_inscriptos:
+        clases = con_cupo(con_inscriptos_reales(clases))
+    # El filtro trae el producto turnos x fechas: nos quedamos con los pares pedidos
+    return {
+        (clase.id_turno_id, clase.fecha): clase
+        for clase in clases
+        if (clase.id_turno_id, clase.fecha) in pares
+    }
+
+
+def clases_con_inscriptos(pares):
+    """Como clases_existentes, con `inscriptos` y `cupo` anotados para validar el cupo."""
+    return clases_existentes(pares, con_inscriptos=True)
+
+
+def crear_clases_faltantes(pares, existentes):
+    """
+    Crea con bulk_create las clases de `pares` que no están en `existentes`
+    (dict devuelto por clases_con_inscriptos) y las agrega al dict.
+
+    Returns:
+        int: cantidad de clases creadas.
+    """
+    faltantes = {
+        (turno.id_turno, fecha): turno
+        for turno, fecha in pares
+        if (turno.id_turno, fecha) not in existentes
+    }
+    if not faltantes:
+        return 0
+
+    instructora = Instructor.objects.first()  # Primera instructora por defecto
+    Clase.objects.bulk_create(
+        [Clase(id_instructor=instructora, id_turno=turno, fecha=fecha) for (_, fecha), turno in faltantes.items()],
+        ignore_conflicts=True,
+    )
+    # ignore_conflicts no devuelve los ids: releemos las clases creadas
+    creadas = Clase.objects.filter(
+        id_turno_id__in={id_turno for id_turno, _ in faltantes},
+        fecha__in={fecha for _, fecha in faltantes},
+    )
+    for clase in creadas:
+        clave = (clase.id_turno_id, clase.fecha)
+        if clave in faltantes:
+            clase.inscriptos = 0
+            clase.cupo = faltantes[clave].capacidad
+            existentes[clave] = clase
+
+    invalidar_semanas({fecha for _, fecha in faltantes})
+    invalidar_estadisticas()
+    return len(faltantes)
+
+
+def reservar_clases(alumno_paquete, turnos, clases, estado="pendiente"):
+    """
+    Asigna los turnos al paquete e inscribe al alumno en las clases, en lote.
+
+    - AlumnoPaqueteTurno: uno por turno que el paquete todavía no tenga.
+    - AlumnoClase: uno por clase, con el estado indicado.
+    Al final recalcula una sola vez Turno.lugares_ocupados y
+    Clase.total_inscriptos de lo afectado.
+
+    Antes de insertar bloquea las clases y valida el cupo (reservar_lugares):
+    el lock dura hasta el commit de la transacción externa.
+
+    Returns:
+        dict: {'turnos_asignados': int, 'clases_reservadas': int}
+
+    Raises:
+        SinCupo: si alguna clase ya no tiene lugar.
+    """
+    with transaction.atomic():
+        reservar_lugares(clases)
+
+        ya_asignados = set(
+            AlumnoPaqueteTurno.objects.filter(
+                id_alumno_paquete=alumno_paquete
+            ).values_list('id_turno_id', flat=True)
+        )
+
+        nuevos_turnos = []
+        for turno in turnos:
+            if turno.id_turno not in ya_asignados:
+                ya_asignados.add(turno.id_turno)
+                nuevos_turnos.append(turno)
+
+        AlumnoPaqueteTurno.objects.bulk_create([
+            AlumnoPaqueteTurno(id_alumno_paquete=alumno_paquete, id_turno=turno)
+            for turno in nuevos_turnos
+        ])
+        AlumnoClase.objects.bulk_create([
+            AlumnoClase(id_alumno_paquete=alumno_paquete, id_clase=clase, estado=estado)
+            for clase in clases
+        ])
+
+        if nuevos_turnos:
+            recalcular_ocupacion_turnos([turno.id_turno for turno in nuevos_turnos])
+        if clases:
+            recalcular_total_inscriptos([clase.id_clase for clase in clases])
+            invalidar_semanas({clase.fecha for clase in clases})
+            invalidar_estadisticas()
+
+    return {'turnos_asignados': len(nuevos_turnos), 'clases_reservadas': len(clases)}
+
+
+def distribuir_clases(cantidad_clases, turnos):
+    """Reparte las clases entre los turnos; los primeros reciben el resto."""
+    base, extra = divmod(cantidad_clases, len(turnos)) if turnos else (0, 0)
+    return [(turno, base + (1 if idx < extra else 0)) for idx, turno in enumerate(turnos)]
+
+
+def planificar_renovacion(alumno, paquete, turnos_nuevos=(), fecha_inicio=None):
+    """
+    Arma el plan de renovación sin escribir nada.
+
+    Turnos: los de los paquetes activos del alumno más `turnos_nuevos`
+    (ids o "Día HH:MM [Disciplina]"; deben tener lugar en el turno). Las clases
+    del paquete se reparten entre esos turnos desde `fecha_inicio` (o desde la
+    próxima fecha de cada turno), salteando feriados.
+
+    Las reservas pendientes a futuro de los paquetes activos se liberan al
+    renovar, así que no cuentan como duplicado ni ocupan cupo.
+
+    Args:
+        alumno (Alumno)
+        paquete (Paquete)
+        turnos_nuevos (iterable[str])
+        fecha_inicio (date, opcional)
+
+    Returns:
+        dict:
+            - 'paquetes_activos': list[AlumnoPaquete] que se van a expirar.
+            - 'turnos_anteriores': list[Turno] de esos paquetes.
+            - 'turnos': list[Turno] del paquete nuevo.
+            - 'reservas': list[{'turno', 'fecha', 'clase'}] ('clase' es None si hay que crearla).
+            - 'omitidas': list[{'turno', 'fecha'}] en las que el alumno ya está inscripto.
+            - 'conflictos': list[str]; si no está vacía la renovación no se aplica.
+    """
+    from .models import AlumnoPaquete
+
+    hoy = timezone.localdate()
+    conflictos = []
+
+    paquetes_activos = list(AlumnoPaquete.objects.filter(id_alumno=alumno, estado='activo'))
+    turnos_anteriores = list(dict.fromkeys(
+        apt.id_turno
+        for apt in AlumnoPaqueteTurno.objects.filter(
+            id_alumno_paquete__in=paquetes_activos
+        ).select_related('id_turno').order_by('pk')
+    )) if paquetes_activos else []
+
+    # Turnos nuevos: deben existir y tener lugar (salvo que el alumno ya lo tenga)
+    turnos = {turno.id_turno: turno for turno in turnos_anteriores}
+    nuevos, errores = resolver_turnos(list(turnos_nuevos))
+    conflictos.extend(errores)
+    for turno in nuevos:
+        if turno.id_turno in turnos:
+            continue
+        if turno.estado == "Ocupado":
+            conflictos.append(f"No hay cupo para {turno.dia} {turno.horario.strftime('%H:%M')} {turno.disciplina}")
+        else:
+            turnos[turno.id_turno] = turno
+    turnos = list(turnos.values())
+
+    if not turnos:
+        conflictos.append("No hay turnos válidos para la renovación.")
+
+    # Fechas de cada turno
+    desde = fecha_inicio or (hoy + timedelta(days=1))
+    pares = series_turnos(
+        (turno, desde, cantidad) for turno, cantidad in distribuir_clases(paquete.cantidad_clases, turnos)
+    )
+
+    # Clases existentes con su ocupación y las inscripciones del alumno en ellas
+    clases = clases_con_inscriptos(pares)
+    ids_activos = {p.id_alumno_paquete for p in paquetes_activos}
+    inscripto = set()
+    liberadas = set()
+    for id_clase, id_paquete, estado, fecha in AlumnoClase.objects.filter(
+        id_clase__in=[clase.id_clase for clase in clases.values()],
+        id_alumno_paquete__id_alumno=alumno,
+    ).values_list('id_clase_id', 'id_alumno_paquete_id', 'estado', 'id_clase__fecha'):
+        if id_paquete in ids_activos and estado == 'pendiente' and fecha >= hoy:
+            liberadas.add(id_clase)
+        else:
+            inscripto.add(id_clase)
+
+    reservas = []
+    omitidas = []
+    for turno, fecha in pares:
+        clase = clases.get((turno.id_turno, fecha))
+        if clase is not None and clase.id_clase in inscripto:
+            omitidas.append({'turno': turno, 'fecha': fecha})
+            continue
+        ocupados, cupo = 0, turno.capacidad
+        if clase is not None:
+            ocupados = clase.inscriptos - (1 if clase.id_clase in liberadas else 0)
+            cupo = clase.cupo
+        if ocupados >= cupo:
+            conflictos.append(f"Clase llena {fecha} {turno.horario}")
+            continue
+        reservas.append({'turno': turno, 'fecha': fecha, 'clase': clase})
+
+    return {
+        'paquetes_activos': paquetes_activos,
+        'turnos_anteriores': turnos_anteriores,
+        'turnos': turnos,
+        'reservas': reservas,
+        'omitidas': omitidas,
+        'conflictos': conflictos,
+    }
+
+
+def ejecutar_renovacion(alumno, paquete, turnos_nuevos=(), fecha_inicio=None, estado_reserva="reservado",
+                        solo_simular=False):
+    """
+    Renueva el paquete del alumno en lote: expira los paquetes activos
+    (liberando turnos y reservas pendientes), crea el paquete nuevo, le asigna
+    los turnos y reserva las clases del plan.
+
+    El cupo se vuelve a validar con las clases bloqueadas al reservar; si
+    alguna se llenó después del plan, la renovación no se aplica y el motivo
+    queda en 'conflictos'.
+
+    Args:
+        alumno (Alumno)
+        paquete (Paquete)
+        turnos_nuevos (iterable[str]): turnos a sumar a los actuales.
+        fecha_inicio (date, opcional): ver planificar_renovacion.
+        estado_reserva (str): estado de los AlumnoClase creados.
+        solo_simular (bool): si es True devuelve el plan y los conflictos sin escribir.
+
+    Returns:
+        dict: el plan (ver planificar_renovacion) más
+            - 'aplicada' (bool)
+            - 'nuevo_paquete' (AlumnoPaquete | None)
+            - 'clases_creadas' (int)
+    """
+    from .contadores import contadores_diferidos
+    from .models import AlumnoPaquete
+
+    plan = planificar_renovacion(alumno, paquete, turnos_nuevos, fecha_inicio)
+    plan.update({'aplicada': False, 'nuevo_paquete': None, 'clases_creadas': 0})
+    if solo_simular or plan['conflictos']:
+        return plan
+
+    try:
+        with transaction.atomic(), contadores_diferidos():
+            for paquete_activo in plan['paquetes_activos']:
+                paquete_activo.expirar_y_liberar()
+
+            nuevo_paquete = AlumnoPaquete.objects.create(
+                id_alumno=alumno,
+                id_paquete=paquete,
+                estado='activo',
+                fecha_inicio=fecha_inicio or timezone.localdate(),
+            )
+
+            pares = [(reserva['turno'], reserva['fecha']) for reserva in plan['reservas']]
+            clases = {
+                (reserva['turno'].id_turno, reserva['fecha']): reserva['clase']
+                for reserva in plan['reservas'] if reserva['clase'] is not None
+            }
+            plan['clases_creadas'] = crear_clases_faltantes(pares, clases)
+            for reserva in plan['reservas']:
+                reserva['clase'] = clases[(reserva['turno'].id_turno, reserva['fecha'])]
+
+            reservar_clases(
+                nuevo_paquete,
+                plan['turnos'],
+                [reserva['clase'] for reserva in plan['reservas']],
+                estado=estado_reserva,
+            )
+    except SinCupo as e:
+        # Otra reserva tomó el lugar entre el plan y la escritura: no se aplica nada
+        plan['conflictos'].extend(e.mensajes)
+        plan['clases_creadas'] = 0
+        return plan
+
+    plan.update({'aplicada': True, 'nuevo_paquete': nuevo_paquete})
+    return plan
+
+
+def cambiar_turnos(alumno_paquete, turnos, estado_reserva="reservado"):
+    """
+    Reemplaza los turnos del paquete y rearma sus reservas futuras por diferencia.
+
+    Las clases del paquete se reparten entre los turnos nuevos desde la próxima
+    fecha de cada turno (sin contar hoy), salteando feriados. Las reservas
+    futuras que ya coinciden con ese plan se mantienen; el resto se borra y se
+    crean las que faltan. Las reservas nuevas validan cupo con las clases
+    bloqueadas (reservar_clases); si alguna está llena no se cambia nada.
+
+    Todo ocurre en una transacción con contadores diferidos: un recuento por
+    clase y por turno afectados al confirmar.
+
+    Args:
+        alumno_paquete (AlumnoPaquete)
+        turnos (list[Turno]): turnos nuevos, en orden de prioridad para el reparto.
+        estado_reserva (str): estado de los AlumnoClase creados.
+
+    Returns:
+        dict:
+            - 'turnos_quitados' / 'turnos_agregados': list[Turno]
+            - 'reservas': list[(Turno, date)] del plan (mantenidas + nuevas)
+            - 'reservas_nuevas' / 'reservas_mantenidas' / 'reservas_borradas': int
+
+    Raises:
+        SinCupo: si alguna clase nueva ya no tiene lugar.
+    """
+    from .contadores import contadores_diferidos
+
+    hoy = timezone.localdate()
+    turnos = list(dict.fromkeys(turnos))
+    ids_turno = {turno.id_turno for turno in turnos}
+
+    # Plan de fechas
+    pares = series_turnos(
+        (turno, hoy + timedelta(days=1), cantidad)
+        for turno, cantidad in distribuir_clases(alumno_paquete.id_paquete.cantidad_clases, turnos)
+    )
+
+    with transaction.atomic(), contadores_diferidos():
+        asignados = {
+            apt.id_turno_id: apt
+            for apt in AlumnoPaqueteTurno.objects.filter(
+                id_alumno_paquete=alumno_paquete
+            ).select_related('id_turno')
+        }
+        turnos_quitados = [apt.id_turno for id_turno, apt in asignados.items() if id_turno not in ids_turno]
+        turnos_agregados = [turno for turno in turnos if turno.id_turno not in asignados]
+        AlumnoPaqueteTurno.objects.filter(
+            pk__in=[apt.pk for id_turno, apt in asignados.items() if id_turno not in ids_turno]
+        ).delete()
+
+        clases = clases_existentes(pares)
+        ids_destino = {clase.id_clase for clase in clases.values()}
+
+        # Reservas futuras: se mantienen las que están en el plan, se borra el resto
+        futuras = list(
+            AlumnoClase.objects.filter(
+                id_alumno_paquete=alumno_paquete,
+                id_clase__fecha__gte=hoy,
+            ).values_list('pk', 'id_clase_id')
+        )
+        mantenidas = {id_clase for _, id_clase in futuras if id_clase in ids_destino}
+        a_borrar = [pk for pk, id_clase in futuras if id_clase not in ids_destino]
+        if a_borrar:
+            AlumnoClase.objects.filter(pk__in=a_borrar).delete()
+
+        crear_clases_faltantes(pares, clases)
+        nuevas = [
+            clases[(turno.id_turno, fecha)]
+            for turno, fecha in pares
+            if clases[(turno.id_turno, fecha)].id_clase not in mantenidas
+        ]
+        reservar_clases(alumno_paquete, turnos, nuevas, estado=estado_reserva)
+
+    return {
+        'turnos_quitados': turnos_quitados,
+        'turnos_agregados': turnos_agregados,
+        'reservas': pares,
+        'reservas_nuevas': len(nuevas),
+        'reservas_mantenidas': len(mantenidas),
+        'reservas_borradas': len(a_borrar),
+    }
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from Pilapp.utils import deduplicar_clases
+
+
+class Command(BaseCommand):
+    help = (
+        "Fusiona las clases duplicadas (mismo turno y fecha). "
+        "Debe ejecutarse antes de aplicar la restricción única de Clase."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--solo-reportar",
+            action="store_true",
+            help="Muestra los duplicados sin modificarlos.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.MIGRATE_HEADING("== Deduplicando clases =="))
+
+        resultado = deduplicar_clases(solo_reportar=options["solo_reportar"])
+
+        if not resultado["grupos"]:
+            self.stdout.write(self.style.SUCCESS("✓ No hay clases duplicadas."))
+            return
+
+        for grupo in resultado["grupos"]:
+            self.stdout.write(
+                f"  Turno {grupo['id_turno']} {grupo['fecha']}: se conserva la clase "
+                f"{grupo['id_clase_conservada']}, duplicadas {grupo['ids_eliminadas']}"
+            )
+
+        if options["solo_reportar"]:
+            self.stdout.write(self.style.WARNING(f"{len(resultado['grupos'])} grupos duplicados (sin modificar)."))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"✓ {resultado['mensaje']}"))
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from datetime import datetime
+from Pilapp.estadisticas import calcular_estadisticas
+
+
+ETIQUETAS = [
+    ("alumnos_regulares", "Alumnos regulares"),
+    ("alumnos_ocasionales", "Alumnos ocasionales"),
+    ("clases_hoy", "Clases del día"),
+    ("pagos_pendientes", "Paquetes con pago pendiente"),
+    ("clases_semana", "Clases de la semana"),
+    ("asistencias_semana", "Asistencias de la semana"),
+    ("inasistencias_semana", "Inasistencias de la semana"),
+    ("prospectos_nuevos", "Prospectos nuevos de la semana"),
+]
+
+
+class Command(BaseCommand):
+    help = "Muestra las estadísticas del dashboard (las mismas que ve el panel)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fecha",
+            help="Fecha de referencia (YYYY-MM-DD). Por defecto, hoy.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Imprime el resultado como JSON (para procesarlo desde cron).",
+        )
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options["fecha"]:
+            try:
+                fecha = datetime.strptime(options["fecha"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("Formato de fecha inválido. Use YYYY-MM-DD.")
+
+        # Siempre se calcula en el momento: el reporte no usa el cache del panel
+        stats = calcular_estadisticas(fecha)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING("== Estadísticas =="))
+        for clave, etiqueta in ETIQUETAS:
+            self.stdout.write(f"  {etiqueta}: {stats[clave]}")
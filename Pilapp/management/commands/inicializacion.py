@@ -9,6 +9,13 @@ from Pilapp.utils import crear_turnos, crear_clases_rango_fechas
 class Command(BaseCommand):
     help = "Inicializa la BD de TuPilates: instructora, turnos y clases."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--omitir-feriados",
+            action="store_true",
+            help="No genera clases en las fechas cargadas como Feriado.",
+        )
+
     def handle(self, *args, **kwargs):
 
         self.stdout.write(self.style.MIGRATE_HEADING("== Bootstrapping TuPilates =="))
@@ -37,7 +44,9 @@ class Command(BaseCommand):
         rango_fin = hoy + timedelta(days=365)
 
         self.stdout.write(f"Generando clases desde {hoy} hasta {rango_fin}...")
-        result_clases = crear_clases_rango_fechas(hoy, rango_fin)
+        result_clases = crear_clases_rango_fechas(
+            hoy, rango_fin, omitir_feriados=kwargs["omitir_feriados"]
+        )
 
         self.stdout.write(self.style.SUCCESS(
             f"✓ {result_clases['mensaje']}"
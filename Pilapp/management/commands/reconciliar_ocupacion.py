@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Pilapp.models import Clase, Turno
+from Pilapp.contadores import (
+    diferencias_ocupacion_turnos,
+    diferencias_total_inscriptos,
+    recalcular_ocupacion_turnos,
+    recalcular_total_inscriptos,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula Turno.lugares_ocupados y Clase.total_inscriptos desde sus tablas "
+        "de origen y reporta las diferencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--solo-reportar",
+            action="store_true",
+            help="Muestra las diferencias sin corregirlas.",
+        )
+
+    def handle(self, *args, **options):
+        solo_reportar = options["solo_reportar"]
+
+        with transaction.atomic():
+            self.stdout.write(self.style.MIGRATE_HEADING("== Reconciliando ocupación de turnos =="))
+            diferencias = diferencias_ocupacion_turnos()
+            turnos = Turno.objects.in_bulk(list(diferencias))
+            self._reportar(
+                diferencias,
+                lambda id_turno: f"Turno {id_turno} ({turnos.get(id_turno)} {getattr(turnos.get(id_turno), 'disciplina', '')})",
+                recalcular_ocupacion_turnos,
+                "turnos",
+                solo_reportar,
+            )
+
+            self.stdout.write(self.style.MIGRATE_HEADING("== Reconciliando inscriptos de clases =="))
+            diferencias = diferencias_total_inscriptos()
+            clases = Clase.objects.select_related("id_turno").in_bulk(list(diferencias))
+            self._reportar(
+                diferencias,
+                lambda id_clase: f"Clase {id_clase} ({clases[id_clase].fecha} {clases[id_clase].id_turno})",
+                recalcular_total_inscriptos,
+                "clases",
+                solo_reportar,
+            )
+
+    def _reportar(self, diferencias, describir, recalcular, nombre, solo_reportar):
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS(f"✓ Sin diferencias en {nombre}."))
+            return
+
+        for pk, (guardado, real) in sorted(diferencias.items()):
+            self.stdout.write(
+                f"  {describir(pk)}: guardado={guardado} real={real} (desvío {guardado - real:+d})"
+            )
+
+        if solo_reportar:
+            self.stdout.write(self.style.WARNING(f"{len(diferencias)} {nombre} con diferencias (sin corregir)."))
+            return
+
+        recalcular(list(diferencias))
+        self.stdout.write(self.style.SUCCESS(f"✓ {len(diferencias)} {nombre} corregidos."))
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.7 on 2026-10-18 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pilapp', '0010_honorarioinstructor'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='honorarioinstructor',
+            name='id_instructor',
+        ),
+        migrations.AddField(
+            model_name='honorarioinstructor',
+            name='nombre_profesora',
+            field=models.CharField(default='Instructora General', max_length=100),
+        ),
+    ]
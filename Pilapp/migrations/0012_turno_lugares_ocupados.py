@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-18 05:45
+
+from django.db import migrations, models
+
+
+def poblar_lugares_ocupados(apps, schema_editor):
+    Turno = apps.get_model('Pilapp', 'Turno')
+    AlumnoPaqueteTurno = apps.get_model('Pilapp', 'AlumnoPaqueteTurno')
+
+    conteo = (
+        AlumnoPaqueteTurno.objects
+        .filter(id_alumno_paquete__estado='activo')
+        .values('id_turno')
+        .annotate(total=models.Count('pk'))
+    )
+    for fila in conteo:
+        Turno.objects.filter(pk=fila['id_turno']).update(lugares_ocupados=fila['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pilapp', '0011_remove_honorarioinstructor_id_instructor_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turno',
+            name='lugares_ocupados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(poblar_lugares_ocupados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.7 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+def fusionar_clases_duplicadas(apps, schema_editor):
+    """
+    Red de seguridad para la restricción única: si quedan clases duplicadas
+    (mismo turno y fecha) se fusionan en la de menor id. El comando
+    `deduplicar_clases` hace lo mismo con reporte y debería correrse antes.
+    """
+    Clase = apps.get_model('Pilapp', 'Clase')
+    AlumnoClase = apps.get_model('Pilapp', 'AlumnoClase')
+    AlumnoClaseOcasional = apps.get_model('Pilapp', 'AlumnoClaseOcasional')
+    sin_registro = {'pendiente', 'reservado'}
+
+    duplicados = (
+        Clase.objects.values('id_turno_id', 'fecha')
+        .annotate(cantidad=models.Count('pk'), id_conservada=models.Min('pk'))
+        .filter(cantidad__gt=1)
+    )
+    for grupo in duplicados:
+        destino = grupo['id_conservada']
+        origen = list(
+            Clase.objects.filter(id_turno_id=grupo['id_turno_id'], fecha=grupo['fecha'])
+            .exclude(pk=destino).values_list('pk', flat=True)
+        )
+        for modelo, campo in ((AlumnoClase, 'id_alumno_paquete_id'), (AlumnoClaseOcasional, 'id_alumno_id')):
+            en_destino = {getattr(f, campo): f for f in modelo.objects.filter(id_clase_id=destino)}
+            for fila in modelo.objects.filter(id_clase_id__in=origen).order_by('pk'):
+                existente = en_destino.get(getattr(fila, campo))
+                if existente is None:
+                    modelo.objects.filter(pk=fila.pk).update(id_clase_id=destino)
+                    en_destino[getattr(fila, campo)] = fila
+                    continue
+                if existente.estado in sin_registro and fila.estado not in sin_registro:
+                    modelo.objects.filter(pk=existente.pk).update(estado=fila.estado)
+                    existente.estado = fila.estado
+                modelo.objects.filter(pk=fila.pk).delete()
+        Clase.objects.filter(pk__in=origen).delete()
+
+        total = (
+            AlumnoClase.objects.filter(id_clase_id=destino)
+            .exclude(estado__in=['canceló', 'reprogramó', 'feriado']).count()
+            + AlumnoClaseOcasional.objects.filter(id_clase_id=destino)
+            .exclude(estado='canceló').count()
+        )
+        Clase.objects.filter(pk=destino).update(total_inscriptos=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pilapp', '0012_turno_lugares_ocupados'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_clases_duplicadas, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alumnoclase',
+            index=models.Index(fields=['id_clase', 'estado'], name='alumnoclase_clase_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alumnoclase',
+            index=models.Index(fields=['id_alumno_paquete', 'estado'], name='alumnoclase_paq_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alumnopaquete',
+            index=models.Index(fields=['id_alumno', 'estado'], name='alumnopaq_alumno_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha', 'estado'], name='pago_fecha_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='persona',
+            index=models.Index(fields=['telefono'], name='persona_telefono_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='clase',
+            constraint=models.UniqueConstraint(fields=('id_turno', 'fecha'), name='unique_clase_turno_fecha'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.7 on 2026-10-18 06:07
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copias congeladas de Pilapp.identificacion al momento de esta migración:
+# la migración no debe cambiar si cambian (o desaparecen) las de la app.
+
+def _normalizar_nombre(nombre, apellido):
+    texto = f"{nombre or ''} {apellido or ''}".strip().lower()
+    texto = unicodedata.normalize('NFD', texto)
+    texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+    return " ".join(texto.split())
+
+
+def _normalizar_telefono(telefono):
+    digitos = re.sub(r"\D", "", telefono or "")
+    if digitos.startswith("00595"):
+        digitos = digitos[2:]
+    if digitos.startswith("595") and len(digitos) - 3 >= 8:
+        digitos = digitos[3:]
+    if digitos.startswith("0"):
+        digitos = digitos[1:]
+    return digitos
+
+
+def poblar_normalizados(apps, schema_editor):
+    Persona = apps.get_model('Pilapp', 'Persona')
+    personas = list(Persona.objects.only('id_persona', 'nombre', 'apellido', 'telefono'))
+    for persona in personas:
+        persona.telefono_normalizado = _normalizar_telefono(persona.telefono)
+        persona.nombre_normalizado = _normalizar_nombre(persona.nombre, persona.apellido)
+    Persona.objects.bulk_update(personas, ['telefono_normalizado', 'nombre_normalizado'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pilapp', '0013_clase_unique_turno_fecha_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='persona',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, default='', editable=False, max_length=201),
+        ),
+        migrations.AddField(
+            model_name='persona',
+            name='telefono_normalizado',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='persona',
+            index=models.Index(fields=['telefono_normalizado'], name='persona_tel_normalizado_idx'),
+        ),
+        migrations.RunPython(poblar_normalizados, migrations.RunPython.noop),
+    ]
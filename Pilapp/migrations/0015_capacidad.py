@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Pilapp', '0014_persona_normalizados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clase',
+            name='capacidad',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='turno',
+            name='capacidad',
+            field=models.PositiveIntegerField(default=4),
+        ),
+    ]
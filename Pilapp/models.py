@@ -41,6 +41,8 @@ class Persona(models.Model):
         telefono: identificador principal de contacto.
         ruc: número de contribuyente (puede actualizarse luego).
         observaciones: notas generales (comentarios administrativos).
+        telefono_normalizado, nombre_normalizado: se completan en save() para
+            identificar a la persona desde el bot (ver identificacion.py).
 
     Relaciona con:
         - Alumno
@@ -54,6 +56,23 @@ class Persona(models.Model):
     ruc = models.CharField(max_length=20, blank=True, null=True)
     razon_social = models.CharField(max_length=150, blank=True, null=True)
     observaciones = models.TextField(blank=True, null=True)
+    telefono_normalizado = models.CharField(max_length=20, blank=True, default='', editable=False)
+    nombre_normalizado = models.CharField(max_length=201, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['telefono'], name='persona_telefono_idx'),
+            models.Index(fields=['telefono_normalizado'], name='persona_tel_normalizado_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .identificacion import normalizar_nombre, normalizar_telefono
+        self.telefono_normalizado = normalizar_telefono(self.telefono)
+        self.nombre_normalizado = normalizar_nombre(self.nombre, self.apellido)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'telefono_normalizado', 'nombre_normalizado'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
@@ -166,6 +185,10 @@ class Instructor(models.Model):
     def __str__(self):
         return f"Instructor: {self.id_persona}"
 
+# Lugares por turno si no se indica otra cosa (sala de Reformer)
+CUPO_POR_DEFECTO = 4
+
+
 class Turno(models.Model):
     """
     Define un turno recurrente semanal (día + hora), base para generar clases.
@@ -174,10 +197,14 @@ class Turno(models.Model):
         id_turno (PK)
         horario (TimeField)
         dia (CharField): Lunes–Sábado.
+        capacidad (int): lugares de la sala para este turno (por defecto
+            CUPO_POR_DEFECTO). Cada Clase puede sobrescribirlo.
+        lugares_ocupados (int): cantidad de paquetes activos con el turno asignado
+            (AlumnoPaqueteTurno). Se mantiene desde Pilapp.contadores.
 
     Propiedades:
-        - lugares_ocupados: cantidad de alumnos asignados vía AlumnoPaqueteTurno.
-        - estado: "Libre" (<4 lugares) o "Ocupado" (>=4).
+        - obtener_lugares_ocupados: recuento en vivo desde AlumnoPaqueteTurno.
+        - estado: "Libre" (lugares_ocupados < capacidad) u "Ocupado".
 
     Ejemplo:
         Lunes 19:00 → usado semanalmente para crear clases concretas (Clase).
@@ -200,12 +227,16 @@ class Turno(models.Model):
     horario = models.TimeField()
     dia = models.CharField(max_length=10, choices=DIAS_CHOICES)
     disciplina = models.CharField(max_length=50, choices=DISCIPLINA_CHOICES, default='Reformer')
+    capacidad = models.PositiveIntegerField(default=CUPO_POR_DEFECTO)
+
+    # Campo de la base de datos (contador desnormalizado)
+    lugares_ocupados = models.IntegerField(default=0)
 
     def __str__(self):
         return f"{self.dia} - {self.horario.strftime('%H:%M')}"
 
     @property
-    def lugares_ocupados(self):
+    def obtener_lugares_ocupados(self):
         return AlumnoPaqueteTurno.objects.filter(
         id_turno_id=self.id_turno,
         id_alumno_paquete__estado='activo'
@@ -224,8 +255,13 @@ class Turno(models.Model):
 
     @property
     def estado(self):
-        return 'Ocupado' if self.lugares_ocupados >= 4 else 'Libre'
+        return 'Ocupado' if self.lugares_ocupados >= self.capacidad else 'Libre'
+
+
 
+# Estados que NO ocupan lugar en la clase (no suman a Clase.total_inscriptos)
+ESTADOS_SIN_CUPO_REGULAR = {"canceló", "reprogramó", "feriado"}
+ESTADOS_SIN_CUPO_OCASIONAL = {"canceló"}
 
 
 class Clase(models.Model):
@@ -238,8 +274,15 @@ class Clase(models.Model):
         id_turno (FK Turno)
         fecha (DateField)
 
+        capacidad (int, opcional): cupo de esta clase en particular (sesiones
+            especiales). Si es None vale la capacidad del turno.
+        total_inscriptos (int): alumnos regulares y ocasionales que ocupan lugar.
+            Se mantiene desde Pilapp.contadores.
+
     Propiedades:
-        - total_inscriptos: suma de alumnos regulares y ocasionales asignados.
+        - obtener_total_inscriptos: recuento en vivo de regulares y ocasionales.
+        - obtener_cupo: capacidad de la clase o, si no tiene, la del turno. En
+          consultas conviene anotarlo con cupos.cupo_clase().
 
     Ejemplo:
         Turno: "Martes 19:00" → Clase: "Martes 2025-11-11 19:00"
@@ -248,10 +291,24 @@ class Clase(models.Model):
     id_instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE)
     id_turno = models.ForeignKey(Turno, on_delete=models.CASCADE)
     fecha = models.DateField()
+    capacidad = models.PositiveIntegerField(null=True, blank=True)
     
     # Campo de la base de datos
     total_inscriptos = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            # Una sola clase por turno y fecha (ver comando deduplicar_clases)
+            models.UniqueConstraint(fields=['id_turno', 'fecha'], name='unique_clase_turno_fecha'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Recordamos la fecha leída para invalidar también la semana anterior si cambia
+        instancia = super().from_db(db, field_names, values)
+        instancia._fecha_original = instancia.__dict__.get('fecha')
+        return instancia
+
     def __str__(self):
         return f"Clase {self.id_clase} - {self.fecha}"
 
@@ -261,12 +318,16 @@ class Clase(models.Model):
         from .models import AlumnoClase, AlumnoClaseOcasional
         cantidad_regulares = AlumnoClase.objects.filter(
             id_clase_id=self.id_clase
-        ).exclude(estado__in={"canceló", "reprogramó", "feriado"}).count()
+        ).exclude(estado__in=ESTADOS_SIN_CUPO_REGULAR).count()
         cantidad_ocasionales = AlumnoClaseOcasional.objects.filter(
             id_clase_id=self.id_clase
-        ).exclude(estado="canceló").count()
+        ).exclude(estado__in=ESTADOS_SIN_CUPO_OCASIONAL).count()
         return cantidad_regulares + cantidad_ocasionales
 
+    @property
+    def obtener_cupo(self):
+        return self.capacidad if self.capacidad is not None else self.id_turno.capacidad
+
 
 class Paquete(models.Model):
     """
@@ -284,6 +345,44 @@ class Paquete(models.Model):
     def __str__(self):
         return f"Paquete {self.id_paquete} - {self.cantidad_clases} clases"
 
+# Estados de Pago que cuentan como dinero recibido para un paquete
+ESTADOS_PAGO_COMPUTABLES = ("pagado", "parcial")
+
+
+class AlumnoPaqueteQuerySet(models.QuerySet):
+    def with_balances(self):
+        """
+        Anota el saldo de cada paquete en la misma consulta:
+            - total_pagado: suma de los pagos 'pagado'/'parcial' (0 si no hay).
+            - restante: costo del paquete menos lo pagado, nunca negativo.
+        """
+        from decimal import Decimal
+        from django.db.models.functions import Coalesce, Greatest
+
+        moneda = models.DecimalField(max_digits=12, decimal_places=2)
+        pagos = PagoAlumno.objects.filter(
+            id_alumno_paquete=models.OuterRef('pk'),
+            id_pago__estado__in=ESTADOS_PAGO_COMPUTABLES
+        ).order_by().values('id_alumno_paquete').annotate(
+            total=models.Sum('id_pago__monto')
+        ).values('total')[:1]
+
+        return self.annotate(
+            total_pagado=Coalesce(
+                models.Subquery(pagos, output_field=moneda),
+                models.Value(Decimal('0')),
+                output_field=moneda
+            )
+        ).annotate(
+            restante=Greatest(
+                Coalesce(models.F('id_paquete__costo'), models.Value(Decimal('0')), output_field=moneda)
+                - models.F('total_pagado'),
+                models.Value(Decimal('0')),
+                output_field=moneda
+            )
+        )
+
+
 class AlumnoPaquete(models.Model):
     """
     Relaciona a un alumno con un paquete adquirido.
@@ -313,6 +412,20 @@ class AlumnoPaquete(models.Model):
     clases_usadas = models.IntegerField(default=0)
     fecha_inicio = models.DateField(null=True)
 
+    objects = AlumnoPaqueteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_alumno', 'estado'], name='alumnopaq_alumno_estado_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Recordamos el estado leído para detectar cambios activo <-> expirado
+        instancia = super().from_db(db, field_names, values)
+        instancia._estado_original = instancia.__dict__.get('estado')
+        return instancia
+
     # Dentro de class AlumnoPaquete(models.Model):
 
     def expirar_y_liberar(self):
@@ -320,7 +433,9 @@ class AlumnoPaquete(models.Model):
         Cambia el estado a expirado y elimina los turnos asociados 
         para liberar cupos en el gimnasio inmediatamente.
         """
-        with transaction.atomic():
+        from .contadores import contadores_diferidos
+
+        with transaction.atomic(), contadores_diferidos():
             self.alumnopaqueteturno_set.all().delete()
             
             self.alumnoclase_set.filter(
@@ -368,6 +483,20 @@ class AlumnoClase(models.Model):
     id_clase = models.ForeignKey(Clase, on_delete=models.CASCADE)
     estado = models.CharField(max_length=50, choices=[("asistió", "Asistió"), ("faltó", "Faltó"), ("canceló", "Canceló"), ("recuperó", "Recuperó"), ("reprogramó","Reprogramó"), ("pendiente", "Pendiente"), ("feriado", "Feriado")])
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_clase', 'estado'], name='alumnoclase_clase_estado_idx'),
+            models.Index(fields=['id_alumno_paquete', 'estado'], name='alumnoclase_paq_estado_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Recordamos clase y estado leídos para ajustar Clase.total_inscriptos por diferencia
+        instancia = super().from_db(db, field_names, values)
+        if 'id_clase_id' in instancia.__dict__ and 'estado' in instancia.__dict__:
+            instancia._original = (instancia.id_clase_id, instancia.estado)
+        return instancia
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
     
@@ -402,6 +531,14 @@ class AlumnoClaseOcasional(models.Model):
     class Meta:
         unique_together = ('id_alumno', 'id_clase')  # <-- agrega esto
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Recordamos clase y estado leídos para ajustar Clase.total_inscriptos por diferencia
+        instancia = super().from_db(db, field_names, values)
+        if 'id_clase_id' in instancia.__dict__ and 'estado' in instancia.__dict__:
+            instancia._original = (instancia.id_clase_id, instancia.estado)
+        return instancia
+
     def __str__(self):
         return f"Clase Ocasional: {self.id_alumno} - {self.id_clase}"
 
@@ -433,6 +570,11 @@ class Pago(models.Model):
     metodo_pago = models.CharField(max_length=50, choices=[("efectivo", "Efectivo"), ("tarjeta", "Tarjeta"), ("transferencia", "Transferencia")])
     comprobante = models.CharField(max_length=100, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'estado'], name='pago_fecha_estado_idx'),
+        ]
+
     def __str__(self):
         return f"Pago {self.id_pago}"
 
@@ -558,41 +700,35 @@ class RenovadorPaqueteService:
         self.fecha_inicio = fecha_inicio or timezone.now().date()
         self.observaciones_pago = observaciones_pago
 
-    def ejecutar(self):
-        with transaction.atomic():
-            # 1. CAPTURAR TURNOS ACTUALES (Sin borrar nada todavía)
-            paquetes_activos = AlumnoPaquete.objects.filter(
-                id_alumno=self.alumno, 
-                estado="activo"
-            )
+    def ejecutar(self, solo_simular=False):
+        """
+        Renueva con el motor en lote (inscripciones.ejecutar_renovacion), manteniendo
+        los turnos actuales, y registra el pago.
 
-            turnos_a_mantener = []
-            for p_viejo in paquetes_activos:
-                # Extraemos los IDs de los turnos antes de tocar la base de datos
-                ids = list(p_viejo.alumnopaqueteturno_set.values_list('id_turno_id', flat=True))
-                turnos_a_mantener.extend(ids)
-
-            # 2. CREAR EL NUEVO PAQUETE (Nace como pendiente)
-            nuevo_paquete = AlumnoPaquete.objects.create(
-                id_alumno=self.alumno,
-                id_paquete=self.paquete_base,
-                estado="activo",
-                estado_pago="pendiente",
-                fecha_inicio=self.fecha_inicio
-            )
+        Returns:
+            AlumnoPaquete: el paquete nuevo. Con solo_simular=True devuelve el
+            plan (dict) sin escribir nada.
 
-            # 3. TRASPASO DE TURNOS AL NUEVO PAQUETE
-            # Si el script falla aquí, los turnos del paquete viejo siguen existiendo
-            for t_id in set(turnos_a_mantener):
-                AlumnoPaqueteTurno.objects.create(
-                    id_alumno_paquete=nuevo_paquete,
-                    id_turno_id=t_id
-                )
+        Raises:
+            ValueError: si el plan tiene conflictos (clases llenas, sin turnos).
+        """
+        from .inscripciones import ejecutar_renovacion
 
-            # 4. AHORA SÍ, LIMPIAR Y EXPIRAR LOS PAQUETES VIEJOS
-            # Hacemos esto al final para que sea lo último en confirmarse
-            for p_viejo in paquetes_activos:
-                p_viejo.expirar_y_liberar()
+        with transaction.atomic():
+            # 1-4. EXPIRAR LOS PAQUETES ACTIVOS, CREAR EL NUEVO CON SUS TURNOS Y RESERVAR CLASES
+            resultado = ejecutar_renovacion(
+                self.alumno,
+                self.paquete_base,
+                fecha_inicio=self.fecha_inicio,
+                estado_reserva="pendiente",
+                solo_simular=solo_simular,
+            )
+            if solo_simular:
+                return resultado
+            if resultado["conflictos"]:
+                raise ValueError("; ".join(resultado["conflictos"]))
+
+            nuevo_paquete = resultado["nuevo_paquete"]
 
             # 5. REGISTRAR EL PAGO Y VINCULAR
             nuevo_pago = Pago.objects.create(
@@ -611,27 +747,7 @@ class RenovadorPaqueteService:
 
             # 6. FINALIZAR: Marcamos como pagado el nuevo paquete
             nuevo_paquete.estado_pago = "pagado"
-            nuevo_paquete.save()
-
-            # --- NUEVO PASO 7: GENERAR INSCRIPCIONES A CLASES ---
-            # Esto es lo que activa el contador 4/4 en la web
-            from .models import Clase, AlumnoClase
-            
-            # Buscamos clases desde la fecha de inicio en adelante que coincidan con los turnos del paquete
-            clases_futuras = Clase.objects.filter(
-                id_turno_id__in=turnos_a_mantener,
-                fecha__gte=self.fecha_inicio
-            ).order_by('fecha')[:self.paquete_base.cantidad_clases]
-
-            for clase in clases_futuras:
-                AlumnoClase.objects.get_or_create(
-                    id_alumno_paquete=nuevo_paquete,
-                    id_clase=clase,
-                    defaults={'estado': 'pendiente'} # O 'confirmado' según prefieras
-                )
-                
-                # Opcional: Forzar el refresco del contador denso de la clase
-                clase.save() 
+            nuevo_paquete.save(update_fields=["estado_pago"])
 
             return nuevo_paquete
 
@@ -655,23 +771,6 @@ class ReemplazoDia(models.Model):
         verbose_name = "Día de Reemplazo"
         verbose_name_plural = "Días de Reemplazo"
 
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-
-@receiver([post_save, post_delete], sender=AlumnoClase)
-def update_clase_total_regulares(sender, instance, **kwargs):
-    if instance.id_clase_id:
-        clase = Clase.objects.get(pk=instance.id_clase_id)
-        clase.total_inscriptos = clase.obtener_total_inscriptos
-        clase.save(update_fields=['total_inscriptos'])
-
-@receiver([post_save, post_delete], sender=AlumnoClaseOcasional)
-def update_clase_total_ocasionales(sender, instance, **kwargs):
-    if instance.id_clase_id:
-        clase = Clase.objects.get(pk=instance.id_clase_id)
-        clase.total_inscriptos = clase.obtener_total_inscriptos
-        clase.save(update_fields=['total_inscriptos'])
-
 class ExAlumno(models.Model):
     """
     Guarda el historial de un alumno que fue eliminado del sistema.
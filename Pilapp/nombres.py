@@ -0,0 +1,205 @@
+"""
+Búsqueda aproximada de nombres (asistencias dictadas al bot, desempate de
+personas con el mismo teléfono).
+
+Cada nombre se guarda con una clave sin acentos, en minúsculas y con las
+palabras ordenadas ("Pérez José" y "José Pérez" → "jose perez"), y se indexa
+por trigramas en memoria. Buscar un nombre es:
+    1. Coincidencia exacta de la clave.
+    2. Cada palabra buscada es prefijo de alguna palabra del candidato
+       ("ana" → "ana lucia gomez").
+    3. Distancia de edición acotada (corta apenas supera el límite; dos
+       letras intercambiadas cuentan como una edición) sobre los candidatos
+       que comparten trigramas.
+Si en un paso hay más de un candidato, el resultado es ambiguo y se pasa al
+siguiente; si al final no hay uno solo, no hay match.
+
+El índice se arma con los nombres entre los que se busca (los anotados en una
+clase, las personas con un teléfono): no hay un índice global que mantener.
+"""
+import unicodedata
+from collections import defaultdict
+
+# Distancia de edición tolerada: 15% del largo del nombre (al menos 1)
+TOLERANCIA = 0.15
+
+# Trigramas que puede romper una edición (un intercambio toca hasta 4)
+TRIGRAMAS_POR_EDICION = 4
+
+
+def normalizar(texto):
+    if not texto:
+        return ""
+    texto = texto.strip().lower()
+    texto = unicodedata.normalize('NFD', texto)
+    return ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+
+
+def clave_nombre(texto):
+    """ "Pérez  José" → "jose perez" """
+    return " ".join(sorted(normalizar(texto).split()))
+
+
+def _trigramas(palabras):
+    trigramas = set()
+    for palabra in palabras:
+        palabra = f"  {palabra} "
+        trigramas.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return trigramas
+
+
+def distancia_acotada(a, b, limite):
+    """
+    Distancia de edición entre a y b (Damerau restringida: dos letras
+    contiguas intercambiadas cuentan como una edición), o None si supera
+    `limite`.
+    """
+    if abs(len(a) - len(b)) > limite:
+        return None
+    if a == b:
+        return 0
+    anterior, previa = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            valor = min(previa[j] + 1, actual[j - 1] + 1, previa[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                valor = min(valor, anterior[j - 2] + 1)
+            actual.append(valor)
+        if min(actual) > limite:
+            return None
+        anterior, previa = previa, actual
+    return previa[-1] if previa[-1] <= limite else None
+
+
+def _unico(valores):
+    return next(iter(valores)) if len(valores) == 1 else None
+
+
+class IndiceNombres:
+    """
+    Índice de nombres en memoria.
+
+    Args:
+        entradas (iterable): pares (valor, texto). `valor` es lo que devuelve
+            la búsqueda (un id, una clave de dict...); `texto`, el nombre.
+    """
+
+    def __init__(self, entradas=()):
+        self._claves = {}                       # valor → clave
+        self._palabras = {}                     # valor → tupla de palabras
+        self._por_clave = defaultdict(set)      # clave → valores
+        self._por_trigrama = defaultdict(set)   # trigrama → valores
+        self._trigramas = {}                    # valor → trigramas
+        for valor, texto in entradas:
+            self.agregar(valor, texto)
+
+    def __len__(self):
+        return len(self._claves)
+
+    def __contains__(self, valor):
+        return valor in self._claves
+
+    def agregar(self, valor, texto):
+        palabras = tuple(sorted(normalizar(texto).split()))
+        if not palabras:
+            return
+        clave = " ".join(palabras)
+        self._claves[valor] = clave
+        self._palabras[valor] = palabras
+        self._por_clave[clave].add(valor)
+        self._trigramas[valor] = _trigramas(palabras)
+        for trigrama in self._trigramas[valor]:
+            self._por_trigrama[trigrama].add(valor)
+
+    def buscar(self, nombre, apellido="", permitidos=None):
+        """
+        Valor del único nombre que coincide con `nombre apellido`, o None.
+
+        Args:
+            permitidos (set, opcional): restringe la búsqueda a esos valores
+                (p. ej. las personas anotadas en una clase).
+        """
+        palabras = sorted(normalizar(f"{nombre or ''} {apellido or ''}").split())
+        if not palabras:
+            return None
+        clave = " ".join(palabras)
+
+        exactos = self._por_clave.get(clave, set())
+        if permitidos is not None:
+            exactos = exactos & permitidos
+        if exactos:
+            return _unico(exactos)
+
+        trigramas = _trigramas(palabras)
+        limite = self._limite(clave)
+        if permitidos is not None:
+            para_prefijo = para_distancia = [v for v in permitidos if v in self._claves]
+        else:
+            # Un prefijo comparte todos los trigramas salvo el final de cada
+            # palabra; cada edición, a lo sumo TRIGRAMAS_POR_EDICION.
+            para_prefijo = self._candidatos(trigramas, len(trigramas) - len(palabras))
+            para_distancia = self._candidatos(trigramas, len(trigramas) - TRIGRAMAS_POR_EDICION * limite)
+
+        por_prefijo = [
+            v for v in para_prefijo
+            if all(any(p.startswith(buscada) for p in self._palabras[v]) for buscada in palabras)
+        ]
+        if len(por_prefijo) == 1:
+            return por_prefijo[0]
+
+        # De más a menos trigramas compartidos, para achicar el límite pronto
+        compartidos = sorted(
+            (
+                (len(trigramas & self._trigramas[v]), v) for v in para_distancia
+                if abs(len(self._claves[v]) - len(clave)) <= limite
+            ),
+            key=lambda par: par[0], reverse=True
+        )
+        mejores, mejor = [], None
+        for n, valor in compartidos:
+            if n < len(trigramas) - TRIGRAMAS_POR_EDICION * limite:
+                break
+            distancia = distancia_acotada(clave, self._claves[valor], limite)
+            if distancia is None:
+                continue
+            if mejor is None or distancia < mejor:
+                mejores, mejor = [valor], distancia
+                limite = distancia
+            elif distancia == mejor:
+                mejores.append(valor)
+        return _unico(mejores)
+
+    def _candidatos(self, trigramas, minimo):
+        """
+        Valores que pueden compartir al menos `minimo` trigramas con la búsqueda.
+        Alcanza con recorrer los len(trigramas) - minimo + 1 trigramas menos
+        frecuentes: quien no tenga ninguno de ellos no llega al mínimo.
+        """
+        listas = sorted((self._por_trigrama.get(t, ()) for t in trigramas), key=len)
+        if minimo > 0:
+            listas = listas[:len(listas) - minimo + 1]
+        candidatos = set()
+        for lista in listas:
+            candidatos.update(lista)
+        return candidatos
+
+    def resolver(self, pedidos, permitidos=None):
+        """
+        Busca varios nombres de una vez.
+
+        Args:
+            pedidos (iterable): dicts con "nombre" y "apellido" (como los manda el bot).
+
+        Returns:
+            list: un valor (o None) por pedido, en el mismo orden.
+        """
+        return [
+            self.buscar(p.get("nombre", ""), p.get("apellido", ""), permitidos)
+            for p in pedidos
+        ]
+
+    @staticmethod
+    def _limite(clave):
+        return max(1, int(len(clave) * TOLERANCIA))
+
@@ -0,0 +1,83 @@
+"""
+Respuestas JSON de los endpoints del bot y del panel armadas desde
+`.values()` / `.values_list()`, sin instanciar modelos.
+
+- `RespuestaJson`: como JsonResponse, pero codifica con orjson si está
+  instalado y, si no, con el json de la librería estándar (DjangoJSONEncoder,
+  salida compacta en UTF-8).
+- `hora_texto` / `dia_semana`: formateadores cacheados ("HH:MM", "Lunes").
+- `filas_a_dicts`: tuplas de values_list → dicts, aplicando formateadores por
+  columna.
+"""
+import json
+from decimal import Decimal
+from functools import lru_cache
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+DIAS_SEMANA = ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo")
+
+
+def _por_defecto(valor):
+    # Lo que orjson no conoce; mismo criterio que DjangoJSONEncoder
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return DjangoJSONEncoder().default(valor)
+
+
+def dumps(datos):
+    """Serializa `datos` a bytes JSON (UTF-8)."""
+    if orjson is not None:
+        return orjson.dumps(datos, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        datos, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class RespuestaJson(HttpResponse):
+    """JsonResponse con el codificador más rápido disponible."""
+
+    def __init__(self, datos, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(datos), **kwargs)
+
+
+@lru_cache(maxsize=None)
+def hora_texto(hora):
+    """time(18, 0) → "18:00" (hay pocos horarios distintos: se cachean)."""
+    return hora.strftime("%H:%M") if hora else None
+
+
+def dia_semana(fecha):
+    """date → nombre del día en castellano ("Lunes")."""
+    return DIAS_SEMANA[fecha.weekday()]
+
+
+def filas_a_dicts(filas, claves, formatos=None):
+    """
+    Convierte tuplas de values_list en dicts.
+
+    Args:
+        filas (iterable): tuplas, en el orden de `claves`.
+        claves (sequence[str]): nombre de cada columna en la salida.
+        formatos (dict, opcional): {clave: función} aplicada al valor.
+
+    Returns:
+        list[dict]
+    """
+    if not formatos:
+        return [dict(zip(claves, fila)) for fila in filas]
+    indices = [(i, formatos[clave]) for i, clave in enumerate(claves) if clave in formatos]
+    resultado = []
+    for fila in filas:
+        fila = list(fila)
+        for i, formato in indices:
+            fila[i] = formato(fila[i])
+        resultado.append(dict(zip(claves, fila)))
+    return resultado
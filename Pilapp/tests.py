@@ -1,3 +1,261 @@
-from django.test import TestCase
+import threading
+import time as reloj
+from datetime import date, time, timedelta
 
-# Create your tests here.
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from Pilapp.models import (
+    Alumno, AlumnoClase, AlumnoClaseOcasional, AlumnoPaquete, Clase,
+    Instructor, Paquete, Persona, Turno
+)
+from Pilapp.identificacion import (
+    AMBIGUA, SIN_COINCIDENCIA, UNICA, identificar, normalizar_telefono
+)
+from Pilapp.nombres import IndiceNombres
+
+
+class ProfesClasesHoyConsultasTests(TestCase):
+    """
+    Presupuesto de consultas de la pantalla de las profes: no debe crecer con
+    la cantidad de clases ni de alumnas del día.
+    """
+
+    # ReemplazoDia no se consulta con el token normal. Quedan: clases,
+    # regulares (prefetch), ocasionales (prefetch), primera clase, turnos del
+    # día y alertas de los últimos 7 días.
+    CONSULTAS_ESPERADAS = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        # Lunes, para que haya turnos y la semana anterior tenga días hábiles
+        cls.hoy = date(2026, 3, 16)
+        persona = Persona.objects.create(nombre="Instructora", apellido="General", telefono="000")
+        cls.instructora = Instructor.objects.create(id_instructor=1, id_persona=persona)
+        cls.paquete = Paquete.objects.create(cantidad_clases=8, costo=100)
+
+    def _crear_dia(self, cantidad_clases, alumnas_por_clase):
+        for i in range(cantidad_clases):
+            turno = Turno.objects.create(dia="Lunes", horario=time(7 + i, 0))
+            clase = Clase.objects.create(id_instructor=self.instructora, id_turno=turno, fecha=self.hoy)
+            anterior = Clase.objects.create(
+                id_instructor=self.instructora, id_turno=turno, fecha=self.hoy - timedelta(days=7)
+            )
+            for j in range(alumnas_por_clase):
+                persona = Persona.objects.create(nombre=f"Alumna{i}-{j}", apellido="Test", telefono=f"09{i}{j}")
+                alumno = Alumno.objects.create(id_persona=persona, estado="regular")
+                alumno_paquete = AlumnoPaquete.objects.create(
+                    id_alumno=alumno, id_paquete=self.paquete, estado="activo"
+                )
+                AlumnoClase.objects.create(id_alumno_paquete=alumno_paquete, id_clase=anterior, estado="reservado")
+                AlumnoClase.objects.create(id_alumno_paquete=alumno_paquete, id_clase=clase, estado="reservado")
+            ocasional = Alumno.objects.create(
+                id_persona=Persona.objects.create(nombre=f"Ocasional{i}", apellido="Test", telefono=f"08{i}")
+            )
+            AlumnoClaseOcasional.objects.create(id_alumno=ocasional, id_clase=clase, estado="reservado")
+
+    def _get(self):
+        url = reverse("profes_clases_hoy", args=["acceso-profes"])
+        return self.client.get(url, {"fecha": self.hoy.strftime("%Y-%m-%d")})
+
+    def test_presupuesto_de_consultas_con_un_dia_chico(self):
+        self._crear_dia(cantidad_clases=1, alumnas_por_clase=1)
+        with self.assertNumQueries(self.CONSULTAS_ESPERADAS):
+            respuesta = self._get()
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_presupuesto_de_consultas_no_crece_con_el_dia(self):
+        self._crear_dia(cantidad_clases=6, alumnas_por_clase=4)
+        with self.assertNumQueries(self.CONSULTAS_ESPERADAS):
+            respuesta = self._get()
+        self.assertEqual(respuesta.status_code, 200)
+
+        clases = [c for c in respuesta.context["clases_data"] if c["clase"]]
+        self.assertEqual(len(clases), 6)
+        self.assertTrue(all(len(c["alumnos"]) == 5 for c in clases))
+        self.assertEqual(respuesta.context["fechas_alertas"], [self.hoy - timedelta(days=7)])
+
+
+class ReservasConcurrentesTests(TransactionTestCase):
+    """
+    Varias conversaciones del bot reservan a la vez la misma clase: nunca debe
+    quedar con más inscriptos que el cupo (ver cupos.py).
+    """
+
+    HILOS = 10
+    REINTENTOS = 50
+
+    def setUp(self):
+        persona = Persona.objects.create(nombre="Instructora", apellido="General", telefono="000")
+        instructora = Instructor.objects.create(id_persona=persona)
+        turno = Turno.objects.create(dia="Lunes", horario=time(18, 0))
+        self.clase = Clase.objects.create(id_instructor=instructora, id_turno=turno, fecha=date(2030, 1, 7))
+
+    def _reservar(self, indice, barrera, resultados):
+        from Pilapp.cupos import MENSAJE_REINTENTAR
+        from Pilapp.views import registrar_alumno_ocasional_datos
+
+        datos = {
+            "nombre": f"Alumna{indice}",
+            "apellido": "Concurrente",
+            "telefono": f"0981{indice:06d}",
+            "hora_turno": "18:00",
+            "fecha": "2030-01-07",
+        }
+        try:
+            barrera.wait()
+            for _ in range(self.REINTENTOS):
+                try:
+                    with transaction.atomic():
+                        registrar_alumno_ocasional_datos(datos)
+                    resultados.append("reservada")
+                    return
+                except OperationalError:
+                    pass  # SQLite ocupado por otra escritura: se reintenta
+                except ValueError as e:
+                    if MENSAJE_REINTENTAR not in str(e):
+                        resultados.append("llena")
+                        return
+                reloj.sleep(0.01)
+            resultados.append("sin_respuesta")
+        finally:
+            connection.close()
+
+    def test_no_se_sobrevende_la_clase(self):
+        cupo = self.clase.obtener_cupo
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+        hilos = [
+            threading.Thread(target=self._reservar, args=(i, barrera, resultados))
+            for i in range(self.HILOS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(resultados.count("reservada"), cupo)
+        self.assertEqual(resultados.count("llena"), self.HILOS - cupo)
+        self.assertEqual(AlumnoClaseOcasional.objects.filter(id_clase=self.clase).count(), cupo)
+        self.clase.refresh_from_db()
+        self.assertEqual(self.clase.total_inscriptos, cupo)
+
+
+class IndiceNombresTests(SimpleTestCase):
+    """Búsqueda aproximada de nombres (ver nombres.py)."""
+
+    def setUp(self):
+        self.indice = IndiceNombres([
+            (1, "José Pérez"),
+            (2, "Ana Lucía Gómez"),
+            (3, "Laura Benítez"),
+            (4, "Lara Benítez"),
+        ])
+
+    def test_coincidencia_exacta_sin_acentos_ni_mayusculas(self):
+        self.assertEqual(self.indice.buscar("jose", "PEREZ"), 1)
+
+    def test_palabras_en_otro_orden(self):
+        self.assertEqual(self.indice.buscar("Pérez", "José"), 1)
+
+    def test_prefijo(self):
+        self.assertEqual(self.indice.buscar("Ana", ""), 2)
+
+    def test_un_error_de_tipeo(self):
+        self.assertEqual(self.indice.buscar("Jose", "Peres"), 1)
+
+    def test_letras_intercambiadas(self):
+        self.assertEqual(self.indice.buscar("Jsoe", "Perez"), 1)
+
+    def test_ambiguo_no_devuelve_nada(self):
+        # A una edición de "Laura Benítez" y de "Lara Benítez"
+        self.assertIsNone(self.indice.buscar("Lura", "Benitez"))
+
+    def test_sin_parecido_no_devuelve_nada(self):
+        self.assertIsNone(self.indice.buscar("Marta", "Ruiz"))
+
+    def test_permitidos_restringe_la_busqueda(self):
+        self.assertEqual(self.indice.buscar("Lura", "Benitez", permitidos={3}), 3)
+        self.assertIsNone(self.indice.buscar("Jose", "Perez", permitidos={2, 3}))
+
+
+class NormalizarTelefonoTests(SimpleTestCase):
+    """Formatos de teléfono que llegan del bot (ver identificacion.py)."""
+
+    def test_formatos_del_mismo_numero(self):
+        for telefono in ("+595 981 123-456", "00595981123456", "0981 123456", "0981123456", "981123456"):
+            with self.subTest(telefono=telefono):
+                self.assertEqual(normalizar_telefono(telefono), "981123456")
+
+    def test_numero_corto_conserva_el_595(self):
+        self.assertEqual(normalizar_telefono("595123"), "595123")
+        self.assertEqual(normalizar_telefono("5951234567"), "5951234567")
+
+    def test_vacio(self):
+        self.assertEqual(normalizar_telefono(None), "")
+        self.assertEqual(normalizar_telefono("sin número"), "")
+
+
+class IdentificarTests(TestCase):
+    """Identificación de personas por teléfono y nombre (ver identificacion.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jose = Persona.objects.create(nombre="José", apellido="Pérez", telefono="+595 981 111-111")
+        cls.alumno_jose = Alumno.objects.create(id_persona=cls.jose)
+        # Madre e hija con el mismo teléfono; solo la hija es alumna
+        cls.marta = Persona.objects.create(nombre="Marta", apellido="Gómez", telefono="0982 222222")
+        cls.lucia = Persona.objects.create(nombre="Lucía", apellido="Gómez", telefono="0982222222")
+        cls.alumno_lucia = Alumno.objects.create(id_persona=cls.lucia)
+        # Homónimos con el mismo teléfono
+        cls.ana_1 = Persona.objects.create(nombre="Ana", apellido="Ruiz", telefono="0983333333")
+        cls.ana_2 = Persona.objects.create(nombre="ana", apellido="ruiz ", telefono="0983333333")
+
+    def _ids(self, resultado):
+        return {c.id_persona for c in resultado.candidatos}
+
+    def test_sin_coincidencia(self):
+        self.assertEqual(identificar("0999999999").estado, SIN_COINCIDENCIA)
+        self.assertEqual(identificar("").estado, SIN_COINCIDENCIA)
+
+    def test_unica_en_cualquier_formato(self):
+        resultado = identificar("00595981111111")
+        self.assertEqual(resultado.estado, UNICA)
+        self.assertEqual(resultado.candidato.id_persona, self.jose.id_persona)
+        self.assertEqual(resultado.id_alumno, self.alumno_jose.id_alumno)
+
+    def test_ambigua_sin_nombre(self):
+        resultado = identificar("0982222222")
+        self.assertEqual(resultado.estado, AMBIGUA)
+        self.assertFalse(resultado.mismo_nombre)
+        self.assertEqual(self._ids(resultado), {self.marta.id_persona, self.lucia.id_persona})
+
+    def test_nombre_desempata(self):
+        resultado = identificar("0982222222", "lucia", "GOMEZ")
+        self.assertEqual(resultado.estado, UNICA)
+        self.assertEqual(resultado.candidato.id_persona, self.lucia.id_persona)
+
+    def test_ambigua_con_el_mismo_nombre(self):
+        resultado = identificar("0983333333", "Ana", "Ruiz")
+        self.assertEqual(resultado.estado, AMBIGUA)
+        self.assertTrue(resultado.mismo_nombre)
+        self.assertEqual(self._ids(resultado), {self.ana_1.id_persona, self.ana_2.id_persona})
+
+    def test_difuso(self):
+        self.assertEqual(identificar("0982222222", "Lucia", "Gomes").estado, AMBIGUA)
+        resultado = identificar("0982222222", "Lucia", "Gomes", difuso=True)
+        self.assertEqual(resultado.estado, UNICA)
+        self.assertEqual(resultado.candidato.id_persona, self.lucia.id_persona)
+
+    def test_exigir_nombre(self):
+        self.assertEqual(identificar("0981111111", "Pedro", "Pérez").estado, UNICA)
+        self.assertEqual(identificar("0981111111", "Pedro", "Pérez", exigir_nombre=True).estado, SIN_COINCIDENCIA)
+        self.assertEqual(identificar("0981111111", "José", "Perez", exigir_nombre=True).estado, UNICA)
+
+    def test_solo_alumnos(self):
+        resultado = identificar("0982222222", solo_alumnos=True)
+        self.assertEqual(resultado.estado, UNICA)
+        self.assertEqual(resultado.candidato.id_persona, self.lucia.id_persona)
+        self.assertEqual(resultado.id_alumno, self.alumno_lucia.id_alumno)
+        self.assertEqual(identificar("0983333333", solo_alumnos=True).estado, SIN_COINCIDENCIA)
@@ -1,6 +1,11 @@
 from datetime import datetime, date, timedelta
-from django.utils.timezone import make_aware, timezone
-from Pilapp.models import Turno, Clase, Instructor, HorarioDisponible
+from django.db import transaction
+from django.utils.timezone import make_aware, localdate
+from django.db.models import Count, Min
+from Pilapp.feriados import fechas_feriado
+from Pilapp.models import (
+    Turno, Clase, Instructor, HorarioDisponible, AlumnoClase, AlumnoClaseOcasional
+)
 
 
 def crear_turnos():
@@ -34,7 +39,109 @@ def crear_turnos():
     }
 
 
-def crear_clases_para_fecha(fecha=None):
+DIAS_SEMANA = {
+    0: "Lunes",
+    1: "Martes",
+    2: "Miércoles",
+    3: "Jueves",
+    4: "Viernes",
+    5: "Sábado",
+    6: "Domingo"
+}
+
+# Filas por INSERT en bulk_create (SQLite limita las variables por sentencia)
+TAMANO_LOTE_CLASES = 500
+
+
+def _generar_clases(fechas, omitir_feriados=False):
+    """
+    Crea las clases faltantes para las fechas indicadas con un número fijo de consultas.
+
+    1. Carga la instructora (id=1), los turnos y, opcionalmente, los feriados del rango.
+    2. Carga de una vez los pares (turno, fecha) que ya existen en el rango.
+    3. Calcula en memoria los pares faltantes.
+    4. Los inserta con bulk_create por lotes (ignore_conflicts=True).
+
+    Args:
+        fechas (list[date]): fechas a procesar, en orden.
+        omitir_feriados (bool): si es True no se crean clases en fechas de Feriado.
+
+    Returns:
+        list[dict] | dict: un resultado por fecha (mismo formato que
+        `crear_clases_para_fecha`), o un dict con 'error' si falta la instructora.
+    """
+    try:
+        instructora = Instructor.objects.get(id_instructor=1)
+    except Instructor.DoesNotExist:
+        return {'error': 'No se encontró la instructora con id=1'}
+
+    fecha_min, fecha_max = min(fechas), max(fechas)
+
+    turnos_por_dia = {}
+    for turno in Turno.objects.all():
+        turnos_por_dia.setdefault(turno.dia, []).append(turno)
+
+    feriados = fechas_feriado() if omitir_feriados else frozenset()
+
+    existentes = set(
+        Clase.objects.filter(fecha__range=(fecha_min, fecha_max)).values_list('id_turno_id', 'fecha')
+    )
+
+    nuevas = []
+    resultados = []
+    for fecha in fechas:
+        dia_semana = DIAS_SEMANA[fecha.weekday()]
+
+        # Si es domingo, no hay clases
+        if fecha.weekday() > 5:
+            resultados.append({
+                'creadas': 0,
+                'existentes': 0,
+                'mensaje': f'No se crean clases para {dia_semana} ({fecha.strftime("%d/%m/%Y")})',
+                'dia_semana': dia_semana
+            })
+            continue
+
+        if fecha in feriados:
+            resultados.append({
+                'creadas': 0,
+                'existentes': 0,
+                'feriado': True,
+                'mensaje': f'No se crean clases por feriado el {dia_semana} ({fecha.strftime("%d/%m/%Y")})',
+                'dia_semana': dia_semana
+            })
+            continue
+
+        clases_creadas = 0
+        clases_existentes = 0
+        for turno in turnos_por_dia.get(dia_semana, []):
+            if (turno.id_turno, fecha) in existentes:
+                clases_existentes += 1
+            else:
+                nuevas.append(Clase(id_instructor=instructora, id_turno=turno, fecha=fecha))
+                clases_creadas += 1
+
+        resultados.append({
+            'creadas': clases_creadas,
+            'existentes': clases_existentes,
+            'mensaje': f'Se crearon {clases_creadas} clases para {dia_semana} ({fecha.strftime("%d/%m/%Y")}). {clases_existentes} clases ya existían.',
+            'dia_semana': dia_semana
+        })
+
+    from Pilapp.calendario import invalidar_semanas
+    from Pilapp.estadisticas import invalidar_estadisticas
+
+    with transaction.atomic():
+        for i in range(0, len(nuevas), TAMANO_LOTE_CLASES):
+            Clase.objects.bulk_create(nuevas[i:i + TAMANO_LOTE_CLASES], ignore_conflicts=True)
+        # bulk_create no dispara señales
+        invalidar_semanas({clase.fecha for clase in nuevas})
+        invalidar_estadisticas()
+
+    return resultados
+
+
+def crear_clases_para_fecha(fecha=None, omitir_feriados=False):
     """
     Crea clases para todos los turnos correspondientes al día de la semana de la fecha proporcionada.
     Si no se proporciona una fecha, se utiliza la fecha actual.
@@ -42,6 +149,7 @@ def crear_clases_para_fecha(fecha=None):
     
     Args:
         fecha (date, optional): Fecha para la cual crear las clases. Por defecto es la fecha actual.
+        omitir_feriados (bool, optional): Si es True, no crea clases si la fecha es feriado.
     
     Returns:
         dict: Un diccionario con información sobre la operación realizada.
@@ -52,93 +160,37 @@ def crear_clases_para_fecha(fecha=None):
     """
     # Si no se proporciona fecha, usar la fecha actual
     if fecha is None:
-        fecha = timezone.localdate()
+        fecha = localdate()
 
-    
-    # Mapeo de índice de día de la semana (0=lunes, 6=domingo) a nombre del día
-    dias_semana = {
-        0: "Lunes",
-        1: "Martes",
-        2: "Miércoles",
-        3: "Jueves",
-        4: "Viernes",
-        5: "Sábado",
-        6: "Domingo"
-    }
-    
-    # Obtener el día de la semana de la fecha proporcionada
-    dia_semana_idx = fecha.weekday()
-    dia_semana = dias_semana.get(dia_semana_idx)
-    
-    # Si es domingo, no hay clases
-    if dia_semana_idx > 5:
-        return {
-            'creadas': 0,
-            'existentes': 0,
-            'mensaje': f'No se crean clases para {dia_semana} ({fecha.strftime("%d/%m/%Y")})',
-            'dia_semana': dia_semana
-        }
-    
-    # Obtener la instructora con id=1
-    try:
-        instructora = Instructor.objects.get(id_instructor=1)
-    except Instructor.DoesNotExist:
+    resultados = _generar_clases([fecha], omitir_feriados=omitir_feriados)
+    if isinstance(resultados, dict):
         return {
-            'error': 'No se encontró la instructora con id=1',
+            **resultados,
             'creadas': 0,
             'existentes': 0,
-            'dia_semana': dia_semana
+            'dia_semana': DIAS_SEMANA[fecha.weekday()]
         }
-    
-    # Obtener todos los turnos para el día de la semana
-    turnos = Turno.objects.filter(dia=dia_semana)
-    
-    clases_creadas = 0
-    clases_existentes = 0
-    
-    # Para cada turno, crear una clase si no existe
-    for turno in turnos:
-        # Verificar si ya existe una clase para este turno y fecha
-        clase_existente = Clase.objects.filter(
-            id_turno=turno,
-            fecha=fecha
-        ).exists()
-        
-        if not clase_existente:
-            # Crear la clase
-            Clase.objects.create(
-                id_instructor=instructora,
-                id_turno=turno,
-                fecha=fecha
-            )
-            clases_creadas += 1
-        else:
-            clases_existentes += 1
-    
-    resultado = {
-        'creadas': clases_creadas,
-        'existentes': clases_existentes,
-        'mensaje': f'Se crearon {clases_creadas} clases para {dia_semana} ({fecha.strftime("%d/%m/%Y")}). {clases_existentes} clases ya existían.',
-        'dia_semana': dia_semana
-    }
-    
-    return resultado
+    return resultados[0]
 
 
-def crear_clases_rango_fechas(fecha_inicio, fecha_fin):
+def crear_clases_rango_fechas(fecha_inicio, fecha_fin, omitir_feriados=False):
     """
     Crea clases para todas las fechas en un rango especificado.
+
+    Las clases existentes del rango se leen una sola vez y las faltantes se
+    insertan en lote (ver `_generar_clases`).
     
     Args:
         fecha_inicio (str o date): Fecha de inicio del rango en formato 'YYYY-MM-DD' o como objeto date.
         fecha_fin (str o date): Fecha de fin del rango en formato 'YYYY-MM-DD' o como objeto date.
+        omitir_feriados (bool, optional): Si es True, no crea clases en fechas cargadas en Feriado.
     
     Returns:
         dict: Un diccionario con información sobre la operación realizada.
               - 'total_creadas': Número total de clases creadas.
               - 'total_existentes': Número total de clases que ya existían.
               - 'dias_procesados': Número de días procesados.
-              - 'dias_con_clases': Número de días en los que se crearon clases (excluyendo domingos).
+              - 'dias_con_clases': Número de días en los que se crearon clases (excluyendo domingos y feriados omitidos).
               - 'mensaje': Mensaje descriptivo del resultado.
               - 'resultados_por_dia': Lista de resultados detallados por día.
     """
@@ -157,31 +209,28 @@ def crear_clases_rango_fechas(fecha_inicio, fecha_fin):
             'dias_procesados': 0,
             'dias_con_clases': 0
         }
-    
-    total_creadas = 0
-    total_existentes = 0
-    dias_procesados = 0
-    dias_con_clases = 0
-    resultados_por_dia = []
-    
-    # Iterar por cada fecha en el rango
-    fecha_actual = fecha_inicio
-    while fecha_actual <= fecha_fin:
-        # Crear clases para la fecha actual
-        resultado_dia = crear_clases_para_fecha(fecha=fecha_actual)
-        resultados_por_dia.append(resultado_dia)
-        
-        # Actualizar contadores
-        dias_procesados += 1
-        
-        # Solo contar días con clases (lunes a sábado)
-        if fecha_actual.weekday() <= 5:  # 0=lunes, 5=sábado
-            dias_con_clases += 1
-            total_creadas += resultado_dia.get('creadas', 0)
-            total_existentes += resultado_dia.get('existentes', 0)
-        
-        # Avanzar al siguiente día
-        fecha_actual += timedelta(days=1)
+
+    fechas = [fecha_inicio + timedelta(days=i) for i in range((fecha_fin - fecha_inicio).days + 1)]
+
+    resultados_por_dia = _generar_clases(fechas, omitir_feriados=omitir_feriados)
+    if isinstance(resultados_por_dia, dict):
+        return {
+            **resultados_por_dia,
+            'total_creadas': 0,
+            'total_existentes': 0,
+            'dias_procesados': 0,
+            'dias_con_clases': 0
+        }
+
+    # Solo contar días con clases (lunes a sábado, sin feriados omitidos)
+    dias_habiles = [
+        resultado for fecha, resultado in zip(fechas, resultados_por_dia)
+        if fecha.weekday() <= 5 and not resultado.get('feriado')
+    ]
+    dias_procesados = len(fechas)
+    dias_con_clases = len(dias_habiles)
+    total_creadas = sum(r['creadas'] for r in dias_habiles)
+    total_existentes = sum(r['existentes'] for r in dias_habiles)
     
     # Preparar resultado final
     resultado = {
@@ -196,4 +245,110 @@ def crear_clases_rango_fechas(fecha_inicio, fecha_fin):
     return resultado
 
 
+# Estados "vacíos": si una inscripción duplicada tiene otro estado, ese estado gana al fusionar
+ESTADOS_SIN_REGISTRO = {"pendiente", "reservado"}
 
+
+def _fusionar_inscripciones(modelo, campo_alumno, id_destino, ids_origen):
+    """
+    Mueve las inscripciones de `ids_origen` a la clase `id_destino`.
+    Si el alumno ya está inscripto en el destino, conserva una sola fila
+    (con el estado más informativo) y elimina la otra.
+
+    Returns:
+        tuple(int, int): (movidas, eliminadas)
+    """
+    en_destino = {
+        getattr(fila, f"{campo_alumno}_id"): fila
+        for fila in modelo.objects.filter(id_clase_id=id_destino)
+    }
+    movidas = 0
+    a_eliminar = []
+    for fila in modelo.objects.filter(id_clase_id__in=ids_origen).order_by('pk'):
+        clave = getattr(fila, f"{campo_alumno}_id")
+        existente = en_destino.get(clave)
+        if existente is None:
+            modelo.objects.filter(pk=fila.pk).update(id_clase_id=id_destino)
+            en_destino[clave] = fila
+            movidas += 1
+            continue
+        if existente.estado in ESTADOS_SIN_REGISTRO and fila.estado not in ESTADOS_SIN_REGISTRO:
+            modelo.objects.filter(pk=existente.pk).update(estado=fila.estado)
+            existente.estado = fila.estado
+        a_eliminar.append(fila.pk)
+
+    if a_eliminar:
+        modelo.objects.filter(pk__in=a_eliminar).delete()
+    return movidas, len(a_eliminar)
+
+
+def deduplicar_clases(solo_reportar=False):
+    """
+    Fusiona las clases duplicadas (mismo turno y fecha) en una sola.
+
+    Por cada grupo se conserva la clase de menor id; las inscripciones de las
+    demás (AlumnoClase y AlumnoClaseOcasional) se mueven a ella sin duplicar
+    alumnos, las clases sobrantes se eliminan y se recalcula total_inscriptos.
+
+    Args:
+        solo_reportar (bool): si es True solo devuelve los grupos, sin modificar nada.
+
+    Returns:
+        dict:
+            - 'grupos': lista de {'id_turno', 'fecha', 'id_clase_conservada', 'ids_eliminadas'}.
+            - 'clases_eliminadas', 'inscripciones_movidas', 'inscripciones_fusionadas' (int).
+            - 'mensaje' (str).
+    """
+    from Pilapp.contadores import recalcular_total_inscriptos
+
+    duplicados = (
+        Clase.objects.values('id_turno_id', 'fecha')
+        .annotate(cantidad=Count('pk'), id_conservada=Min('pk'))
+        .filter(cantidad__gt=1)
+        .order_by('fecha', 'id_turno_id')
+    )
+
+    grupos = []
+    for fila in duplicados:
+        ids = list(
+            Clase.objects.filter(id_turno_id=fila['id_turno_id'], fecha=fila['fecha'])
+            .exclude(pk=fila['id_conservada'])
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        grupos.append({
+            'id_turno': fila['id_turno_id'],
+            'fecha': fila['fecha'],
+            'id_clase_conservada': fila['id_conservada'],
+            'ids_eliminadas': ids,
+        })
+
+    movidas = 0
+    fusionadas = 0
+    if grupos and not solo_reportar:
+        with transaction.atomic():
+            for grupo in grupos:
+                for modelo, campo_alumno in (
+                    (AlumnoClase, 'id_alumno_paquete'),
+                    (AlumnoClaseOcasional, 'id_alumno'),
+                ):
+                    m, f = _fusionar_inscripciones(
+                        modelo, campo_alumno, grupo['id_clase_conservada'], grupo['ids_eliminadas']
+                    )
+                    movidas += m
+                    fusionadas += f
+                Clase.objects.filter(pk__in=grupo['ids_eliminadas']).delete()
+
+            recalcular_total_inscriptos([g['id_clase_conservada'] for g in grupos])
+
+    clases_eliminadas = 0 if solo_reportar else sum(len(g['ids_eliminadas']) for g in grupos)
+    return {
+        'grupos': grupos,
+        'clases_eliminadas': clases_eliminadas,
+        'inscripciones_movidas': movidas,
+        'inscripciones_fusionadas': fusionadas,
+        'mensaje': (
+            f'{len(grupos)} grupos de clases duplicadas. Se eliminaron {clases_eliminadas} clases, '
+            f'se movieron {movidas} inscripciones y se fusionaron {fusionadas}.'
+        ),
+    }
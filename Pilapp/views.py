@@ -3,6 +3,12 @@ from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import F
 from .models import *
+from .contadores import con_inscriptos_reales
+from .identificacion import AMBIGUA, SIN_COINCIDENCIA, identificar
+from .nombres import IndiceNombres
+from .asistencias import alumnos_de_clases, aplicar_asistencias, anotados_clase
+from .cupos import SinCupo, con_cupo, reservar_lugares
+from .serializacion import RespuestaJson, dia_semana, hora_texto
 import json
 import logging
 from datetime import datetime, timedelta
@@ -10,8 +16,6 @@ from django.db import models, transaction
 from django.utils import timezone
 from django.utils.timezone import now  # Para fecha de hoy respetando timezone
 from datetime import date
-import unicodedata
-from difflib import get_close_matches
 
 
 DAY_INDEX = {
@@ -34,10 +38,14 @@ DAY_NAME_ES = {
 }
 
 
+@transaction.atomic
 def reprogramar_clase_datos(data):
     """
     Lógica interna para reprogramar o cancelar una clase.
     Recibe data (dict) y retorna (dict) con los resultados.
+
+    El cupo de la clase destino se valida con la clase bloqueada hasta el
+    commit (ver cupos.py).
     """
     id_alumno = data.get("id_alumno")
     if not id_alumno:
@@ -102,9 +110,11 @@ def reprogramar_clase_datos(data):
         except Turno.DoesNotExist:
             return {"errores": ["No existe el turno destino especificado."]}
 
-        # Verificar cupos
-        if clase_destino.obtener_total_inscriptos >= 4:
-            return {"errores": ["La clase destino ya está llena."]}
+        # Verificar cupos (bloquea la clase destino hasta el commit)
+        try:
+            reservar_lugares([clase_destino])
+        except SinCupo as e:
+            return {"errores": e.mensajes}
 
         # Verificar duplicados en destino
         ya_en_clase = AlumnoClase.objects.filter(id_alumno_paquete__id_alumno=alumno, id_clase=clase_destino).exists() if tipo_alumno == "regular" else \
@@ -186,7 +196,11 @@ def cambiar_turnos_paquete_datos(data):
     - id_alumno
     - id_paquete (opcional)
     - turnos_nuevos (lista de strings 'Dia HH:MM')
+
+    Las reservas futuras se rearman por diferencia con inscripciones.cambiar_turnos.
     """
+    from .inscripciones import cambiar_turnos, resolver_turnos
+
     id_alumno = data.get("id_alumno")
     id_paquete = data.get("id_paquete")
     turnos_nuevos_str = data.get("turnos_nuevos", [])
@@ -195,85 +209,39 @@ def cambiar_turnos_paquete_datos(data):
         return {"errores": ["Falta 'id_alumno' o 'turnos_nuevos'"]}
 
     # Obtener alumno
-    alumno = Alumno.objects.get(id_alumno=id_alumno)
+    alumno = Alumno.objects.select_related('id_persona').get(id_alumno=id_alumno)
     
     if id_paquete:
         alumno_paquete = AlumnoPaquete.objects.filter(
             id_alumno=alumno,
             id_paquete=id_paquete,
             estado='activo'
-        ).first()
+        ).select_related('id_paquete').first()
     else:
         alumno_paquete = AlumnoPaquete.objects.filter(
             id_alumno=alumno,
             estado='activo'
-        ).order_by('-id_alumno_paquete').first()
+        ).select_related('id_paquete').order_by('-id_alumno_paquete').first()
 
     if not alumno_paquete:
         return {"errores": ["No se encontró un paquete activo para el alumno"]}
 
-    turnos_anteriores_objs = AlumnoPaqueteTurno.objects.filter(id_alumno_paquete=alumno_paquete)
+    turnos_anteriores_objs = AlumnoPaqueteTurno.objects.filter(
+        id_alumno_paquete=alumno_paquete
+    ).select_related('id_turno')
     turnos_anteriores = [f"{t.id_turno.dia} {t.id_turno.horario.strftime('%H:%M')}" for t in turnos_anteriores_objs]
 
-    errores = []
-    turnos_nuevos_objs = []
-    for turno_str in turnos_nuevos_str:
-        try:
-            if str(turno_str).isdigit():
-                turno_obj = Turno.objects.get(id_turno=int(turno_str))
-            else:
-                parts = turno_str.split(' ')
-                dia = parts[0]
-                hora = parts[1]
-                disciplina = parts[2] if len(parts) > 2 else 'Reformer'
-                disciplina = 'MAT' if disciplina.upper() == 'MAT' else disciplina.capitalize()
-                hora_obj = datetime.strptime(hora, "%H:%M").time()
-                turno_obj = Turno.objects.get(dia=dia, horario=hora_obj, disciplina=disciplina)
-            turnos_nuevos_objs.append(turno_obj)
-        except ValueError:
-            errores.append(f"Formato de turno inválido: {turno_str}")
-        except Turno.DoesNotExist:
-            errores.append(f"Turno {turno_str} no existe")
-
+    # Turnos nuevos en una sola consulta
+    turnos_nuevos_objs, errores = resolver_turnos(turnos_nuevos_str)
     if errores:
         return {"errores": errores}
-    fecha_actual = timezone.localdate()
-    clases_futuras = AlumnoClase.objects.filter(
-        id_alumno_paquete=alumno_paquete,
-        id_clase__fecha__gte=fecha_actual
-    )
-
-    clases_futuras.delete()
-    AlumnoPaqueteTurno.objects.filter(id_alumno_paquete=alumno_paquete).delete()
-
-    clases_reservadas = []
-    cantidad_clases = alumno_paquete.id_paquete.cantidad_clases
-    cantidad_turnos = len(turnos_nuevos_objs)
-    base_clases = cantidad_clases // cantidad_turnos
-    extra = cantidad_clases % cantidad_turnos
-
-    for idx, t in enumerate(turnos_nuevos_objs):
-        clases_por_turno = base_clases + (1 if idx < extra else 0)
-        fecha_inicio = obtener_fecha_proximo_dia(t.dia)
-        fechas = obtener_fechas_turno_normal(t.id_turno, str(fecha_inicio), clases_por_turno)["fechas"]
-
-        for fecha_str in fechas:
-            fecha_obj = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-            clase_obj, _ = Clase.objects.get_or_create(
-                id_turno=t,
-                fecha=fecha_obj,
-                defaults={"id_instructor": Instructor.objects.get(id_instructor=1)}
-            )
 
-            if not AlumnoClase.objects.filter(id_alumno_paquete=alumno_paquete, id_clase=clase_obj).exists():
-                AlumnoClase.objects.create(
-                    id_alumno_paquete=alumno_paquete,
-                    id_clase=clase_obj,
-                    estado="reservado"
-                )
-                clases_reservadas.append(f"{fecha_obj} {t.dia} {t.horario}")
-
-        AlumnoPaqueteTurno.objects.get_or_create(id_alumno_paquete=alumno_paquete, id_turno=t)
+    # Cambio por diferencia: solo se tocan las reservas futuras que cambian
+    try:
+        resultado = cambiar_turnos(alumno_paquete, turnos_nuevos_objs, estado_reserva="reservado")
+    except SinCupo as e:
+        return {"errores": e.mensajes}
+    clases_reservadas = [f"{fecha} {t.dia} {t.horario}" for t, fecha in resultado["reservas"]]
 
     return {
         "status": "success",
@@ -326,7 +294,13 @@ def cambiar_turnos_paquete(request):
 def renovar_paquete_datos(data):
     """
     Lógica interna para renovar o actualizar un paquete.
+
+    La renovación se resuelve con el motor en lote de inscripciones.py. Con
+    data["solo_simular"] se devuelve el plan (clases a reservar, omitidas) sin
+    escribir nada; los conflictos se devuelven como {"errores": [...]}.
     """
+    from .inscripciones import ejecutar_renovacion
+
     id_alumno = data.get("id_alumno")
     nombre_in = data.get("nombre")
     apellido_in = data.get("apellido")
@@ -339,16 +313,12 @@ def renovar_paquete_datos(data):
         if not (nombre_in and telefono_in):
             return {"errores": ["Debes enviar 'id_alumno' y 'tipo_paquete'."]}
     
-        personas = Persona.objects.filter(telefono = telefono_in)
-        alumnos_dict = {
-            normalizar(f"{p.nombre} {p.apellido}"): Alumno.objects.get(id_persona=p).id_alumno
-            for p in personas if Alumno.objects.filter(id_persona=p).exists()
-        }
-
-        match = resolver_nombre({"nombre":nombre_in, "apellido":apellido_in}, alumnos_dict)
-        if not match:
+        identificacion = identificar(
+            telefono_in, nombre_in, apellido_in, solo_alumnos=True, difuso=True, exigir_nombre=True
+        )
+        if not identificacion.unica:
             return {"errores": ["No se pudo identificar al alumno con exactitud"]}
-        id_alumno = alumnos_dict[match]
+        id_alumno = identificacion.id_alumno
 
     if not tipo_paquete:
         return {"errores": ["Falta 'tipo_paquete'."]}
@@ -369,171 +339,50 @@ def renovar_paquete_datos(data):
     except Paquete.DoesNotExist:
         return {"errores": ["Paquete no encontrado."]}
 
-    errores = []
-    clases_a_reservar = []
-    turnos_obj_nuevos = []
-
-    # 1. Obtener turnos actuales
-    paquete_actual = AlumnoPaquete.objects.filter(
-        id_alumno=alumno,
-        estado='activo'
-    ).first()
-
-    turnos_actuales = []
-    if paquete_actual:
-        turnos_actuales = [
-            t.id_turno for t in
-            AlumnoPaqueteTurno.objects.filter(id_alumno_paquete=paquete_actual)
-        ]
-
-    # 2. Procesar nuevos turnos
-    for turno_str in turnos_nuevos_str:
-        try:
-            parts = turno_str.split()
-            dia = parts[0]
-            hora = parts[1]
-            disciplina = parts[2] if len(parts) > 2 else 'Reformer'
-            disciplina = 'MAT' if disciplina.upper() == 'MAT' else disciplina.capitalize()
-            turno_obj = Turno.objects.get(dia=dia, horario=hora, disciplina=disciplina)
-
-            disponibles = buscar_turnos_disponibles(
-                dia,
-                operador_hora="exact",
-                hora_referencia=hora
-            )
-
-            if any(t["id_turno"] == turno_obj.id_turno for t in disponibles):
-                turnos_obj_nuevos.append(turno_obj)
-            else:
-                errores.append(f"No hay cupo para {turno_str}")
-
-        except Turno.DoesNotExist:
-            errores.append(f"Turno {turno_str} no existe")
-        except ValueError:
-            errores.append(f"Formato de turno inválido: {turno_str}")
-
-    # 3. Combinar turnos sin duplicar
-    turnos_finales = {t.id_turno: t for t in turnos_actuales}
-
-    for t in turnos_obj_nuevos:
-        turnos_finales[t.id_turno] = t
-
-    turnos_finales = list(turnos_finales.values())
-
-    if not turnos_finales:
-        return {"errores": ["No hay turnos válidos para la renovación."]}
-
-    # 4. Calcular distribución
-    cantidad_clases = paquete.cantidad_clases
-    cantidad_turnos = len(turnos_finales)
-
-    base = cantidad_clases // cantidad_turnos
-    extra = cantidad_clases % cantidad_turnos
-
-    # 5. Validar cupos y preparar clases
-    for idx, turno in enumerate(turnos_finales):
-
-        clases_para_turno = base + (1 if idx < extra else 0)
-
-        fecha_inicio = (
-            datetime.strptime(fecha_inicio_str, "%Y-%m-%d").date()
-            if fecha_inicio_str
-            else obtener_fecha_proximo_dia(turno.dia)
-        )
-
-        fechas = obtener_fechas_turno_normal(
-            turno.id_turno,
-            str(fecha_inicio),
-            clases_para_turno
-        )["fechas"]
-
-        for fecha_str in fechas:
-            fecha_obj = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-
-            clase, _ = Clase.objects.get_or_create(
-                id_turno=turno,
-                fecha=fecha_obj,
-                defaults={
-                    "id_instructor": Instructor.objects.first()
-                }
-            )
-
-            # Validar duplicados
-            existe = AlumnoClase.objects.filter(
-                id_clase=clase,
-                id_alumno_paquete__id_alumno=alumno
-            ).exists()
-
-            if existe:
-                continue
-
-            # Validar cupo
-            total = (
-                AlumnoClase.objects.filter(id_clase=clase).count() +
-                AlumnoClaseOcasional.objects.filter(id_clase=clase).count()
-            )
-
-            if total >= 4:
-                errores.append(f"Clase llena {fecha_obj} {turno.horario}")
-                continue
-
-            clases_a_reservar.append((clase, turno))
-
-    if errores:
-        return {"errores": errores}
-
-    # 6. Expirar paquete anterior
-    AlumnoPaquete.objects.filter(
-        id_alumno=alumno,
-        estado='activo'
-    ).update(estado='expirado')
-
-    # 7. Crear nuevo paquete
-    nuevo_paquete = AlumnoPaquete.objects.create(
-        id_alumno=alumno,
-        id_paquete=paquete,
-        estado='activo',
-        fecha_inicio=fecha_inicio_str or timezone.localdate()
+    try:
+        fecha_inicio = datetime.strptime(fecha_inicio_str, "%Y-%m-%d").date() if fecha_inicio_str else None
+    except ValueError:
+        return {"errores": ["Formato de 'fecha_inicio' inválido. Use YYYY-MM-DD."]}
+
+    # Plan en lote: turnos, fechas, cupos y duplicados (ver inscripciones.py)
+    resultado = ejecutar_renovacion(
+        alumno,
+        paquete,
+        turnos_nuevos=turnos_nuevos_str,
+        fecha_inicio=fecha_inicio,
+        estado_reserva="reservado",
+        solo_simular=bool(data.get("solo_simular")),
     )
 
-    # 8. Guardar turnos
-    for turno in turnos_finales:
-        AlumnoPaqueteTurno.objects.get_or_create(
-            id_alumno_paquete=nuevo_paquete,
-            id_turno=turno
-        )
-
-    # 9. Crear clases
-    clases_reservadas = []
-
-    for clase, turno in clases_a_reservar:
-        AlumnoClase.objects.create(
-            id_alumno_paquete=nuevo_paquete,
-            id_clase=clase,
-            estado="reservado"
-        )
-
-        # Actualizar contador correctamente
-        total = (
-            AlumnoClase.objects.filter(id_clase=clase).count() +
-            AlumnoClaseOcasional.objects.filter(id_clase=clase).count()
-        )
+    if resultado["conflictos"]:
+        return {"errores": resultado["conflictos"]}
+
+    datos = {
+        "alumno": f"{alumno.id_persona.nombre} {alumno.id_persona.apellido}",
+        "paquete": f"{paquete.cantidad_clases} clases",
+        "turnos_anteriores": [f"{t.dia} {t.horario}" for t in resultado["turnos_anteriores"]],
+        "turnos_nuevos": turnos_nuevos_str,
+        "clases_reservadas": [
+            {"fecha": str(reserva["fecha"]), "hora": reserva["turno"].horario.strftime("%H:%M")}
+            for reserva in resultado["reservas"]
+        ],
+        "clases_omitidas": [
+            {"fecha": str(omitida["fecha"]), "hora": omitida["turno"].horario.strftime("%H:%M")}
+            for omitida in resultado["omitidas"]
+        ],
+    }
 
-        clases_reservadas.append({
-            "fecha": str(clase.fecha),
-            "hora": turno.horario.strftime("%H:%M")
-        })
+    if not resultado["aplicada"]:
+        return {
+            "status": "simulacion",
+            "message": "Simulación de renovación: no se guardaron cambios.",
+            "data": datos
+        }
 
     return {
         "status": "success",
         "message": "Renovación completa",
-        "data": {
-            "alumno": f"{alumno.id_persona.nombre} {alumno.id_persona.apellido}",
-            "paquete": f"{paquete.cantidad_clases} clases",
-            "turnos_anteriores": [f"{t.dia} {t.horario}" for t in turnos_actuales],
-            "turnos_nuevos": turnos_nuevos_str,
-            "clases_reservadas": clases_reservadas
-        }
+        "data": datos
     }
 
 
@@ -740,34 +589,37 @@ def obtener_relacionados(request):
 
         relaciones_qs = RelacionAlumno.objects.filter(
             models.Q(id_alumno_1=alumno) | models.Q(id_alumno_2=alumno)
-        ).select_related(
-            "id_alumno_1__id_persona",
-            "id_alumno_2__id_persona"
         )
 
         if solo_activas:
             relaciones_qs = relaciones_qs.filter(activa=True)
 
+        # Ambos lados de la relación en tuplas; nos quedamos con el que no es el alumno
         relacionados = []
-
-        for relacion in relaciones_qs:
-            if relacion.id_alumno_1_id == alumno.id_alumno:
-                otro_alumno = relacion.id_alumno_2
+        for (id_relacion, tipo_relacion, observaciones, activa,
+             id_1, nombre_1, apellido_1, estado_1,
+             id_2, nombre_2, apellido_2, estado_2) in relaciones_qs.values_list(
+            "id_relacion_alumno", "tipo_relacion", "observaciones", "activa",
+            "id_alumno_1", "id_alumno_1__id_persona__nombre", "id_alumno_1__id_persona__apellido", "id_alumno_1__estado",
+            "id_alumno_2", "id_alumno_2__id_persona__nombre", "id_alumno_2__id_persona__apellido", "id_alumno_2__estado",
+        ):
+            if id_1 == alumno.id_alumno:
+                otro = (id_2, nombre_2, apellido_2, estado_2)
             else:
-                otro_alumno = relacion.id_alumno_1
+                otro = (id_1, nombre_1, apellido_1, estado_1)
 
             relacionados.append({
-                "id_relacion_alumno": relacion.id_relacion_alumno,
-                "id_alumno_relacionado": otro_alumno.id_alumno,
-                "nombre": otro_alumno.id_persona.nombre,
-                "apellido": otro_alumno.id_persona.apellido,
-                "estado": otro_alumno.estado,
-                "tipo_relacion": relacion.tipo_relacion,
-                "observaciones": relacion.observaciones,
-                "activa": relacion.activa
+                "id_relacion_alumno": id_relacion,
+                "id_alumno_relacionado": otro[0],
+                "nombre": otro[1],
+                "apellido": otro[2],
+                "estado": otro[3],
+                "tipo_relacion": tipo_relacion,
+                "observaciones": observaciones,
+                "activa": activa
             })
 
-        return JsonResponse({
+        return RespuestaJson({
             "id_alumno": alumno.id_alumno,
             "relacionados": relacionados
         }, status=200)
@@ -794,18 +646,25 @@ def obtener_clases_agendadas(request):
     Entradas (JSON):
     - id_alumno (int)                 [obligatorio]
     - fecha_minima (str, YYYY-MM-DD)  [opcional]
+    - limite (int)                    [opcional; máximo de clases a devolver, las más próximas]
+    - tipo (str)                      [opcional; "regular" | "ocasional" | "todas". Por defecto, según el estado del alumno]
 
     Validaciones y posibles errores:
     - Falta 'id_alumno' → 400 {"errores": ["Falta el campo 'id_alumno'."]}
     - 'fecha_minima' con formato inválido → 400 {"errores": ["La fecha debe tener el formato YYYY-MM-DD."]}
+    - 'limite' inválido → 400 {"errores": ["El campo 'limite' debe ser un entero positivo."]}
+    - 'tipo' inválido → 400 {"errores": ["El campo 'tipo' debe ser 'regular', 'ocasional' o 'todas'."]}
     - Alumno no encontrado → 404 {"errores": ["Alumno no encontrado"]}
     - Error no controlado → 500 {"error": "<mensaje de excepción>"}
 
-    Comportamiento según estado del alumno:
+    Comportamiento según estado del alumno (si no se envía 'tipo'):
     - estado == "regular" → consulta en AlumnoClase (clases regulares).
-    - estado == "ocasional" → consulta en AlumnoClaseOcasional (clases con fecha >= fecha_minima).
+    - estado == "ocasional" → consulta en AlumnoClaseOcasional.
     - estado distinto (p. ej. "inactivo") → 200 {"clases": [], "message": "El alumno está inactivo, no tiene clases agendadas actualmente."}
 
+    El filtro por fecha mínima, el orden (fecha, hora) y el límite se resuelven
+    en la consulta; con tipo "todas" ambas tablas se unen con UNION ALL.
+
     Cada elemento de la lista "clases" tiene esta estructura:
     {
     "id_clase": int,
@@ -841,6 +700,8 @@ def obtener_clases_agendadas(request):
         data = json.loads(request.body)
         id_alumno = data.get("id_alumno")
         fecha_minima_str = data.get("fecha_minima")
+        limite = data.get("limite")
+        tipo = data.get("tipo")
 
         if not id_alumno:
             errores.append("Falta el campo 'id_alumno'.")
@@ -853,6 +714,17 @@ def obtener_clases_agendadas(request):
             except ValueError:
                 errores.append("La fecha debe tener el formato YYYY-MM-DD.")
 
+        if limite is not None:
+            try:
+                limite = int(limite)
+                if limite <= 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errores.append("El campo 'limite' debe ser un entero positivo.")
+
+        if tipo is not None and tipo not in ("regular", "ocasional", "todas"):
+            errores.append("El campo 'tipo' debe ser 'regular', 'ocasional' o 'todas'.")
+
         if errores:
             return JsonResponse({"errores": errores}, status=400)
 
@@ -861,57 +733,50 @@ def obtener_clases_agendadas(request):
         except Alumno.DoesNotExist:
             return JsonResponse({"errores": ["Alumno no encontrado"]}, status=404)
 
-        clases_resultado = []
-
-        if alumno.estado == "regular":
-            clases_regulares = AlumnoClase.objects.filter(
-                id_alumno_paquete__id_alumno=alumno
-            ).select_related("id_clase", "id_clase__id_turno")
-
-            for ac in clases_regulares:
-                clase = ac.id_clase
-                clases_resultado.append({
-                    "id_clase": clase.id_clase,
-                    "fecha": str(clase.fecha),
-                    "dia": clase.fecha.strftime("%A").capitalize(),
-                    "hora": clase.id_turno.horario.strftime("%H:%M"),
-                    "tipo": "regular",
-                    "estado": ac.estado
-                })
-
-        elif alumno.estado == "ocasional":
-            clases_ocasionales = AlumnoClaseOcasional.objects.filter(
-                id_alumno=alumno,
-                id_clase__fecha__gte=fecha_minima
-            ).select_related("id_clase", "id_clase__id_turno")
-
-            for ao in clases_ocasionales:
-                clase = ao.id_clase
-                clases_resultado.append({
-                "id_clase": clase.id_clase,
-                "fecha": str(clase.fecha),
-                "dia": clase.fecha.strftime("%A").capitalize(),  # o un mapa ES consistente
-                "hora": clase.id_turno.horario.strftime("%H:%M"),
-                "tipo": "ocasional",
-                "estado": ao.estado
+        if tipo is None:
+            if alumno.estado not in ("regular", "ocasional"):
+                return JsonResponse({
+                    "clases": [],
+                    "message": "El alumno está inactivo, no tiene clases agendadas actualmente."
                 })
+            tipo = alumno.estado
+
+        fuentes = []
+        if tipo in ("regular", "todas"):
+            fuentes.append((AlumnoClase.objects.filter(id_alumno_paquete__id_alumno=alumno), "regular"))
+        if tipo in ("ocasional", "todas"):
+            fuentes.append((AlumnoClaseOcasional.objects.filter(id_alumno=alumno), "ocasional"))
+        consultas = [
+            qs.filter(id_clase__fecha__gte=fecha_minima).annotate(
+                id_clase_ref=F("id_clase_id"),
+                fecha=F("id_clase__fecha"),
+                horario_turno=F("id_clase__id_turno__horario"),
+                tipo=models.Value(tipo_clase, output_field=models.CharField()),
+            ).values_list("id_clase_ref", "fecha", "horario_turno", "tipo", "estado")
+            for qs, tipo_clase in fuentes
+        ]
 
+        # Filtro, orden y límite en la base: solo viajan las filas que se devuelven
+        clases = consultas[0]
+        if len(consultas) > 1:
+            clases = clases.union(*consultas[1:], all=True)
+        clases = clases.order_by("fecha", "horario_turno", "tipo")
+        if limite:
+            clases = clases[:limite]
 
-        else:
-            return JsonResponse({
-                "clases": [],
-                "message": "El alumno está inactivo, no tiene clases agendadas actualmente."
-            })
-
-        # Filtrar por fecha mínima
-        clases_filtradas = [
-            c for c in clases_resultado
-            if datetime.strptime(c["fecha"], "%Y-%m-%d").date() >= fecha_minima
+        clases_ordenadas = [
+            {
+                "id_clase": id_clase,
+                "fecha": fecha.isoformat(),
+                "dia": dia_semana(fecha),
+                "hora": hora_texto(horario),
+                "tipo": tipo_clase,
+                "estado": estado
+            }
+            for id_clase, fecha, horario, tipo_clase, estado in clases
         ]
 
-        clases_ordenadas = sorted(clases_filtradas, key=lambda c: (c["fecha"], c["hora"]))
-
-        return JsonResponse({"clases": clases_ordenadas})
+        return RespuestaJson({"clases": clases_ordenadas})
 
     except Exception as e:
         logging.error(f"[obtener_clases_agendadas] Error: {str(e)}")
@@ -919,42 +784,6 @@ def obtener_clases_agendadas(request):
 
 
 
-def normalizar(texto):
-    if not texto:
-        return ""
-    texto = texto.strip().lower()
-    texto = unicodedata.normalize('NFD', texto)
-    return ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
-
-def resolver_nombre(nombre_dict, alumnos_dict):
-    """
-    Intenta matchear el nombre recibido con los nombres normalizados de alumnos anotados.
-    Retorna id_alumno si hay un único match.
-    """
-    nombre_input = normalizar(nombre_dict.get("nombre", ""))
-    apellido_input = normalizar(nombre_dict.get("apellido", ""))
-    nombre_completo_input = f"{nombre_input} {apellido_input}".strip()
-
-    posibles = []
-
-    if nombre_completo_input in alumnos_dict:
-        return nombre_completo_input
-
-    for nombre_guardado in alumnos_dict:
-        if nombre_input and nombre_input in nombre_guardado:
-            if apellido_input and apellido_input in nombre_guardado:
-                posibles.append(nombre_guardado)
-            elif not apellido_input:
-                posibles.append(nombre_guardado)
-
-    if len(posibles) == 1:
-        return posibles[0]
-
-    difusos = get_close_matches(nombre_completo_input, alumnos_dict.keys(), n=1, cutoff=0.85)
-    if len(difusos) == 1:
-        return difusos[0]
-
-    return None
 
 
 @csrf_exempt
@@ -1013,17 +842,9 @@ def registrar_pago(request):
             alumno = Alumno.objects.filter(id_alumno=id_alumno).first()
         
         if not alumno and telefono:
-            personas = Persona.objects.filter(telefono=telefono)
-            if personas.count() == 1:
-                alumno = Alumno.objects.filter(id_persona=personas.first()).first()
-            elif personas.count() > 1:
-                candidatos =  {
-                    normalizar(f"{p.nombre} {p.apellido}"): Alumno.objects.filter(id_persona=p).first()
-                    for p in personas if Alumno.objects.filter(id_persona=p).exists()
-                }
-                match = resolver_nombre({"nombre":nombre, "apellido":apellido}, candidatos)
-                if match:
-                    alumno = candidatos[match]
+            identificacion = identificar(telefono, nombre, apellido, solo_alumnos=True, difuso=True)
+            if identificacion.unica:
+                alumno = Alumno.objects.filter(id_alumno=identificacion.id_alumno).first()
 
  #       if not alumno and nombre and apellido:
   #          persona = Persona.objects.filter(nombre__icontains=nombre, apellido__icontains=apellido).first()
@@ -1123,8 +944,8 @@ def registrar_asistencias(request):
     Comportamiento interno:
     - Busca el turno (Turno.dia, Turno.horario).
     - Busca la clase correspondiente (Clase.id_turno, Clase.fecha).
-    - Crea un diccionario de alumnos de la clase (regulares y ocasionales), indexados por nombre normalizado.
-    - Actualiza el estado de cada alumno:
+    - Resuelve todos los nombres de una vez contra un índice de los anotados en la clase, regulares y ocasionales (nombres.py).
+    - Actualiza el estado de cada alumno, todos juntos con bulk_update (asistencias.py):
     • "faltó" para los incluidos en `faltaron`
     • "asistió" para los incluidos en `asistieron`
     - Si el nombre no se encuentra, se agrega a `alumnos_no_encontrados`.
@@ -1186,54 +1007,48 @@ def registrar_asistencias(request):
             errores.append("Clase no encontrada para ese turno y fecha.")
             return JsonResponse({"errores": errores}, status=404)
 
-        # Construir diccionario: nombre_normalizado → (id_alumno, instancia, tipo)
-        alumnos_dict = {}
-
-        alumnos_regulares = AlumnoClase.objects.filter(id_clase=clase)
-        for ac in alumnos_regulares:
-            persona = ac.id_alumno_paquete.id_alumno.id_persona
-            nombre = normalizar(f"{persona.nombre} {persona.apellido}")
-            alumnos_dict[nombre] = (persona.id_persona, ac, "regular")
+        # Anotados en la clase con su Persona: id_persona → (tipo, instancia, nombre normalizado)
+        anotados = anotados_clase(clase)
 
-        alumnos_ocasionales = AlumnoClaseOcasional.objects.filter(id_clase=clase)
-        for ao in alumnos_ocasionales:
-            persona = ao.id_alumno.id_persona
-            nombre = normalizar(f"{persona.nombre} {persona.apellido}")
-            alumnos_dict[nombre] = (persona.id_persona, ao, "ocasional")
+        # Todos los nombres en una pasada sobre un índice de los anotados (ver nombres.py)
+        indice = IndiceNombres((id_persona, nombre) for id_persona, (_, _, nombre) in anotados.items())
+        matches = indice.resolver(list(faltaron) + list(asistieron))
+        matches_faltaron = matches[:len(faltaron)]
+        matches_asistieron = matches[len(faltaron):]
 
         procesados = []
         ya_procesados = set()
         no_encontrados = []
+        cambios = []
 
         # Marcar faltaron
-        for alumno_dict in faltaron:
-            nombre_match = resolver_nombre(alumno_dict, alumnos_dict)
-            if nombre_match:
-                _, instancia, _ = alumnos_dict[nombre_match]
-                instancia.estado = "faltó"
-                instancia.save()
-                if nombre_match not in ya_procesados:
+        for alumno_dict, id_persona in zip(faltaron, matches_faltaron):
+            if id_persona:
+                tipo, instancia, nombre_match = anotados[id_persona]
+                cambios.append((tipo, instancia.pk, "faltó"))
+                if id_persona not in ya_procesados:
                     procesados.append(nombre_match)
-                    ya_procesados.add(nombre_match)
+                    ya_procesados.add(id_persona)
             else:
                 nombre_visible = alumno_dict.get("nombre", "")
                 apellido_visible = alumno_dict.get("apellido", "")
                 no_encontrados.append(f"{nombre_visible} {apellido_visible}".strip())
 
         # Marcar asistieron
-        for alumno_dict in asistieron:
-            nombre_match = resolver_nombre(alumno_dict, alumnos_dict)
-            if nombre_match and nombre_match not in ya_procesados:
-                _, instancia, _ = alumnos_dict[nombre_match]
-                instancia.estado = "asistió"
-                instancia.save()
+        for alumno_dict, id_persona in zip(asistieron, matches_asistieron):
+            if id_persona and id_persona not in ya_procesados:
+                tipo, instancia, nombre_match = anotados[id_persona]
+                cambios.append((tipo, instancia.pk, "asistió"))
                 procesados.append(nombre_match)
-                ya_procesados.add(nombre_match)
-            elif not nombre_match:
+                ya_procesados.add(id_persona)
+            elif not id_persona:
                 nombre_visible = alumno_dict.get("nombre", "")
                 apellido_visible = alumno_dict.get("apellido", "")
                 no_encontrados.append(f"{nombre_visible} {apellido_visible}".strip())
 
+        # Un bulk_update por modelo y un solo recálculo de la clase
+        aplicar_asistencias(cambios)
+
         return JsonResponse({
             "asistencias_registradas": procesados,
             "alumnos_no_encontrados": no_encontrados,
@@ -1272,6 +1087,20 @@ def obtener_fecha_proximo_dia(dia_nombre):
     
     return fecha_objetivo
 
+def _error_identificacion(identificacion):
+    """JsonResponse de error para una identificación por teléfono no única (o None si es única)."""
+    if identificacion.estado == SIN_COINCIDENCIA:
+        return JsonResponse({"error": "No se encontró ninguna persona con ese teléfono."}, status=404)
+    if identificacion.estado == AMBIGUA and identificacion.mismo_nombre:
+        return JsonResponse({
+            "error": "Se encontró más de una persona con ese teléfono, nombre y apellido."
+        }, status=400)
+    if identificacion.estado == AMBIGUA:
+        return JsonResponse({
+            "error": "Hay varias personas con ese teléfono, pero ninguna coincide exactamente con el nombre y apellido."
+        }, status=400)
+    return None
+
 @csrf_exempt
 def obtener_id_alumno(request):
     """
@@ -1285,7 +1114,7 @@ def obtener_id_alumno(request):
     - Otros métodos → 405 {"error": "Método no permitido"}
 
     Entradas (JSON):
-    - telefono (str)    [obligatorio]
+    - telefono (str)    [obligatorio; se compara normalizado: "+595 981 123456" = "0981123456"]
     - nombre (str)      [opcional; usado para desambiguar si hay más de una persona con el mismo teléfono]
     - apellido (str)    [opcional; usado para desambiguar si hay más de una persona con el mismo teléfono]
 
@@ -1314,40 +1143,19 @@ def obtener_id_alumno(request):
             if not telefono:
                 return JsonResponse({"error": "El campo 'telefono' es obligatorio."}, status=400)
 
-            personas = Persona.objects.filter(telefono=telefono.strip())
-            personas_filtradas = []
+            # Teléfono + LEFT JOIN a Alumno en una consulta (ver identificacion.py)
+            identificacion = identificar(telefono, nombre, apellido)
+            error = _error_identificacion(identificacion)
+            if error:
+                return error
 
-            if personas.count() == 0:
-                return JsonResponse({"error": "No se encontró ninguna persona con ese teléfono."}, status=404)
-
-            if personas.count() == 1:
-                persona = personas.first()
-            else:
-                # Más de una persona con ese teléfono, aplicar comparación con nombre y apellido
-                for p in personas:
-                    if p.nombre.strip().lower() == nombre and p.apellido.strip().lower() == apellido:
-                        personas_filtradas.append(p)
-
-                if len(personas_filtradas) == 0:
-                    return JsonResponse({
-                        "error": "Hay varias personas con ese teléfono, pero ninguna coincide exactamente con el nombre y apellido."
-                    }, status=400)
-                if len(personas_filtradas) > 1:
-                    return JsonResponse({
-                        "error": "Se encontró más de una persona con ese teléfono, nombre y apellido."
-                    }, status=400)
-
-                persona = personas_filtradas[0]
-
-            # Buscar Alumno asociado
-            try:
-                alumno = Alumno.objects.get(id_persona=persona)
-            except Alumno.DoesNotExist:
+            candidato = identificacion.candidato
+            if candidato.id_alumno is None:
                 return JsonResponse({"error": "La persona existe pero no está registrada como alumno."}, status=404)
 
             return JsonResponse({
-                "id_alumno": alumno.id_alumno,
-                "estado": alumno.estado
+                "id_alumno": candidato.id_alumno,
+                "estado": candidato.estado_alumno
             })
 
         except Exception as e:
@@ -1386,7 +1194,7 @@ def registrar_alumno_ocasional(request):
     - Si no se proporciona 'fecha' ni 'dia_turno' → "Debe proporcionar el día del turno si no proporciona la fecha."
     - Turno inexistente → "El turno <día> <hora> no existe."
     - Clase inexistente en ese turno/fecha → "No existe clase programada para <fecha> en el turno <día> <hora>."
-    - Clase llena (≥4 inscriptos) → "La clase del <fecha> a las <hora> ya está llena."
+    - Clase llena (inscriptos ≥ cupo) → "La clase del <fecha> a las <hora> ya está llena."
     - Excepción no controlada → 400 {"error": "<mensaje>"}
 
     Comportamiento interno:
@@ -1444,7 +1252,8 @@ def registrar_alumno_ocasional_datos(data):
     - Si el formato de `fecha` es incorrecto, agrega error.
     - Si no se envía `fecha`, requiere `dia_turno` y calcula la próxima fecha válida usando `obtener_fecha_proximo_dia`.
     - Verifica que exista un `Turno` para el `dia_turno` y `hora_turno`.
-    - Verifica que exista una `Clase` para ese turno y fecha, y que no esté completa (`total_inscriptos < 4`).
+    - Verifica que exista una `Clase` para ese turno y fecha, y que no esté completa (`reservar_lugares`,
+      con la clase bloqueada hasta el commit: debe llamarse dentro de una transacción).
     - Si hay errores acumulados, lanza `ValueError` con el resumen de los mensajes concatenados.
 
     Acciones ejecutadas:
@@ -1512,8 +1321,10 @@ def registrar_alumno_ocasional_datos(data):
         # 📌 Validar clase específica en esa fecha
         try:
             clase = Clase.objects.get(id_turno=turno, fecha=fecha_clase)
-            if clase.obtener_total_inscriptos >= 4:
-                errores.append(f"La clase del {fecha_clase} a las {data['hora_turno']} ya está llena.")
+            # Queda bloqueada hasta el commit: nadie toma el lugar entre la validación y el alta
+            reservar_lugares([clase])
+        except SinCupo as e:
+            errores.extend(e.mensajes)
         except Clase.DoesNotExist:
             errores.append(f"No existe clase programada para {fecha_clase} en el turno {dia_turno} {data['hora_turno']}.")
 
@@ -1580,7 +1391,7 @@ def registrar_alumno(request):  #registrar un alumno con un paquete y turnos
     - Turno con estado "Ocupado" → "El turno <día> <hora> ya tiene su cupo general completo."
     - Paquete inexistente → "Paquete con <n> clases no existe."
     - Clase no programada → "No existe clase programada para <fecha> en el turno <día> <hora>."
-    - Clase llena (≥4 inscriptos) → "La clase del <fecha> a las <hora> ya está llena."
+    - Clase llena (inscriptos ≥ cupo) → "La clase del <fecha> a las <hora> ya está llena."
     - Excepciones de validación → 400 {"error": "Errores encontrados: ..."}
     - Excepciones no controladas → 400 {"error": "<mensaje de excepción>"}
 
@@ -1618,42 +1429,27 @@ def registrar_alumno(request):  #registrar un alumno con un paquete y turnos
 def registrar_alumno_datos(data):
     """
     Procesa los datos recibidos en /registrar_alumno/ y realiza las validaciones y registros en base de datos.
+
+    Turnos, clases destino y cupos se resuelven en lote (ver inscripciones.py):
+    un paquete de 12 clases se registra con una cantidad fija de consultas.
     """
+    from .feriados import series_turnos
+    from .inscripciones import clases_con_inscriptos, crear_clases_faltantes, reservar_clases, resolver_turnos
+
     logging.info(f"[registrar_alumno_datos] Iniciando con data: {data}")
-    
-    errores = []
-    turnos_asignados = []
-    clases_a_reservar = []  # Nuevo: para preparar las clases validadas
 
-    # ✅ Validar turnos
+    # ✅ Validar turnos (una sola consulta)
     logging.info(f"[registrar_alumno_datos] Validando turnos: {data.get('turnos')}")
-    for turno_str in data["turnos"]:
-        try:
-            if str(turno_str).isdigit():
-                # Viene desde el panel web (id_turno)
-                turno = Turno.objects.get(id_turno=int(turno_str))
-            else:
-                # Viene desde el bot (string como "Jueves 19:30" o "Jueves 19:30 Mat")
-                parts = turno_str.split()
-                dia = parts[0]
-                horario = parts[1]
-                disciplina = parts[2] if len(parts) > 2 else 'Reformer'
-                if disciplina.upper() == 'MAT':
-                    disciplina = 'MAT'
-                else:
-                    disciplina = disciplina.capitalize()
-                turno = Turno.objects.get(dia=dia, horario=horario, disciplina=disciplina)
-                
-            logging.debug(f"[registrar_alumno_datos] Turno encontrado: {turno}, estado={turno.estado}")
-            if turno.estado == "Ocupado":
-                logging.warning(f"[registrar_alumno_datos] Turno {turno_str} ocupado")
-                errores.append(f"El turno {turno.dia} {turno.horario} ya tiene su cupo general completo.")
-            else:
-                turnos_asignados.append(turno)
-                logging.info(f"[registrar_alumno_datos] Turno {turno_str} asignado correctamente")
-        except Turno.DoesNotExist:
-            logging.error(f"[registrar_alumno_datos] Turno {turno_str} no existe")
-            errores.append(f"El turno {turno_str} no existe.")
+    turnos, errores = resolver_turnos(data["turnos"])
+    turnos_asignados = []
+    for turno in turnos:
+        logging.debug(f"[registrar_alumno_datos] Turno encontrado: {turno}, estado={turno.estado}")
+        if turno.estado == "Ocupado":
+            logging.warning(f"[registrar_alumno_datos] Turno {turno} ocupado")
+            errores.append(f"El turno {turno.dia} {turno.horario} ya tiene su cupo general completo.")
+        else:
+            turnos_asignados.append(turno)
+            logging.info(f"[registrar_alumno_datos] Turno {turno} asignado correctamente")
 
     # ✅ Validar paquete
     logging.info(f"[registrar_alumno_datos] Validando paquete: {data.get('paquete')} clases")
@@ -1668,54 +1464,32 @@ def registrar_alumno_datos(data):
         errores.append("Debes seleccionar al menos un turno para registrar el paquete.")
 
     # ✅ Validar clases específicas
+    fecha_inicio = data.get("fecha_inicio")
+    pares = []  # (turno, fecha) en orden
+    clases = {}
     if not errores:
         cantidad_clases = paquete.cantidad_clases
         cantidad_turnos = len(turnos_asignados)
         clases_por_turno = cantidad_clases // cantidad_turnos
         logging.info(f"[registrar_alumno_datos] Distribución: {cantidad_clases} clases / {cantidad_turnos} turnos = {clases_por_turno} clases por turno")
 
-        for turno in turnos_asignados:
-            logging.info(f"[registrar_alumno_datos] Procesando turno: {turno.dia} {turno.horario}")
-            
-            fecha_inicio = data.get("fecha_inicio")
-            logging.debug(f"[registrar_alumno_datos] fecha_inicio recibida en data: {fecha_inicio}")
-            
-            if not fecha_inicio:
-                logging.info(f"[registrar_alumno_datos] No hay fecha_inicio, calculando próxima fecha para día: {turno.dia}")
-                fecha_calculada = obtener_fecha_proximo_dia(turno.dia)
-                logging.info(f"[registrar_alumno_datos] Fecha calculada (date): {fecha_calculada}")
-                fecha_inicio = str(fecha_calculada)
-                logging.info(f"[registrar_alumno_datos] Fecha convertida a string: {fecha_inicio}")
-            
-            logging.info(f"[registrar_alumno_datos] Obteniendo fechas para turno_id={turno.id_turno}, fecha_inicio={fecha_inicio}, clases={clases_por_turno}")
-            fechas_clases = obtener_fechas_turno_normal(turno.id_turno, fecha_inicio, clases_por_turno)["fechas"]
-            logging.info(f"[registrar_alumno_datos] Fechas obtenidas: {fechas_clases}")
-
-            for fecha in fechas_clases:
-                fecha_clase = datetime.strptime(fecha, "%Y-%m-%d").date()
-                logging.debug(f"[registrar_alumno_datos] Validando clase para fecha: {fecha_clase}")
-                try:
-                    clase = Clase.objects.get(
-                        id_turno=turno,
-                        fecha=fecha_clase
-                    )
-                    logging.debug(f"[registrar_alumno_datos] Clase encontrada: id={clase.id_clase}, inscriptos={clase.total_inscriptos}")
-                    if clase.obtener_total_inscriptos >= 4:
-                        logging.warning(f"[registrar_alumno_datos] Clase llena: {fecha_clase} {turno.horario}")
-                        errores.append(f"La clase del {fecha_clase} a las {turno.horario} ya está llena.")
-                    else:
-                        clases_a_reservar.append((turno, clase))
-                        logging.info(f"[registrar_alumno_datos] Clase reservada: {fecha_clase} {turno.horario}")
-                except Clase.DoesNotExist:
-                    logging.warning(f"[registrar_alumno_datos] No existe clase para {fecha_clase} en turno {turno.dia} {turno.horario}. Creando clase on-the-fly...")
-                    # Crear clase on the fly
-                    clase = Clase.objects.create(
-                        id_instructor=Instructor.objects.first(), # Obtener la primera instructora por defecto
-                        id_turno=turno,
-                        fecha=fecha_clase
-                    )
-                    clases_a_reservar.append((turno, clase))
-                    logging.info(f"[registrar_alumno_datos] Clase auto-creada y reservada: {fecha_clase} {turno.horario}")
+        # Desde la fecha de inicio o, si no viene, desde mañana (próxima fecha de cada turno)
+        if fecha_inicio:
+            desde = datetime.strptime(fecha_inicio, "%Y-%m-%d").date()
+        else:
+            desde = timezone.localdate() + timedelta(days=1)
+        pares = series_turnos((turno, desde, clases_por_turno) for turno in turnos_asignados)
+        logging.info(f"[registrar_alumno_datos] Fechas: {[(t.id_turno, f) for t, f in pares]}")
+        if not fecha_inicio and pares:
+            fecha_inicio = min(fecha for _, fecha in pares)
+
+        # Clases existentes con sus inscriptos (una sola consulta)
+        clases = clases_con_inscriptos(pares)
+        for turno, fecha in pares:
+            clase = clases.get((turno.id_turno, fecha))
+            if clase is not None and clase.inscriptos >= clase.cupo:
+                logging.warning(f"[registrar_alumno_datos] Clase llena: {fecha} {turno.horario}")
+                errores.append(f"La clase del {fecha} a las {turno.horario} ya está llena.")
 
     # 📌 Si hay errores, devolverlos todos juntos
     if errores:
@@ -1723,41 +1497,43 @@ def registrar_alumno_datos(data):
         raise ValueError("Errores encontrados: " + "; ".join(errores))
 
     # 📌 Crear objetos (solo si todo está validado)
-    logging.info(f"[registrar_alumno_datos] Creando persona: {data['nombre']} {data['apellido']}")
-    persona = Persona.objects.create(
-        nombre=data["nombre"],
-        apellido=data["apellido"],
-        telefono=data.get("telefono"),
-        ruc=data.get("ruc"),
-        observaciones=data.get("observaciones")
-    )
-    logging.info(f"[registrar_alumno_datos] Persona creada: id={persona.id_persona}")
-
-    alumno = Alumno.objects.create(
-        id_persona=persona,
-        canal_captacion=data.get("canal_captacion"),
-        estado="regular"
-    )
-    logging.info(f"[registrar_alumno_datos] Alumno creado: id={alumno.id_alumno}")
-
-    logging.info(f"[registrar_alumno_datos] Creando AlumnoPaquete con fecha_inicio={fecha_inicio}")
-    alumno_paquete = AlumnoPaquete.objects.create(
-        id_alumno=alumno,
-        id_paquete=paquete,
-        estado='activo',
-        fecha_inicio=fecha_inicio
-    )
-    logging.info(f"[registrar_alumno_datos] AlumnoPaquete creado: id={alumno_paquete.id_alumno_paquete}")
+    with transaction.atomic():
+        creadas = crear_clases_faltantes(pares, clases)
+        if creadas:
+            logging.info(f"[registrar_alumno_datos] {creadas} clases auto-creadas")
+
+        logging.info(f"[registrar_alumno_datos] Creando persona: {data['nombre']} {data['apellido']}")
+        persona = Persona.objects.create(
+            nombre=data["nombre"],
+            apellido=data["apellido"],
+            telefono=data.get("telefono"),
+            ruc=data.get("ruc"),
+            observaciones=data.get("observaciones")
+        )
+        logging.info(f"[registrar_alumno_datos] Persona creada: id={persona.id_persona}")
 
-    for turno, clase in clases_a_reservar:
-        logging.debug(f"[registrar_alumno_datos] Creando AlumnoPaqueteTurno para turno {turno.dia} {turno.horario}")
-        AlumnoPaqueteTurno.objects.get_or_create(id_alumno_paquete=alumno_paquete, id_turno=turno)
-        
-        logging.debug(f"[registrar_alumno_datos] Creando AlumnoClase para clase fecha={clase.fecha}")
-        AlumnoClase.objects.create(id_alumno_paquete=alumno_paquete, id_clase=clase, estado="pendiente")
+        alumno = Alumno.objects.create(
+            id_persona=persona,
+            canal_captacion=data.get("canal_captacion"),
+            estado="regular"
+        )
+        logging.info(f"[registrar_alumno_datos] Alumno creado: id={alumno.id_alumno}")
 
-        # The signals will handle updating total_inscriptos
+        logging.info(f"[registrar_alumno_datos] Creando AlumnoPaquete con fecha_inicio={fecha_inicio}")
+        alumno_paquete = AlumnoPaquete.objects.create(
+            id_alumno=alumno,
+            id_paquete=paquete,
+            estado='activo',
+            fecha_inicio=fecha_inicio
+        )
+        logging.info(f"[registrar_alumno_datos] AlumnoPaquete creado: id={alumno_paquete.id_alumno_paquete}")
 
+        resultado = reservar_clases(
+            alumno_paquete,
+            list(dict.fromkeys(turno for turno, _ in pares)),  # turnos con al menos una clase
+            [clases[(turno.id_turno, fecha)] for turno, fecha in pares],
+        )
+        logging.info(f"[registrar_alumno_datos] Reservas creadas: {resultado}")
 
     logging.info(f"[registrar_alumno_datos] Proceso completado exitosamente")
     return {"message": "Alumno registrado exitosamente"}
@@ -1850,6 +1626,7 @@ def obtener_alumnos_turno(request):
     Entradas (JSON):
     - dia (str)       [obligatorio] Ejemplo: "Martes"
     - horario (str)   [obligatorio] Ejemplo: "18:00"
+    - incluir_cancelados (bool) [opcional, default false] → incluye a los que cancelaron, reprogramaron o tienen feriado.
 
     Lógica:
     1. Busca el turno definido por día y horario (`Turno`).
@@ -1881,6 +1658,7 @@ def obtener_alumnos_turno(request):
             dia = data.get("dia")  # Ejemplo: "Martes"
             horario = data.get("horario")  # Ejemplo: "18:00"
             disciplina = data.get("disciplina", "Reformer")
+            incluir_cancelados = bool(data.get("incluir_cancelados", False))
 
             if not dia or not horario:
                 return JsonResponse({"error": "Debes enviar 'dia' y 'horario'"}, status=400)
@@ -1915,31 +1693,10 @@ def obtener_alumnos_turno(request):
             except Clase.DoesNotExist:
                 return JsonResponse({"message": f"No hay clase hoy para el turno {dia} {horario}."})
 
-            alumnos = []
-
-            # Alumnos regulares
-            alumnos_regulares = AlumnoClase.objects.filter(id_clase=clase)
-            for ac in alumnos_regulares:
-                persona = ac.id_alumno_paquete.id_alumno.id_persona
-                alumnos.append({
-                    "nombre": persona.nombre,
-                    "apellido": persona.apellido,
-                    "telefono": persona.telefono,
-                    "tipo": "regular"
-                })
-
-            # Alumnos ocasionales
-            alumnos_ocasionales = AlumnoClaseOcasional.objects.filter(id_clase=clase)
-            for ao in alumnos_ocasionales:
-                persona = ao.id_alumno.id_persona
-                alumnos.append({
-                    "nombre": persona.nombre,
-                    "apellido": persona.apellido,
-                    "telefono": persona.telefono,
-                    "tipo": "ocasional"
-                })
+            # Regulares y ocasionales con su Persona en dos consultas (asistencias.py)
+            alumnos = alumnos_de_clases([clase.id_clase], incluir_cancelados)[clase.id_clase]
 
-            return JsonResponse({
+            return RespuestaJson({
                 "dia": dia,
                 "horario": horario,
                 "fecha": str(fecha_objetivo),
@@ -1969,6 +1726,7 @@ def obtener_alumnos_clase(request):
     - dia (str)       [obligatorio] Ejemplo: "Martes"
     - horario (str)   [obligatorio] Ejemplo: "18:00"
     - fecha (str, YYYY-MM-DD) [opcional] → Si no se envía, se usa la próxima fecha para ese turno.
+    - incluir_cancelados (bool) [opcional, default false] → incluye a los que cancelaron, reprogramaron o tienen feriado.
 
     Lógica:
     1. Busca el `Turno` correspondiente.
@@ -2001,6 +1759,7 @@ def obtener_alumnos_clase(request):
             horario = data.get("horario")
             fecha = data.get("fecha")  # Opcional
             disciplina = data.get("disciplina", "Reformer")
+            incluir_cancelados = bool(data.get("incluir_cancelados", False))
 
             if not dia or not horario:
                 return JsonResponse({"error": "Debes enviar 'dia' y 'horario'"}, status=400)
@@ -2037,31 +1796,10 @@ def obtener_alumnos_clase(request):
             except Clase.DoesNotExist:
                 return JsonResponse({"message": f"No hay clase programada para {dia} {horario} el {fecha_objetivo}."})
 
-            alumnos = []
-
-            # Alumnos regulares
-            alumnos_regulares = AlumnoClase.objects.filter(id_clase=clase)
-            for ac in alumnos_regulares:
-                persona = ac.id_alumno_paquete.id_alumno.id_persona
-                alumnos.append({
-                    "nombre": persona.nombre,
-                    "apellido": persona.apellido,
-                    "telefono": persona.telefono,
-                    "tipo": "regular"
-                })
-
-            # Alumnos ocasionales
-            alumnos_ocasionales = AlumnoClaseOcasional.objects.filter(id_clase=clase)
-            for ao in alumnos_ocasionales:
-                persona = ao.id_alumno.id_persona
-                alumnos.append({
-                    "nombre": persona.nombre,
-                    "apellido": persona.apellido,
-                    "telefono": persona.telefono,
-                    "tipo": "ocasional"
-                })
+            # Regulares y ocasionales con su Persona en dos consultas (asistencias.py)
+            alumnos = alumnos_de_clases([clase.id_clase], incluir_cancelados)[clase.id_clase]
 
-            return JsonResponse({
+            return RespuestaJson({
                 "dia": dia,
                 "horario": horario,
                 "fecha": str(fecha_objetivo),
@@ -2089,6 +1827,7 @@ def obtener_alumnos_dia(request):
 
     Entradas (JSON):
     - dia (str) [obligatorio] Ejemplo: "Martes"
+    - incluir_cancelados (bool) [opcional, default false] → incluye a los que cancelaron, reprogramaron o tienen feriado.
 
     Lógica:
     1. Calcula la fecha del próximo día solicitado (ej. próximo martes).
@@ -2114,6 +1853,7 @@ def obtener_alumnos_dia(request):
         try:
             data = json.loads(request.body)
             dia = data.get("dia")  # Ejemplo: "Martes"
+            incluir_cancelados = bool(data.get("incluir_cancelados", False))
 
             if not dia:
                 return JsonResponse({"error": "Debes enviar 'dia'"}, status=400)
@@ -2139,44 +1879,33 @@ def obtener_alumnos_dia(request):
             else:
                 fecha_objetivo = hoy
 
-            # Buscar clases en la fecha correcta
-            clases = Clase.objects.filter(
-                fecha=fecha_objetivo,
-                id_turno__dia=dia
+            # Buscar clases en la fecha correcta (con el horario del turno en la misma consulta)
+            clases = list(
+                Clase.objects.filter(
+                    fecha=fecha_objetivo,
+                    id_turno__dia=dia
+                ).order_by('id_turno__horario', 'pk').values_list('id_clase', 'id_turno__horario')
             )
 
-
-            if not clases.exists():
+            if not clases:
                 return JsonResponse({"message": f"No hay clases programadas para hoy {dia}."})
 
-            alumnos = []
+            # Alumnos de todas las clases en dos consultas (asistencias.py)
+            por_clase = alumnos_de_clases([id_clase for id_clase, _ in clases], incluir_cancelados)
 
-            for clase in clases:
-                # Alumnos regulares
-                alumnos_regulares = AlumnoClase.objects.filter(id_clase=clase)
-                for ac in alumnos_regulares:
-                    persona = ac.id_alumno_paquete.id_alumno.id_persona
-                    alumnos.append({
-                        "nombre": persona.nombre,
-                        "apellido": persona.apellido,
-                        "telefono": persona.telefono,
-                        "turno": clase.id_turno.horario.strftime("%H:%M"),
-                        "tipo": "regular"
-                    })
-
-                # Alumnos ocasionales
-                alumnos_ocasionales = AlumnoClaseOcasional.objects.filter(id_clase=clase)
-                for ao in alumnos_ocasionales:
-                    persona = ao.id_alumno.id_persona
+            alumnos = []
+            for id_clase, horario_turno in clases:
+                turno = hora_texto(horario_turno)
+                for alumno in por_clase[id_clase]:
                     alumnos.append({
-                        "nombre": persona.nombre,
-                        "apellido": persona.apellido,
-                        "telefono": persona.telefono,
-                        "turno": clase.id_turno.horario.strftime("%H:%M"),
-                        "tipo": "ocasional"
+                        "nombre": alumno["nombre"],
+                        "apellido": alumno["apellido"],
+                        "telefono": alumno["telefono"],
+                        "turno": turno,
+                        "tipo": alumno["tipo"]
                     })
 
-            return JsonResponse({
+            return RespuestaJson({
                 "dia": dia,
                 "fecha": str(fecha_objetivo),
                 "alumnos": alumnos
@@ -2208,9 +1937,9 @@ def verificar_turno(request):
     - horario (str)   [obligatorio] Ejemplo: "07:00"
 
     Lógica:
-    1. Busca el turno configurado con ese día y horario (`Turno`).
+    1. Consulta `disponibilidad_turnos` para ese día y horario (incluyendo turnos completos).
     2. Si no existe, devuelve un mensaje indicando que no hay clases en ese horario.
-    3. Si existe, calcula los lugares disponibles (4 - lugares_ocupados).
+    3. Si existe, toma los lugares disponibles calculados por el motor.
     4. Devuelve un mensaje indicando si hay cupos libres o no.
 
     Errores:
@@ -2234,12 +1963,13 @@ def verificar_turno(request):
             if not dia or not horario:
                 return JsonResponse({"error": "Debes enviar 'dia' y 'horario'"}, status=400)
 
-            try:
-                turno = Turno.objects.get(dia=dia, horario=horario, disciplina=disciplina)
-            except Turno.DoesNotExist:
+            turnos = disponibilidad_turnos(
+                dias=[dia], hora_exacta=horario, disciplina=disciplina, minimo_libres=0
+            )
+            if not turnos:
                 return JsonResponse({"message": "No hay un turno registrado para ese día y horario. No tenemos clases en ese horario."})
 
-            lugares_disponibles = 4 - turno.lugares_ocupados
+            lugares_disponibles = turnos[0]["lugares_disponibles"]
 
             if lugares_disponibles > 0:
                 return JsonResponse({"message": f"Hay {lugares_disponibles} lugares disponibles."})
@@ -2269,9 +1999,9 @@ def verificar_turno_a_partir_de(request):
     - dia (str)         [opcional] Ejemplo: "Martes"
 
     Lógica:
-    1. Si se envía 'dia', busca solo en ese día; si no, recorre todos los días Lunes–Sábado.
-    2. Para cada día, llama a `buscar_turnos_disponibles(dia_actual, operador_hora="gte", hora_referencia=hora_minima)`.
-    3. Devuelve los turnos que tienen lugares disponibles.
+    1. Si se envía 'dia', busca solo en ese día; si no, en todos los días Lunes–Sábado.
+    2. Llama una sola vez a `disponibilidad_turnos(dias, hora_desde=hora_minima)`.
+    3. Agrupa por día los turnos que tienen lugares disponibles.
 
     Errores:
     - Falta de parámetros → 400 {"error": "Debes enviar 'hora_minima'"}
@@ -2311,19 +2041,18 @@ def verificar_turno_a_partir_de(request):
             if dia:
                 dias_a_buscar = [dia]
             else:
-                dias_a_buscar = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"]
-
-            resultados = []
+                dias_a_buscar = DIAS_TURNOS
 
-            for dia_actual in dias_a_buscar:
-                turnos_disponibles = buscar_turnos_disponibles(dia_actual, operador_hora="gte", hora_referencia=hora_minima, disciplina=disciplina)
+            disponibles = disponibilidad_turnos(dias=dias_a_buscar, hora_desde=hora_minima, disciplina=disciplina)
 
-                if turnos_disponibles:
-                    resultados.append({
-                        "dia": dia_actual,
-                        "hora_minima": hora_minima,
-                        "turnos_disponibles": turnos_disponibles
-                    })
+            resultados = [
+                {
+                    "dia": dia_actual,
+                    "hora_minima": hora_minima,
+                    "turnos_disponibles": turnos_disponibles
+                }
+                for dia_actual, turnos_disponibles in agrupar_disponibilidad_por_dia(disponibles).items()
+            ]
 
             if not resultados:
                 return JsonResponse({"message": f"No hay turnos disponibles después de {hora_minima}."})
@@ -2352,7 +2081,7 @@ def verificar_turno_antes_de(request):
 
     Lógica:
     1. Busca todos los turnos del día indicado cuya hora sea anterior a la hora máxima.
-    2. Usa `buscar_turnos_disponibles(dia, operador_hora="lt", hora_referencia=hora_maxima)`.
+    2. Usa `disponibilidad_turnos(dias=[dia], hora_hasta=hora_maxima)`.
     3. Devuelve los turnos con cupos disponibles.
 
     Errores:
@@ -2381,7 +2110,9 @@ def verificar_turno_antes_de(request):
             if not dia or not hora_maxima:
                 return JsonResponse({"error": "Debes enviar 'dia' y 'hora_maxima'"}, status=400)
 
-            turnos_disponibles = buscar_turnos_disponibles(dia, operador_hora="lt", hora_referencia=hora_maxima, disciplina=disciplina)
+            turnos_disponibles = agrupar_disponibilidad_por_dia(
+                disponibilidad_turnos(dias=[dia], hora_hasta=hora_maxima, disciplina=disciplina)
+            ).get(dia, [])
 
             if not turnos_disponibles:
                 return JsonResponse({"message": f"No hay turnos disponibles para {dia} antes de {hora_maxima}."})
@@ -2416,7 +2147,7 @@ def verificar_turno_manana(request):
 
     Lógica:
     1. Valida que se reciba el campo 'dia'.
-    2. Llama a `buscar_turnos_disponibles(dia, operador_hora="lt", hora_referencia="12:00")`.
+    2. Llama a `disponibilidad_turnos(dias=[dia], hora_hasta="12:00")`.
     3. Si hay turnos con cupos libres, los devuelve con su horario y cantidad de lugares.
     4. Si no hay, devuelve un mensaje indicando que no hay turnos disponibles esa mañana.
 
@@ -2444,7 +2175,9 @@ def verificar_turno_manana(request):
             if not dia:
                 return JsonResponse({"error": "Debes enviar 'dia'"}, status=400)
 
-            turnos_disponibles = buscar_turnos_disponibles(dia, operador_hora="lt", hora_referencia="12:00", disciplina=disciplina)
+            turnos_disponibles = agrupar_disponibilidad_por_dia(
+                disponibilidad_turnos(dias=[dia], hora_hasta="12:00", disciplina=disciplina)
+            ).get(dia, [])
 
             if not turnos_disponibles:
                 return JsonResponse({"message": f"No hay turnos disponibles para la mañana del {dia}."})
@@ -2460,13 +2193,94 @@ def verificar_turno_manana(request):
     return JsonResponse({"error": "Método no permitido"}, status=405)
 
 
+DIAS_TURNOS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"]
+
+
+def disponibilidad_turnos(dias=None, hora_desde=None, hora_hasta=None, hora_exacta=None,
+                          disciplina="Reformer", minimo_libres=1):
+    """
+    Motor de disponibilidad: devuelve los lugares libres de todos los turnos
+    que cumplen los filtros en una sola consulta.
+
+    Los lugares libres se calculan en la base (Turno.capacidad -
+    Turno.lugares_ocupados, contador mantenido por Pilapp.contadores), por lo
+    que no se hace un COUNT por turno.
+
+    Parámetros:
+    - dias (iterable[str], opcional): días a consultar. None → Lunes a Sábado.
+    - hora_desde (str | time, opcional): horario >= hora_desde.
+    - hora_hasta (str | time, opcional): horario < hora_hasta.
+    - hora_exacta (str | time, opcional): horario == hora_exacta.
+    - disciplina (str, opcional): "Reformer" o "MAT". None → todas.
+    - minimo_libres (int): lugares libres mínimos para incluir el turno.
+      Con 0 se incluyen también los turnos completos.
+
+    Retorna:
+    list[dict] ordenada por día de la semana y horario:
+    [
+    {"id_turno": 3, "dia": "Lunes", "horario": "07:00", "disciplina": "Reformer", "lugares_disponibles": 2},
+    ...
+    ]
+    """
+
+    turnos = Turno.objects.all()
+    if dias:
+        turnos = turnos.filter(dia__in=list(dias))
+    if disciplina:
+        turnos = turnos.filter(disciplina=disciplina)
+    if hora_desde:
+        turnos = turnos.filter(horario__gte=hora_desde)
+    if hora_hasta:
+        turnos = turnos.filter(horario__lt=hora_hasta)
+    if hora_exacta:
+        turnos = turnos.filter(horario=hora_exacta)
+
+    orden_dia = models.Case(
+        *[models.When(dia=nombre, then=models.Value(indice)) for nombre, indice in DAY_INDEX.items()],
+        output_field=models.IntegerField()
+    )
+
+    filas = (
+        turnos
+        .annotate(libres=F('capacidad') - F('lugares_ocupados'), orden_dia=orden_dia)
+        .filter(libres__gte=minimo_libres)
+        .order_by('orden_dia', 'horario', 'disciplina')
+        .values('id_turno', 'dia', 'horario', 'disciplina', 'libres')
+    )
+
+    return [
+        {
+            "id_turno": fila["id_turno"],
+            "dia": fila["dia"],
+            "horario": fila["horario"].strftime("%H:%M"),
+            "disciplina": fila["disciplina"],
+            "lugares_disponibles": max(fila["libres"], 0),
+        }
+        for fila in filas
+    ]
+
+
+def agrupar_disponibilidad_por_dia(disponibles):
+    """
+    Agrupa la salida de `disponibilidad_turnos` por día, respetando el orden
+    de la semana. Retorna {dia: [turnos]} solo con los días que tienen turnos.
+    """
+    por_dia = {}
+    for turno in disponibles:
+        por_dia.setdefault(turno["dia"], []).append({
+            "id_turno": turno["id_turno"],
+            "horario": turno["horario"],
+            "lugares_disponibles": turno["lugares_disponibles"],
+            "disciplina": turno["disciplina"],
+        })
+    return por_dia
+
+
 def buscar_turnos_disponibles(dia, operador_hora=None, hora_referencia=None, disciplina="Reformer"):
     """
-    Busca los turnos con lugares disponibles según el día y un criterio horario opcional.
+    Busca los turnos con lugares disponibles de un día según un criterio horario opcional.
 
-    Esta función se utiliza por varios endpoints (`verificar_turno_a_partir_de`,
-    `verificar_turno_antes_de`, `verificar_turno_manana`) para obtener turnos libres
-    con distintos filtros de hora.
+    Se mantiene por compatibilidad; delega en `disponibilidad_turnos`.
 
     Parámetros:
     - dia (str): Día de la semana. Ejemplo: "Martes".
@@ -2476,40 +2290,23 @@ def buscar_turnos_disponibles(dia, operador_hora=None, hora_referencia=None, dis
     • 'exact' → igual a la hora de referencia.
     - hora_referencia (str, opcional): Hora de referencia en formato "HH:MM".
 
-    Lógica:
-    1. Construye el filtro dinámico (por ejemplo: `horario__lt="12:00"`).
-    2. Filtra los turnos (`Turno.objects.filter(...)`) del día indicado.
-    3. Calcula los lugares disponibles (4 - lugares_ocupados).
-    4. Retorna solo los turnos con cupos > 0.
-
     Retorna:
     list[dict] → Ejemplo:
     [
-    {"horario": "07:00", "lugares_disponibles": 2},
-    {"horario": "08:00", "lugares_disponibles": 1}
+    {"id_turno": 3, "horario": "07:00", "lugares_disponibles": 2, "disciplina": "Reformer"},
+    {"id_turno": 4, "horario": "08:00", "lugares_disponibles": 1, "disciplina": "Reformer"}
     ]
     """
 
-    filtros = {"dia": dia}
-    if disciplina:
-        filtros["disciplina"] = disciplina
-
+    filtros_hora = {}
     if operador_hora and hora_referencia:
-        filtros[f"horario__{operador_hora}"] = hora_referencia
-
-    turnos = Turno.objects.filter(**filtros).order_by('horario')
-
-    turnos_disponibles = []
-    for turno in turnos:
-        lugares_disponibles = 4 - turno.lugares_ocupados
-        if lugares_disponibles > 0:
-            turnos_disponibles.append({
-                "horario": turno.horario.strftime("%H:%M"),
-                "lugares_disponibles": lugares_disponibles,
-                "disciplina": turno.disciplina
-            })
+        clave = {"gte": "hora_desde", "lt": "hora_hasta", "exact": "hora_exacta"}.get(operador_hora)
+        if clave is None:
+            raise ValueError(f"Operador de hora no soportado: {operador_hora}")
+        filtros_hora[clave] = hora_referencia
 
-    return turnos_disponibles
+    disponibles = disponibilidad_turnos(dias=[dia], disciplina=disciplina, **filtros_hora)
+    return agrupar_disponibilidad_por_dia(disponibles).get(dia, [])
 
 
 
@@ -2534,8 +2331,9 @@ def verificar_clase_hoy(request):
     3. Si hoy es domingo → no hay clases.
     4. Busca el turno correspondiente al día actual y al horario.
     5. Busca la clase asociada a ese turno y la fecha actual.
-    6. Cuenta los alumnos regulares (`AlumnoClase`) y ocasionales (`AlumnoClaseOcasional`) de esa clase.
-    7. Calcula los lugares disponibles (4 - lugares_ocupados).
+    6. En la misma consulta cuenta los alumnos que ocupan lugar (regulares y
+       ocasionales) y resuelve el cupo (capacidad de la clase o del turno).
+    7. Calcula los lugares disponibles (cupo - inscriptos).
     8. Devuelve un mensaje indicando la disponibilidad.
 
     Errores:
@@ -2588,17 +2386,15 @@ def verificar_clase_hoy(request):
             except Turno.MultipleObjectsReturned:
                 return JsonResponse({"error": "Error: múltiples turnos encontrados para ese horario."}, status=500)
 
-            # Buscar la clase de hoy con ese turno
-            try:
-                clase = Clase.objects.get(id_turno=turno, fecha=fecha_hoy)
-            except Clase.DoesNotExist:
+            # Clase de hoy con ese turno, con inscriptos y cupo en una sola consulta
+            clase = con_cupo(con_inscriptos_reales(
+                Clase.objects.filter(id_turno=turno, fecha=fecha_hoy)
+            )).values_list('inscriptos', 'cupo').first()
+            if clase is None:
                 return JsonResponse({"message": "No hay clase programada hoy a ese horario."})
 
-            # Calcular lugares ocupados
-            lugares_ocupados = lugares_ocupados = (AlumnoClase.objects.filter(id_clase=clase).count() +
-                    AlumnoClaseOcasional.objects.filter(id_clase=clase).count())
-            
-            lugares_disponibles = 4 - lugares_ocupados
+            lugares_ocupados, cupo = clase
+            lugares_disponibles = cupo - lugares_ocupados
 
             if lugares_disponibles > 0:
                 return JsonResponse({"message": f"Hay {lugares_disponibles} lugares disponibles para hoy a las {horario}."})
@@ -2635,7 +2431,7 @@ def actualizar_ruc(request):
     1. Valida que existan los campos `telefono` y `ruc`.
     2. Busca todas las personas con ese número de teléfono.
     3. Si hay más de una coincidencia:
-    - Filtra por nombre y apellido exactos (sin mayúsculas/minúsculas ni espacios extra).
+    - Filtra por nombre y apellido exactos (sin mayúsculas/minúsculas, acentos ni espacios extra).
     4. Si no encuentra coincidencias o encuentra varias ambiguas, devuelve error.
     5. Si hay una coincidencia válida, actualiza el campo `ruc` de esa persona.
 
@@ -2666,38 +2462,18 @@ def actualizar_ruc(request):
             if errores:
                 return JsonResponse({"error": " ".join(errores)}, status=400)
 
-            # Buscar por teléfono
-            personas = Persona.objects.filter(telefono=telefono.strip())
-            personas_filtradas = []
-
-            if personas.count() == 0:
-                return JsonResponse({"error": "No se encontró ninguna persona con ese teléfono."}, status=404)
-
-            if personas.count() == 1:
-                persona = personas.first()
-            else:
-                # Hay más de una → usar nombre y apellido para desambiguar
-                for p in personas:
-                    if p.nombre.strip().lower() == nombre and p.apellido.strip().lower() == apellido:
-                        personas_filtradas.append(p)
-
-                if len(personas_filtradas) == 0:
-                    return JsonResponse({
-                        "error": "Hay varias personas con ese teléfono, pero ninguna coincide exactamente con el nombre y apellido."
-                    }, status=400)
-                if len(personas_filtradas) > 1:
-                    return JsonResponse({
-                        "error": "Se encontró más de una persona con ese teléfono, nombre y apellido."
-                    }, status=400)
-
-                persona = personas_filtradas[0]
+            # Buscar por teléfono (y nombre si hay duplicados)
+            identificacion = identificar(telefono, nombre, apellido)
+            error = _error_identificacion(identificacion)
+            if error:
+                return error
 
             # Actualizar RUC
-            persona.ruc = nuevo_ruc
-            persona.save()
+            candidato = identificacion.candidato
+            Persona.objects.filter(id_persona=candidato.id_persona).update(ruc=nuevo_ruc)
 
             return JsonResponse({
-                "message": f"RUC actualizado correctamente para {persona.nombre} {persona.apellido}."
+                "message": f"RUC actualizado correctamente para {candidato.nombre} {candidato.apellido}."
             })
 
         except Exception as e:
@@ -2745,35 +2521,17 @@ def obtener_fechas_turno_normal(id_turno, fecha_inicio, n):
     except Turno.DoesNotExist:
         return {"error": "Turno no encontrado"}
 
-    dias_map = {
-        "Lunes": 0,
-        "Martes": 1,
-        "Miércoles": 2,
-        "Jueves": 3,
-        "Viernes": 4,
-        "Sábado": 5,
-    }
+    from .feriados import INDICE_DIAS, proximas_fechas
 
-    if turno.dia not in dias_map:
+    if turno.dia not in INDICE_DIAS:
         return {"error": "Día del turno inválido"}
 
-    dia_turno_idx = dias_map[turno.dia]
-    fecha_actual = datetime.strptime(fecha_inicio, "%Y-%m-%d").date()
-
-    while fecha_actual.weekday() != dia_turno_idx:
-        fecha_actual += timedelta(days=1)
-
-    fechas = []
-    
-    # Obtener lista de fechas de feriados
-    from .models import Feriado
-    feriados = set(Feriado.objects.values_list('fecha', flat=True))
-    
-    fechas_agregadas = 0
-    while fechas_agregadas < n:
-        if fecha_actual not in feriados:
-            fechas.append(fecha_actual.strftime("%Y-%m-%d"))
-            fechas_agregadas += 1
-        fecha_actual += timedelta(days=7)
+    # Feriados desde el cache (ver feriados.py)
+    fechas = [
+        fecha.isoformat()
+        for fecha in proximas_fechas(
+            INDICE_DIAS[turno.dia], datetime.strptime(fecha_inicio, "%Y-%m-%d").date(), n
+        )
+    ]
 
     return {"fechas": fechas}
@@ -1,17 +1,17 @@
 #imports de python
 import time 
 from decimal import Decimal, InvalidOperation
-from collections import defaultdict
 from datetime import date, timedelta, datetime
 
 
 #imports de django
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Count, Sum, DecimalField
+from django.db.models import Q, Count, Sum, DecimalField, Value
 from django.db.models.functions import Coalesce
 from django.template import loader
-from django.views.decorators.http import require_POST, require_GET, require_http_methods
+from django.views.decorators.http import require_POST, require_GET, require_http_methods, condition
+from django.views.decorators.cache import cache_control
 from django.db import transaction
 from django.contrib import messages
 from django.utils import timezone
@@ -20,6 +20,10 @@ from django.utils import timezone
 
 #imports del proyecto
 
+from .calendario import lunes_de_semana, semana_calendario
+from .cupos import con_cupo, cupo_clase
+from .estadisticas import estadisticas_dashboard
+from .historial import historial_clases, horarios_turnos, paquetes_con_uso
 from .models import (
     ExAlumno,
     Alumno, Persona, Clase, Turno, AlumnoClase, AlumnoClaseOcasional,
@@ -36,33 +40,12 @@ def panel_dashboard(request):
     """Vista principal del dashboard con estadísticas."""
     hoy = timezone.localdate()
     ahora = timezone.localtime()
-    inicio_semana = hoy - timedelta(days=hoy.weekday())
-    fin_semana = inicio_semana + timedelta(days=6)
-    
-    # Estadísticas básicas
-    stats = {
-        'alumnos_regulares': Alumno.objects.filter(estado='regular').count(),
-        'alumnos_ocasionales': Alumno.objects.filter(estado='ocasional').count(),
-        'clases_hoy': Clase.objects.filter(fecha=hoy).count(),
-        'pagos_pendientes': AlumnoPaquete.objects.filter(estado_pago='pendiente').count(),
-        'clases_semana': Clase.objects.filter(fecha__gte=inicio_semana, fecha__lte=fin_semana).count(),
-        'asistencias_semana': AlumnoClase.objects.filter(
-            id_clase__fecha__gte=inicio_semana,
-            id_clase__fecha__lte=fin_semana,
-            estado='asistió'
-        ).count(),
-        'inasistencias_semana': AlumnoClase.objects.filter(
-            id_clase__fecha__gte=inicio_semana,
-            id_clase__fecha__lte=fin_semana,
-            estado='faltó'
-        ).count(),
-        'prospectos_nuevos': ClienteProspecto.objects.filter(
-            fecha_contacto__gte=inicio_semana
-        ).count(),
-    }
-    
+
+    # Estadísticas básicas (agregadas y cacheadas, ver estadisticas.py)
+    stats = estadisticas_dashboard()
+
     # Clases de hoy
-    clases_hoy = Clase.objects.filter(fecha=hoy).select_related('id_turno').order_by('id_turno__horario')
+    clases_hoy = con_cupo(Clase.objects.filter(fecha=hoy)).select_related('id_turno').order_by('id_turno__horario')
     
     # Últimos alumnos registrados
     ultimos_alumnos = Alumno.objects.select_related('id_persona').order_by('-id_alumno')[:5]
@@ -115,176 +98,127 @@ def panel_calendario(request):
         "es_semana_actual": es_semana_actual,
     })
 
-def api_calendario(request):
-    semana_param = request.GET.get("semana")
-
-    if semana_param:
-        try:
-            fecha_ref = datetime.strptime(semana_param, "%Y-%m-%d").date()
-        except ValueError:
-            fecha_ref = timezone.localdate()
-    else:
-        fecha_ref = timezone.localdate()
-
-    # Si es domingo, usar el lunes de la PRÓXIMA semana
-    dia_semana = fecha_ref.weekday()
-    if dia_semana == 6:  # Domingo
-        inicio_semana = fecha_ref + timedelta(days=1)
-    else:
-        inicio_semana = fecha_ref - timedelta(days=dia_semana)
-    
-    fin_semana = inicio_semana + timedelta(days=5)  # Sábado
-
-    # Días (lunes a sábado = 6 días)
-    dias = [
-        (inicio_semana + timedelta(days=i)).isoformat()
-        for i in range(6)
-    ]
-
-    # Horarios
-    horarios = list(
-        Turno.objects.values_list("horario", flat=True)
-        .distinct()
-        .order_by("horario")
-    )
-
-    # Clases
-    clases_semana = (
-        Clase.objects.filter(
-            fecha__gte=inicio_semana,
-            fecha__lte=fin_semana,
-        )
-        .select_related("id_turno")
-    )
-
-    conteo = defaultdict(lambda: {"reg": 0, "ocas": 0})
-
-    reg = (
-        AlumnoClase.objects
-        .filter(id_clase__fecha__gte=inicio_semana, id_clase__fecha__lte=fin_semana)
-        .exclude(estado__in={"canceló", "reprogramó"})
-        .values("id_clase")
-        .annotate(c=Count("id_clase"))
-    )
-    for r in reg:
-        conteo[r["id_clase"]]["reg"] = r["c"]
-
-    ocas = (
-        AlumnoClaseOcasional.objects
-        .filter(id_clase__fecha__gte=inicio_semana, id_clase__fecha__lte=fin_semana)
-        .exclude(estado="canceló")
-        .values("id_clase")
-        .annotate(c=Count("id_clase"))
-    )
-    for o in ocas:
-        conteo[o["id_clase"]]["ocas"] = o["c"]
-
-    # Construir estructura
-    clases_dict = defaultdict(dict)
-
-    for clase in clases_semana:
-        h = clase.id_turno.horario.isoformat()
-        f = clase.fecha.isoformat()
-        total = conteo[clase.id_clase]["reg"] + conteo[clase.id_clase]["ocas"]
+def _semana_calendario(request):
+    """Entrada cacheada de la semana pedida (se memoiza en el request)."""
+    if not hasattr(request, '_semana_calendario'):
+        semana_param = request.GET.get("semana")
 
-        if total >= 4:
-            color = "lleno"
-        elif total >= 2:
-            color = "parcial"
+        if semana_param:
+            try:
+                fecha_ref = datetime.strptime(semana_param, "%Y-%m-%d").date()
+            except ValueError:
+                fecha_ref = timezone.localdate()
         else:
-            color = "disponible"
+            fecha_ref = timezone.localdate()
 
-        clases_dict[h][f] = {
-            "id": clase.id_clase,
-            "total": total,
-            "color": color,
-            "disciplina": clase.id_turno.disciplina,
-        }
+        # Si es domingo, se usa el lunes de la PRÓXIMA semana
+        request._semana_calendario = semana_calendario(lunes_de_semana(fecha_ref))
+    return request._semana_calendario
 
-    result = {
-        "dias": dias,
-        "horarios": horarios,
-        "clases": clases_dict,
-    }
 
-    return JsonResponse(result)
+@cache_control(no_cache=True)
+@condition(
+    etag_func=lambda request: _semana_calendario(request)["etag"],
+    last_modified_func=lambda request: _semana_calendario(request)["modificado"],
+)
+def api_calendario(request):
+    """
+    Grilla semanal del calendario. Se sirve desde el cache por semana
+    (ver calendario.py); si el cliente ya tiene la versión vigente responde 304.
+    """
+    return JsonResponse(_semana_calendario(request)["datos"])
 
 
 @require_GET
 def panel_vencimientos(request):
-    """Vista para ver vencimientos de paquetes activos y clases restantes."""
-    from .models import AlumnoPaquete, AlumnoClase
+    """
+    Vista para ver vencimientos de paquetes activos y clases restantes.
+
+    Clases usadas, clases restantes y días para vencer se calculan en la base
+    (Count con filtro y aritmética de fechas), y los filtros y el orden también
+    se resuelven en SQL: la vista hace una sola consulta.
+    """
+    from .models import AlumnoPaquete
     from datetime import timedelta
     from django.utils import timezone
+    from django.db.models import DateField, DurationField, ExpressionWrapper, F, Value
+    from django.db.models.functions import Greatest
     
-    vencimientos = []
     hoy = timezone.now().date()
     
     filtro_dias = request.GET.get('filtro_dias')
     filtro_restantes = request.GET.get('filtro_restantes')
     filtro_estado = request.GET.get('filtro_estado', 'activo')
     
-    paquetes_activos = AlumnoPaquete.objects.filter(estado='activo').select_related('id_alumno__id_persona', 'id_paquete')
+    paquetes_activos = AlumnoPaquete.objects.filter(estado='activo').select_related(
+        'id_alumno__id_persona', 'id_paquete'
+    ).annotate(
+        usadas=Count(
+            'alumnoclase',
+            filter=Q(alumnoclase__estado__in=['asistió', 'faltó', 'recuperó'])
+        ),
+    ).annotate(
+        restantes=Greatest(F('id_paquete__cantidad_clases') - F('usadas'), Value(0)),
+        # (fecha_inicio + 30) - hoy, expresado como fecha_inicio - (hoy - 30)
+        dias_vencer=ExpressionWrapper(
+            F('fecha_inicio') - Value(hoy - timedelta(days=30), output_field=DateField()),
+            output_field=DurationField()
+        ),
+    )
     
-    for paquete in paquetes_activos:
-        clases_usadas = AlumnoClase.objects.filter(
-            id_alumno_paquete=paquete,
-            estado__in=['asistió', 'faltó', 'recuperó']
-        ).count()
-        
-        paquete_total = paquete.id_paquete.cantidad_clases
-        clases_restantes = paquete_total - clases_usadas
-        if clases_restantes < 0:
-            clases_restantes = 0
-            
-        fecha_venc = None
-        dias_vencer = 9999
-        if paquete.fecha_inicio:
-            fecha_venc = paquete.fecha_inicio + timedelta(days=30)
-            dias_vencer = (fecha_venc - hoy).days
-            
-        # Filtro estado (vencidos reales vs al día)
-        if filtro_estado == 'vencido':
-            # Solo mostrar los que tienen 0 clases o días < 0
-            if clases_restantes > 0 and dias_vencer >= 0:
-                continue
-        elif filtro_estado == 'activo':
-            # Solo mostrar los que NO están vencidos
-            if clases_restantes == 0 or dias_vencer < 0:
-                continue
-                
-        # Filtros adicionales
-        if filtro_dias:
-            if dias_vencer > int(filtro_dias):
-                continue
-                
-        if filtro_restantes:
-            if filtro_restantes == '2':
-                if clases_restantes > 2:
-                    continue
-            else:
-                if clases_restantes != int(filtro_restantes):
-                    continue
-                    
-        vencimientos.append({
+    # Filtro estado (vencidos reales vs al día). Sin fecha_inicio no vence por días.
+    if filtro_estado == 'vencido':
+        paquetes_activos = paquetes_activos.filter(Q(restantes=0) | Q(dias_vencer__lt=timedelta(0)))
+    elif filtro_estado == 'activo':
+        paquetes_activos = paquetes_activos.filter(restantes__gt=0).filter(
+            Q(fecha_inicio__isnull=True) | Q(dias_vencer__gte=timedelta(0))
+        )
+    
+    # Filtros adicionales
+    if filtro_dias:
+        paquetes_activos = paquetes_activos.filter(dias_vencer__lte=timedelta(days=int(filtro_dias)))
+    
+    if filtro_restantes:
+        if filtro_restantes == '2':
+            paquetes_activos = paquetes_activos.filter(restantes__lte=2)
+        else:
+            paquetes_activos = paquetes_activos.filter(restantes=int(filtro_restantes))
+    
+    # Ordenar por clases restantes ascendente y dias_vencer ascendente (sin fecha al final)
+    paquetes_activos = paquetes_activos.order_by(
+        'restantes', F('dias_vencer').asc(nulls_last=True), 'id_alumno_paquete'
+    )
+    
+    vencimientos = [
+        {
             'alumno': paquete.id_alumno,
             'fecha_inicio': paquete.fecha_inicio,
-            'fecha_venc': fecha_venc,
-            'dias_vencer': dias_vencer,
-            'paquete_total': paquete_total,
-            'clases_restantes': clases_restantes
-        })
-        
-    # Ordenar por clases restantes ascendente y dias_vencer ascendente
-    vencimientos.sort(key=lambda x: (x['clases_restantes'], x['dias_vencer']))
+            'fecha_venc': hoy + paquete.dias_vencer if paquete.dias_vencer is not None else None,
+            'dias_vencer': paquete.dias_vencer.days if paquete.dias_vencer is not None else 9999,
+            'paquete_total': paquete.id_paquete.cantidad_clases,
+            'clases_restantes': paquete.restantes
+        }
+        for paquete in paquetes_activos
+    ]
     
     return render(request, "admin_panel/alumnos/vencimientos.html", {
         "vencimientos": vencimientos
     })
 
+ALUMNOS_POR_PAGINA = 50
+
+
 def panel_alumnos(request):
-    """Lista de alumnos con filtros."""
-    from .models import AlumnoPaqueteTurno
+    """
+    Lista de alumnos con filtros y paginación.
+
+    El paquete activo y los turnos se cargan con Prefetch solo para los alumnos
+    de la página, así la vista hace un número fijo de consultas (conteo, página,
+    paquetes activos y turnos) sin importar cuántos alumnos haya.
+    """
+    from django.core.paginator import Paginator
+    from django.db.models import F, Prefetch
+    from urllib.parse import urlencode
     
     alumnos = Alumno.objects.select_related('id_persona').all()
     
@@ -306,40 +240,51 @@ def panel_alumnos(request):
     if filtros['estado']:
         alumnos = alumnos.filter(estado=filtros['estado'])
     
-    # Ordenamiento
+    # Ordenamiento (id_alumno como desempate para que la paginación sea estable)
     if filtros['orden'] == 'nombre':
-        alumnos = alumnos.order_by('id_persona__nombre', 'id_persona__apellido')
+        alumnos = alumnos.order_by('id_persona__nombre', 'id_persona__apellido', 'id_alumno')
     elif filtros['orden'] == '-id_alumno':
         alumnos = alumnos.order_by('-id_alumno')
     elif filtros['orden'] == 'ultima_clase':
-        alumnos = alumnos.order_by('-ultima_clase')
-    
-    # Obtener turnos por alumno (solo paquetes activos)
-    turnos_por_alumno = {}
-    asignaciones = AlumnoPaqueteTurno.objects.filter(
-        id_alumno_paquete__estado='activo'
-    ).select_related('id_turno', 'id_alumno_paquete__id_alumno')
+        alumnos = alumnos.order_by(F('ultima_clase').desc(nulls_last=True), 'id_alumno')
+    else:
+        alumnos = alumnos.order_by('id_alumno')
+    
+    # Paquetes activos (con sus turnos) solo de los alumnos de la página
+    alumnos = alumnos.prefetch_related(
+        Prefetch(
+            'alumnopaquete_set',
+            queryset=AlumnoPaquete.objects.filter(estado='activo')
+                .select_related('id_paquete')
+                .prefetch_related(Prefetch(
+                    'alumnopaqueteturno_set',
+                    queryset=AlumnoPaqueteTurno.objects.select_related('id_turno').order_by('id_alumno_paquete_turno')
+                ))
+                .order_by('id_alumno_paquete'),
+            to_attr='paquetes_activos'
+        )
+    )
     
-    for asig in asignaciones:
-        alumno_id = asig.id_alumno_paquete.id_alumno.id_alumno
-        turno = asig.id_turno
-        if alumno_id not in turnos_por_alumno:
-            turnos_por_alumno[alumno_id] = []
-        turnos_por_alumno[alumno_id].append({
-            'dia': turno.dia,
-            'horario': turno.horario.strftime('%H:%M')
-        })
+    paginator = Paginator(alumnos, ALUMNOS_POR_PAGINA)
+    pagina = paginator.get_page(request.GET.get('page'))
     
     # Agregar paquete activo y turnos a cada alumno
-    for alumno in alumnos:
-        alumno.paquete_activo = AlumnoPaquete.objects.filter(
-            id_alumno=alumno, estado='activo'
-        ).select_related('id_paquete').first()
-        alumno.turnos = turnos_por_alumno.get(alumno.id_alumno, [])
+    for alumno in pagina:
+        alumno.paquete_activo = alumno.paquetes_activos[0] if alumno.paquetes_activos else None
+        alumno.turnos = [
+            {
+                'dia': asig.id_turno.dia,
+                'horario': asig.id_turno.horario.strftime('%H:%M')
+            }
+            for paquete in alumno.paquetes_activos
+            for asig in paquete.alumnopaqueteturno_set.all()
+        ]
     
     return render(request, 'admin_panel/alumnos/lista.html', {
-        'alumnos': alumnos,
+        'alumnos': pagina,
+        'page_obj': pagina,
         'filtros': filtros,
+        'filtros_query': urlencode({k: v for k, v in filtros.items() if v}),
     })
 
 def panel_alumno_crear(request):
@@ -613,6 +558,7 @@ def panel_alumno_clase_editar(request, id_alumno, tipo, id_relacion):
 def panel_alumno_clase_crear(request, id_alumno):
     """Vista para crear (agendar) manualmente una clase para un alumno."""
     from .models import Turno, Clase, AlumnoPaquete, AlumnoClase, Instructor, AlumnoClaseOcasional
+    from .cupos import SinCupo, reservar_lugares
     from django.db.models import F
     from django.utils import timezone
     from datetime import datetime
@@ -648,9 +594,11 @@ def panel_alumno_clase_crear(request, id_alumno):
                     }
                 )
                 
-                # Validar cupo usando el cálculo dinámico (ignora cancelados y feriados)
-                if clase_destino.obtener_total_inscriptos >= 4:
-                    messages.error(request, f"No hay cupo disponible para el {fecha_str} a las {horario}.")
+                # Validar cupo con la clase bloqueada hasta el commit (ignora cancelados y feriados)
+                try:
+                    reservar_lugares([clase_destino])
+                except SinCupo as e:
+                    messages.error(request, str(e))
                     return redirect("panel_alumno_detalle", id_alumno=id_alumno)
                     
                 # Buscar el paquete activo más reciente para asociarlo (o crearlo como ocasional si no hay)
@@ -825,39 +773,16 @@ def panel_alumno_detalle(request, id_alumno):
         id_alumno=id_alumno
     )
 
-    # Paquetes del alumno (ordenados por "más reciente" usando el PK)
-    paquetes = (
-        AlumnoPaquete.objects
-        .filter(id_alumno=alumno)
-        .select_related('id_paquete')
-        .order_by('-id_alumno_paquete')
-    )
+    # Paquetes del alumno (más reciente primero) con uso y saldo anotados
+    paquetes = paquetes_con_uso(alumno)
 
     # Definir último paquete (si existe)
-    ultimo_paquete = paquetes.first()
+    ultimo_paquete = paquetes[0] if paquetes else None
     ultimo_paquete_id = ultimo_paquete.id_alumno_paquete if ultimo_paquete else None
 
-    # Calcular pagado/restante solo para el último paquete
-    total_pagado_ultimo = None
-    restante_ultimo = None
-    if ultimo_paquete:
-        total_pagado_ultimo = (
-            PagoAlumno.objects
-            .filter(id_alumno_paquete=ultimo_paquete, id_pago__estado__in=['pagado', 'parcial'])
-            .aggregate(total=Sum('id_pago__monto'))
-            .get('total') or Decimal('0')
-        )
-        costo = ultimo_paquete.id_paquete.costo or Decimal('0')
-        restante_ultimo = max(Decimal('0'), costo - total_pagado_ultimo)
-
-    # Enriquecer cada paquete con clases usadas + porcentaje
-    for paquete in paquetes:
-        paquete.clases_usadas = AlumnoClase.objects.filter(
-            id_alumno_paquete=paquete,
-            estado__in=['asistió', 'faltó', 'recuperó']
-        ).count()
-        total = paquete.id_paquete.cantidad_clases
-        paquete.porcentaje_uso = (paquete.clases_usadas / total * 100) if total > 0 else 0
+    # Pagado/restante del último paquete (ya vienen anotados)
+    total_pagado_ultimo = ultimo_paquete.total_pagado if ultimo_paquete else None
+    restante_ultimo = ultimo_paquete.restante if ultimo_paquete else None
 
     # Turnos asignados (solo paquetes activos)
     turnos = AlumnoPaqueteTurno.objects.filter(
@@ -865,49 +790,17 @@ def panel_alumno_detalle(request, id_alumno):
         id_alumno_paquete__estado='activo'
     ).select_related('id_turno')
 
-    # Historial de clases (regulares + ocasionales)
-    historial_clases = []
-
-    clases_regulares = AlumnoClase.objects.filter(
-        id_alumno_paquete__id_alumno=alumno
-    ).select_related('id_clase', 'id_clase__id_turno').order_by('-id_clase__fecha')
-
-    for ac in clases_regulares:
-        historial_clases.append({
-            'id_relacion': ac.id_alumno_clase,
-            'id_clase': ac.id_clase.id_clase,
-            'fecha': ac.id_clase.fecha,
-            'horario': ac.id_clase.id_turno.horario.strftime('%H:%M'),
-            'disciplina': ac.id_clase.id_turno.disciplina,
-            'tipo': 'regular',
-            'estado': ac.estado,
-        })
-
-    clases_ocasionales = AlumnoClaseOcasional.objects.filter(
-        id_alumno=alumno
-    ).select_related('id_clase', 'id_clase__id_turno').order_by('-id_clase__fecha')
-
-    for ao in clases_ocasionales:
-        historial_clases.append({
-            'id_relacion': ao.id_alumno_clase_ocasional,
-            'id_clase': ao.id_clase.id_clase,
-            'fecha': ao.id_clase.fecha,
-            'horario': ao.id_clase.id_turno.horario.strftime('%H:%M'),
-            'disciplina': ao.id_clase.id_turno.disciplina,
-            'tipo': 'ocasional',
-            'estado': ao.estado,
-        })
-
-    historial_clases.sort(key=lambda x: x['fecha'], reverse=True)
+    # Historial de clases (regulares + ocasionales), paginado en la base
+    historial_pagina = historial_clases(alumno, request.GET.get('historial_pagina'))
 
     # Pagos (ya lo tenías bien)
     pagos = PagoAlumno.objects.filter(
         id_alumno_paquete__id_alumno=alumno
     ).select_related('id_pago', 'id_alumno_paquete__id_paquete').order_by('-id_pago__fecha')
 
-    # Horarios únicos disponibles para el dropdown de reprogramar
-    from .models import Turno, Paquete
-    horarios_disponibles = sorted(list(set(t.horario.strftime('%H:%M') for t in Turno.objects.all())))
+    # Horarios únicos disponibles para el dropdown de reprogramar (cacheados)
+    from .models import Paquete
+    horarios_disponibles = horarios_turnos()
     
     # Todos los paquetes disponibles para actualizar
     lista_paquetes = Paquete.objects.all().order_by('cantidad_clases')
@@ -916,7 +809,8 @@ def panel_alumno_detalle(request, id_alumno):
         'alumno': alumno,
         'paquetes': paquetes,
         'turnos': turnos,
-        'historial_clases': historial_clases,
+        'historial_clases': historial_pagina.object_list,
+        'historial_pagina': historial_pagina,
         'pagos': pagos,
         'horarios_disponibles': horarios_disponibles,
         'lista_paquetes': lista_paquetes,
@@ -944,10 +838,10 @@ def panel_clases(request):
     else:
         fecha_hasta = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
 
-    clases = Clase.objects.filter(
+    clases = con_cupo(Clase.objects.filter(
         fecha__gte=fecha_desde,
         fecha__lte=fecha_hasta
-    ).select_related('id_turno').annotate(
+    )).select_related('id_turno').annotate(
         total_regulares=Count('alumnoclase', filter=Q(alumnoclase__estado__in=['reservado', 'pendiente', 'recuperó', 'asistió', 'faltó'])),
         total_ocasionales=Count('alumnoclaseocasional', filter=Q(alumnoclaseocasional__estado__in=['reservado', 'asistió', 'faltó']))
     ).order_by('fecha', 'id_turno__horario')
@@ -963,6 +857,54 @@ def panel_clases(request):
     })
 
 
+def ids_primera_clase(alumnos_clase):
+    """
+    Indica cuáles de las inscripciones dadas son la primera clase de su alumno.
+
+    "Primera clase" es la primera AlumnoClase del alumno (en cualquiera de sus
+    paquetes) que no fue cancelada ni reprogramada, ordenando por fecha y horario.
+    Se resuelve en una sola consulta con una ventana ROW_NUMBER() particionada
+    por alumno.
+
+    Args:
+        alumnos_clase (iterable[AlumnoClase | int]): inscripciones o sus ids.
+
+    Returns:
+        set[int]: ids de AlumnoClase que son la primera clase de su alumno.
+    """
+    from django.db.models import F, Window
+    from django.db.models.functions import RowNumber
+
+    ids = {getattr(ac, 'id_alumno_clase', ac) for ac in alumnos_clase}
+    if not ids:
+        return set()
+
+    alumnos = AlumnoPaquete.objects.filter(alumnoclase__in=ids).values('id_alumno')
+
+    # La ventana devuelve una fila por alumno; el cruce con `ids` se hace en memoria
+    # porque un filtro por id dentro del WHERE alteraría la numeración.
+    primeras = set(
+        AlumnoClase.objects.filter(
+            id_alumno_paquete__id_alumno__in=alumnos
+        ).exclude(
+            estado__in=['canceló', 'reprogramó']
+        ).annotate(
+            orden=Window(
+                expression=RowNumber(),
+                partition_by=[F('id_alumno_paquete__id_alumno')],
+                order_by=[
+                    F('id_clase__fecha').asc(),
+                    F('id_clase__id_turno__horario').asc(),
+                    F('id_alumno_clase').asc(),
+                ]
+            )
+        ).filter(
+            orden=1
+        ).values_list('id_alumno_clase', flat=True)
+    )
+    return primeras & ids
+
+
 def panel_clase_detalle(request, id_clase):
     """Detalle de una clase específica con conteo forzado de inscriptos."""
     from django.db.models import Q, Count
@@ -980,11 +922,12 @@ def panel_clase_detalle(request, id_clase):
             total_ocas = Count(
                 'alumnoclaseocasional', 
                 filter=Q(alumnoclaseocasional__estado__in=['reservado', 'asistió', 'faltó'])
-            )
+            ),
+            cupo=cupo_clase()
         )
     )
     
-    # 2. Creamos la variable 'total' que el HTML necesita para mostrar "X/4"
+    # 2. Creamos la variable 'total' que el HTML necesita para mostrar "X/cupo"
     clase.total = clase.total_reg + clase.total_ocas
 
     # Alumnos regulares (para la lista de abajo)
@@ -995,18 +938,10 @@ def panel_clase_detalle(request, id_clase):
         'id_alumno_paquete__id_alumno__id_persona'
     ))
     
-    # Identificar alumnos nuevos (primer paquete y primera clase)
-    from .models import AlumnoPaquete
+    # Identificar alumnos nuevos (primera clase de su historia)
+    primeras = ids_primera_clase(alumnos_regulares)
     for ac in alumnos_regulares:
-        ac.es_nuevo = False
-        num_paquetes = AlumnoPaquete.objects.filter(id_alumno=ac.id_alumno_paquete.id_alumno).count()
-        if num_paquetes == 1:
-            primera_clase = AlumnoClase.objects.filter(
-                id_alumno_paquete=ac.id_alumno_paquete
-            ).exclude(estado__in=['canceló', 'reprogramó']).order_by('id_clase__fecha', 'id_clase__id_turno__horario').first()
-            
-            if primera_clase and primera_clase.id_clase == clase:
-                ac.es_nuevo = True
+        ac.es_nuevo = ac.id_alumno_clase in primeras
     
     # Alumnos ocasionales (para la lista de abajo)
     alumnos_ocasionales = AlumnoClaseOcasional.objects.filter(
@@ -1043,10 +978,10 @@ def panel_turnos(request):
     # Agregar conteo a cada turno
     for turno in turnos:
         turno.ocupados = conteo.get(turno.id_turno, 0)
-        # Colores: 0=rojo, 1-3=amarillo, 4=verde
+        # Colores: 0=rojo, con lugar=amarillo, completo=verde
         if turno.ocupados == 0:
             turno.estado_color = 'danger'  # rojo
-        elif turno.ocupados >= 4:
+        elif turno.ocupados >= turno.capacidad:
             turno.estado_color = 'success'  # verde
         else:
             turno.estado_color = 'warning'  # amarillo
@@ -1066,45 +1001,72 @@ def panel_turnos(request):
     })
 
 
+PAGOS_POR_PAGINA = 50
+
+
+def _cursor_pagos(valor):
+    """
+    Decodifica el cursor de panel_pagos: "AAAA-MM-DD_id" o "_id" (paquete sin fecha_inicio).
+    Retorna (fecha | None, id) o None si el cursor no es válido.
+    """
+    try:
+        fecha_str, id_str = (valor or '').split('_', 1)
+        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date() if fecha_str else None
+        return fecha, int(id_str)
+    except ValueError:
+        return None
+
+
 def panel_pagos(request):
-    """Lista de paquetes y su estado de pago."""
+    """
+    Lista de paquetes y su estado de pago.
+
+    El total pagado y el restante vienen anotados (AlumnoPaquete.objects.with_balances()).
+    La lista se pagina por cursor (keyset) sobre (fecha_inicio desc, id desc): cada
+    página filtra "después del último visto" en lugar de usar OFFSET, así el costo
+    no crece con el historial.
+    """
+    from django.db.models import F
+
     estado_pago = request.GET.get('estado', '')
     estado_paquete = request.GET.get('estado_paquete', '')
     
-    paquetes = AlumnoPaquete.objects.select_related(
+    paquetes = AlumnoPaquete.objects.with_balances().select_related(
         'id_alumno__id_persona', 'id_paquete'
-    ).order_by('-fecha_inicio')
+    ).order_by(F('fecha_inicio').desc(nulls_last=True), '-id_alumno_paquete')
     
     if estado_pago:
         paquetes = paquetes.filter(estado_pago=estado_pago)
     if estado_paquete:
         paquetes = paquetes.filter(estado=estado_paquete)
     
-    # Calcular restante y total_pagado para cada paquete
-    paquetes_con_info = []
-    for paquete in paquetes:
-        costo = paquete.id_paquete.costo or Decimal("0")
-        
-        # Calcular total pagado
-        total_pagado = (
-            PagoAlumno.objects
-            .filter(id_alumno_paquete=paquete, id_pago__estado__in=["pagado", "parcial"])
-            .aggregate(total=Sum("id_pago__monto"))
-            .get("total") or Decimal("0")
-        )
-        
-        # Calcular restante
-        restante = max(Decimal("0"), costo - total_pagado)
-        
-        # Agregar los campos calculados al objeto paquete
-        paquete.restante = restante
-        paquete.total_pagado = total_pagado
-        paquetes_con_info.append(paquete)
+    cursor = _cursor_pagos(request.GET.get('despues'))
+    if cursor:
+        fecha, id_paquete = cursor
+        if fecha is None:
+            paquetes = paquetes.filter(fecha_inicio__isnull=True, id_alumno_paquete__lt=id_paquete)
+        else:
+            paquetes = paquetes.filter(
+                Q(fecha_inicio__lt=fecha) |
+                Q(fecha_inicio=fecha, id_alumno_paquete__lt=id_paquete) |
+                Q(fecha_inicio__isnull=True)
+            )
+    
+    # Una fila extra para saber si hay página siguiente
+    paquetes = list(paquetes[:PAGOS_POR_PAGINA + 1])
+    siguiente = None
+    if len(paquetes) > PAGOS_POR_PAGINA:
+        paquetes = paquetes[:PAGOS_POR_PAGINA]
+        ultimo = paquetes[-1]
+        fecha_ultimo = ultimo.fecha_inicio.strftime('%Y-%m-%d') if ultimo.fecha_inicio else ''
+        siguiente = f"{fecha_ultimo}_{ultimo.id_alumno_paquete}"
     
     return render(request, 'admin_panel/pagos.html', {
-        'paquetes': paquetes_con_info,
+        'paquetes': paquetes,
         'estado_pago': estado_pago,
         'estado_paquete': estado_paquete,
+        'cursor_siguiente': siguiente,
+        'es_primera_pagina': cursor is None,
     })
 
 def panel_prospectos(request):
@@ -1125,45 +1087,37 @@ def panel_prospectos(request):
 # API endpoints para AJAX
 def api_clase_alumnos(request, id_clase):
     """API para obtener alumnos de una clase (usado en modal del calendario)."""
+    from .serializacion import RespuestaJson, filas_a_dicts
+
     clase = get_object_or_404(Clase, id_clase=id_clase)
 
-    alumnos = []
+    claves = ('id_alumno', 'nombre', 'apellido', 'tipo', 'estado')
 
     # Regulares
-    for ac in (
-        AlumnoClase.objects
-        .filter(id_clase=clase)
-        .select_related('id_alumno_paquete__id_alumno__id_persona')
-    ):
-        alumno = ac.id_alumno_paquete.id_alumno
-        persona = alumno.id_persona
-
-        alumnos.append({
-            'id_alumno': alumno.id_alumno,   # 👈 CLAVE
-            'nombre': persona.nombre,
-            'apellido': persona.apellido,
-            'tipo': 'regular',
-            'estado': ac.estado,
-        })
+    regulares = filas_a_dicts(
+        AlumnoClase.objects.filter(id_clase=clase).order_by('pk').values_list(
+            'id_alumno_paquete__id_alumno',
+            'id_alumno_paquete__id_alumno__id_persona__nombre',
+            'id_alumno_paquete__id_alumno__id_persona__apellido',
+            Value('regular'),
+            'estado',
+        ),
+        claves,
+    )
 
     # Ocasionales
-    for ao in (
-        AlumnoClaseOcasional.objects
-        .filter(id_clase=clase)
-        .select_related('id_alumno__id_persona')
-    ):
-        alumno = ao.id_alumno
-        persona = alumno.id_persona
-
-        alumnos.append({
-            'id_alumno': alumno.id_alumno,   # 👈 CLAVE
-            'nombre': persona.nombre,
-            'apellido': persona.apellido,
-            'tipo': 'ocasional',
-            'estado': ao.estado,
-        })
+    ocasionales = filas_a_dicts(
+        AlumnoClaseOcasional.objects.filter(id_clase=clase).order_by('pk').values_list(
+            'id_alumno',
+            'id_alumno__id_persona__nombre',
+            'id_alumno__id_persona__apellido',
+            Value('ocasional'),
+            'estado',
+        ),
+        claves,
+    )
 
-    return JsonResponse({'alumnos': alumnos})
+    return RespuestaJson({'alumnos': regulares + ocasionales})
 
 
 
@@ -1294,14 +1248,14 @@ def _generar_nro_pago(alumno_paquete: AlumnoPaquete) -> str:
 
 
 def _total_pagado_paquete(alumno_paquete: AlumnoPaquete) -> Decimal:
-    # Suma de pagos asociados al paquete.
-    # Tomamos pagos 'pagado' y 'parcial'. Si tuvieras 'pendiente' en pagos reales, podrías excluirlo.
-    qs = PagoAlumno.objects.filter(id_alumno_paquete=alumno_paquete).select_related("id_pago")
-    total = Decimal("0")
-    for pa in qs:
-        if pa.id_pago and pa.id_pago.estado in ("pagado", "parcial"):
-            total += (pa.id_pago.monto or Decimal("0"))
-    return total
+    # Suma de pagos 'pagado' y 'parcial' asociados al paquete (ver AlumnoPaquete.objects.with_balances).
+    total = (
+        AlumnoPaquete.objects.with_balances()
+        .filter(pk=alumno_paquete.pk)
+        .values_list('total_pagado', flat=True)
+        .first()
+    )
+    return total or Decimal("0")
 
 @require_POST
 @transaction.atomic
@@ -1323,26 +1277,8 @@ def panel_renovar_paquete_alumno(request, id_alumno, id_alumno_paquete):
             metodo_pago="efectivo"
         )
         
-        # 3. Ejecutamos la lógica (esto creará el paquete, los turnos y el pago)
-        nuevo_paquete = service.ejecutar()
-        
-        # 4. REFUERZO: Creamos las inscripciones a clases para que aparezca el 4/4
-        # Buscamos los turnos que el Service acaba de asignar
-        turnos_ids = nuevo_paquete.alumnopaqueteturno_set.values_list('id_turno_id', flat=True)
-        
-        clases_futuras = Clase.objects.filter(
-            id_turno_id__in=turnos_ids,
-            fecha__gte=timezone.now().date()
-        ).order_by('fecha')[:paquete_base.cantidad_clases]
-
-        for clase in clases_futuras:
-            AlumnoClase.objects.get_or_create(
-                id_alumno_paquete=nuevo_paquete,
-                id_clase=clase,
-                defaults={'estado': 'pendiente'}
-            )
-            # Forzamos refresco del contador en la clase
-            clase.save()
+        # 3. Ejecutamos la lógica (crea el paquete, los turnos, las reservas y el pago)
+        service.ejecutar()
 
         messages.success(request, f"Paquete de {paquete_base.cantidad_clases} clases renovado y cupos reservados.")
         
@@ -1360,7 +1296,7 @@ def panel_registrar_pago_alumno(request, id_alumno):
     
     if id_alumno_paquete:
         alumno_paquete = get_object_or_404(
-            AlumnoPaquete,
+            AlumnoPaquete.objects.with_balances().select_related('id_paquete'),
             id_alumno_paquete=id_alumno_paquete,
             id_alumno=alumno
         )
@@ -1392,17 +1328,10 @@ def panel_registrar_pago_alumno(request, id_alumno):
         return redirect("panel_alumno_detalle", id_alumno=alumno.id_alumno)
 
     if alumno_paquete:
-        # Costo del paquete y acumulado anterior
+        # Costo del paquete y acumulado anterior (anotados por with_balances)
         costo = alumno_paquete.id_paquete.costo or Decimal("0")
-
-        total_pagado_antes = (
-            PagoAlumno.objects
-            .filter(id_alumno_paquete=alumno_paquete, id_pago__estado__in=["pagado", "parcial"])
-            .aggregate(total=Sum("id_pago__monto"))
-            .get("total") or Decimal("0")
-        )
-
-        restante_antes = max(Decimal("0"), costo - total_pagado_antes)
+        total_pagado_antes = alumno_paquete.total_pagado
+        restante_antes = alumno_paquete.restante
 
         # Estado del pago creado (según lo que faltaba en ese momento)
         estado_pago_creado = "pagado" if monto >= restante_antes else "parcial"
@@ -1428,13 +1357,8 @@ def panel_registrar_pago_alumno(request, id_alumno):
     )
 
     if alumno_paquete:
-        # Volvemos a calcular el total pagado (incluyendo el actual)
-        total_nuevo = (
-            PagoAlumno.objects
-            .filter(id_alumno_paquete=alumno_paquete, id_pago__estado__in=["pagado", "parcial"])
-            .aggregate(total=Sum("id_pago__monto"))
-            .get("total") or Decimal("0")
-        )
+        # Total pagado incluyendo el actual (el pago recién creado siempre es 'pagado' o 'parcial')
+        total_nuevo = total_pagado_antes + monto
 
         # Actualizar estado de pago del paquete
         if total_nuevo >= costo:
@@ -1560,8 +1484,26 @@ def profes_clases_hoy(request, token):
     from .models import Turno
     turnos_hoy = Turno.objects.filter(dia__iexact=nombre_dia).order_by('horario')
     
-    # Buscar todas las clases de hoy (SIN FILTRAR DISCIPLINA)
-    clases_hoy = Clase.objects.filter(fecha=hoy).select_related('id_turno')
+    # Buscar todas las clases de hoy (SIN FILTRAR DISCIPLINA) con sus alumnos:
+    # regulares (excluimos canceló, reprogramó y feriado) y ocasionales (excluimos canceló)
+    # se traen en dos consultas para todo el día y se agrupan por clase.
+    from django.db.models import Prefetch
+    clases_hoy = Clase.objects.filter(fecha=hoy).select_related('id_turno').prefetch_related(
+        Prefetch(
+            'alumnoclase_set',
+            queryset=AlumnoClase.objects.exclude(
+                estado__in=['canceló', 'reprogramó', 'feriado']
+            ).select_related('id_alumno_paquete__id_alumno__id_persona').order_by('id_alumno_clase'),
+            to_attr='regulares'
+        ),
+        Prefetch(
+            'alumnoclaseocasional_set',
+            queryset=AlumnoClaseOcasional.objects.exclude(
+                estado='canceló'
+            ).select_related('id_alumno__id_persona').order_by('id_alumno_clase_ocasional'),
+            to_attr='ocasionales'
+        ),
+    )
     
     clases_data = []
     turnos_procesados = set()
@@ -1572,30 +1514,17 @@ def profes_clases_hoy(request, token):
             
         alumnos_lista = []
         
-        # Alumnos regulares (excluimos canceló y reprogramó)
-        alumnos_regulares = AlumnoClase.objects.filter(
-            id_clase=clase
-        ).exclude(
-            estado__in=['canceló', 'reprogramó', 'feriado']
-        ).select_related('id_alumno_paquete__id_alumno__id_persona')
-        
-        for ac in alumnos_regulares:
+        for ac in clase.regulares:
             persona = ac.id_alumno_paquete.id_alumno.id_persona
             alumnos_lista.append({
                 'id_relacion': ac.id_alumno_clase,
                 'nombre_completo': f"{persona.nombre} {persona.apellido}",
                 'estado': ac.estado,
-                'tipo': 'regular'
+                'tipo': 'regular',
+                'es_nuevo': False
             })
             
-        # Alumnos ocasionales (excluimos canceló)
-        alumnos_ocasionales = AlumnoClaseOcasional.objects.filter(
-            id_clase=clase
-        ).exclude(
-            estado='canceló'
-        ).select_related('id_alumno__id_persona')
-        
-        for ao in alumnos_ocasionales:
+        for ao in clase.ocasionales:
             persona = ao.id_alumno.id_persona
             alumnos_lista.append({
                 'id_relacion': ao.id_alumno_clase_ocasional,
@@ -1612,6 +1541,12 @@ def profes_clases_hoy(request, token):
             'orden': clase.id_turno.horario.strftime('%H:%M') if clase.id_turno else '23:59'
         })
         
+    # Marcar alumnas nuevas (primera clase) con una sola consulta para todo el día
+    regulares = [a for c in clases_data for a in c['alumnos'] if a['tipo'] == 'regular']
+    primeras = ids_primera_clase(a['id_relacion'] for a in regulares)
+    for alumno_info in regulares:
+        alumno_info['es_nuevo'] = alumno_info['id_relacion'] in primeras
+        
     # Agregar turnos sin clases
     for turno in turnos_hoy:
         if turno.id_turno not in turnos_procesados:
@@ -1631,25 +1566,20 @@ def profes_clases_hoy(request, token):
     # -----------------------------------------------------
     fechas_alertas = set()
     if not es_reemplazo:
-        # Últimos 7 días (excluyendo domingos y hoy)
+        # Últimos 7 días (excluyendo hoy y domingos) con algún AlumnoClase todavía
+        # en estado 'reservado', en una sola consulta agrupada por fecha.
         from datetime import timedelta
         
-        for i in range(1, 8):
-            fecha_check = hoy - timedelta(days=i)
-            # Solo verificamos si no es domingo (weekday() == 6)
-            if fecha_check.weekday() != 6: 
-                nombre_d = dias_semana[fecha_check.weekday()]
-                hay_clases_ese_dia = Turno.objects.filter(dia__iexact=nombre_d).exists()
-                
-                if hay_clases_ese_dia:
-                    # ¿Hay algún AlumnoClase en estado 'reservado' en esa fecha?
-                    hay_pendientes = AlumnoClase.objects.filter(
-                        id_clase__fecha=fecha_check,
-                        estado='reservado'
-                    ).exists()
-                    
-                    if hay_pendientes:
-                        fechas_alertas.add(fecha_check)
+        fechas_pendientes = (
+            AlumnoClase.objects.filter(
+                id_clase__fecha__range=(hoy - timedelta(days=7), hoy - timedelta(days=1)),
+                estado='reservado'
+            )
+            .values_list('id_clase__fecha', flat=True)
+            .order_by('id_clase__fecha')
+            .distinct()
+        )
+        fechas_alertas = {f for f in fechas_pendientes if f.weekday() != 6}
 
     from .models import HonorarioInstructor
     
@@ -1674,55 +1604,30 @@ def profes_marcar_asistencia(request, token):
     elif token not in ["acceso-profes", "acceso-profes-mat"]:
         return HttpResponse("Acceso denegado.", status=403)
         
+    fecha_str = ""
     if request.method == "POST":
+        from .asistencias import aplicar_asistencias
+
         fecha_str = request.POST.get("fecha", "")
-        tipo = request.POST.get("tipo")
-        id_relacion = request.POST.get("id_relacion")
-        nuevo_estado = request.POST.get("estado")
-        if nuevo_estado:
-            nuevo_estado = nuevo_estado.lower()
-        
+
+        # Formulario de la clase completa: asistencia-<tipo>-<id_relacion> = estado
+        cambios = []
+        for campo, estado in request.POST.items():
+            if campo.startswith("asistencia-") and estado:
+                _, tipo, id_relacion = campo.split("-", 2)
+                cambios.append((tipo, id_relacion, estado.lower()))
+
+        # Botón de un solo alumno
+        if not cambios and request.POST.get("id_relacion") and request.POST.get("estado"):
+            cambios.append((
+                request.POST.get("tipo"),
+                request.POST.get("id_relacion"),
+                request.POST.get("estado").lower(),
+            ))
+
         try:
-            if tipo == 'regular':
-                rel = AlumnoClase.objects.select_related('id_alumno_paquete__id_alumno').get(pk=id_relacion)
-                
-                # REASIGNACIÓN AUTOMÁTICA SI EL PAQUETE ESTÁ EXPIRADO
-                if rel.id_alumno_paquete.estado == 'expirado':
-                    paquete_activo = AlumnoPaquete.objects.filter(
-                        id_alumno=rel.id_alumno_paquete.id_alumno,
-                        estado='activo'
-                    ).first()
-                    
-                    if paquete_activo:
-                        # Verificar si el paquete activo ya tiene esta misma clase registrada
-                        existente = AlumnoClase.objects.filter(
-                            id_alumno_paquete=paquete_activo,
-                            id_clase=rel.id_clase
-                        ).first()
-                        
-                        if existente:
-                            # Si ya existe, actualizamos el del paquete activo y eliminamos el duplicado viejo
-                            existente.estado = nuevo_estado
-                            existente.save()
-                            rel.delete()
-                        else:
-                            # Si no existe en el paquete activo, se lo transferimos
-                            rel.id_alumno_paquete = paquete_activo
-                            rel.estado = nuevo_estado
-                            rel.save()
-                    else:
-                        # Si no hay paquete activo, igual guardamos el estado (quedará en el expirado)
-                        rel.estado = nuevo_estado
-                        rel.save()
-                else:
-                    rel.estado = nuevo_estado
-                    rel.save()
-                    
-            elif tipo == 'ocasional':
-                rel = AlumnoClaseOcasional.objects.get(pk=id_relacion)
-                rel.estado = nuevo_estado
-                rel.save()
-                
+            # Las clases de paquetes expirados pasan al paquete activo del alumno
+            aplicar_asistencias(cambios, reasignar_expirados=True)
             messages.success(request, "Asistencia actualizada.")
         except Exception as e:
             messages.error(request, f"Error al actualizar: {e}")
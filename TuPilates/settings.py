@@ -114,6 +114,28 @@ else:
     }
 # ------------------------------------------
 
+# --- CACHE ---
+# Memoria local por defecto. Con varios procesos (gunicorn) conviene definir
+# CACHE_DIR para que todos compartan el cache en disco y las invalidaciones
+# (calendario, horarios de turnos) se vean en todos los workers.
+CACHE_DIR = os.environ.get("CACHE_DIR")
+
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tupilates',
+        }
+    }
+# ------------------------------------------
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},